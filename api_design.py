@@ -7,6 +7,9 @@ from typing import List, Optional
 from datetime import date, datetime
 import uvicorn
 
+from clickhouse_pool import get_pool, close_pool
+from query_registry import QueryRegistry
+
 app = FastAPI(
     title="医药市场洞察API",
     description="为药企、医疗机构提供市场分析、竞品追踪、销售预测等服务",
@@ -22,6 +25,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 参数化查询模板注册表
+queries = QueryRegistry()
+
 # ============================================
 # 数据模型定义
 # ============================================
@@ -129,18 +135,7 @@ async def get_competitor_comparison(params: CompetitorComparisonRequest):
     return result
 
 
-@app.get("/api/v1/market/competitor-list", tags=["市场分析"])
-async def get_competitor_list(
-    category: str = Query(..., description="治疗领域"),
-    region: Optional[str] = Query(None, description="区域筛选"),
-    limit: int = Query(20, description="返回数量")
-):
-    """
-    获取指定治疗领域的竞品列表
-
-    返回该领域TOP N产品及其市场表现
-    """
-    sql = f"""
+queries.register("competitor_list", """
     SELECT
         product_id,
         product_name,
@@ -148,17 +143,32 @@ async def get_competitor_list(
         SUM(sales_amount) as total_sales,
         SUM(sales_amount) / (SELECT SUM(sales_amount)
                             FROM sales_data
-                            WHERE category_l1 = '{category}') as market_share,
+                            WHERE category_l1 = {category:String}) as market_share,
         RANK() OVER (ORDER BY SUM(sales_amount) DESC) as rank
     FROM sales_data
-    WHERE category_l1 = '{category}'
+    WHERE category_l1 = {category:String}
       AND sale_date >= today() - INTERVAL 12 MONTH
-      {f"AND sales_province = '{region}'" if region else ""}
+      /*:region*/
     GROUP BY product_id, product_name, manufacturer_name
     ORDER BY total_sales DESC
-    LIMIT {limit}
+    LIMIT {limit:UInt32}
+    """,
+    clauses={"region": "AND sales_province = {region:String}"},
+)
+
+
+@app.get("/api/v1/market/competitor-list", tags=["市场分析"])
+async def get_competitor_list(
+    category: str = Query(..., description="治疗领域"),
+    region: Optional[str] = Query(None, description="区域筛选"),
+    limit: int = Query(20, description="返回数量")
+):
+    """
+    获取指定治疗领域的竞品列表
+
+    返回该领域TOP N产品及其市场表现
     """
-    return execute_query(sql)
+    return await execute_named_async("competitor_list", category=category, region=region, limit=limit)
 
 
 # ============================================
@@ -189,16 +199,7 @@ async def forecast_sales(params: ForecastRequest):
     return result
 
 
-@app.get("/api/v1/forecast/accuracy", tags=["销售预测"])
-async def get_forecast_accuracy(
-    forecast_id: str = Query(..., description="预测ID")
-):
-    """
-    获取预测模型的准确率
-
-    对比预测值与实际值,计算MAPE、RMSE、MAE等指标
-    """
-    sql = f"""
+queries.register("forecast_accuracy", """
     WITH forecast_vs_actual AS (
         SELECT
             f.target_date,
@@ -209,7 +210,7 @@ async def get_forecast_accuracy(
         FROM market_forecast f
         LEFT JOIN sales_data s ON f.product_id = s.product_id
             AND f.target_date = toStartOfMonth(s.sale_date)
-        WHERE f.forecast_id = '{forecast_id}'
+        WHERE f.forecast_id = {forecast_id:String}
             AND f.target_date <= today()
         GROUP BY f.target_date, f.forecast_sales_amount, f.forecast_lower_bound, f.forecast_upper_bound
     )
@@ -218,8 +219,19 @@ async def get_forecast_accuracy(
         SQRT(AVG(POWER(actual_sales - forecast_sales_amount, 2))) as rmse,
         AVG(ABS(actual_sales - forecast_sales_amount)) as mae
     FROM forecast_vs_actual
+    """)
+
+
+@app.get("/api/v1/forecast/accuracy", tags=["销售预测"])
+async def get_forecast_accuracy(
+    forecast_id: str = Query(..., description="预测ID")
+):
     """
-    return execute_query(sql)
+    获取预测模型的准确率
+
+    对比预测值与实际值,计算MAPE、RMSE、MAE等指标
+    """
+    return await execute_named_async("forecast_accuracy", forecast_id=forecast_id)
 
 
 @app.get("/api/v1/anomaly/detection", tags=["销售预测"])
@@ -281,20 +293,7 @@ async def analyze_product_portfolio(
     return result
 
 
-@app.get("/api/v1/opportunity/white-space", tags=["机会识别"])
-async def find_market_white_space(
-    category: str = Query(..., description="治疗领域"),
-    region: str = Query(..., description="区域")
-):
-    """
-    发现市场空白点
-
-    识别策略:
-    1. 有需求但竞品少的品类
-    2. 竞品渗透率低的区域
-    3. 价格差异巨大的细分市场
-    """
-    sql = f"""
+queries.register("market_white_space", """
     WITH market_potential AS (
         SELECT
             category_l2,
@@ -305,11 +304,11 @@ async def find_market_white_space(
             (COUNT(DISTINCT buyer_id)::float / (
                 SELECT COUNT(DISTINCT buyer_id)
                 FROM sales_data
-                WHERE sales_province = '{region}'
+                WHERE sales_province = {region:String}
             )) as penetration_rate
         FROM sales_data
-        WHERE category_l1 = '{category}'
-          AND sales_province = '{region}'
+        WHERE category_l1 = {category:String}
+          AND sales_province = {region:String}
           AND sale_date >= today() - INTERVAL 12 MONTH
         GROUP BY category_l2, sales_province
         HAVING market_size > 1000000
@@ -335,8 +334,23 @@ async def find_market_white_space(
             ELSE 3
         END,
         market_size DESC
+    """)
+
+
+@app.get("/api/v1/opportunity/white-space", tags=["机会识别"])
+async def find_market_white_space(
+    category: str = Query(..., description="治疗领域"),
+    region: str = Query(..., description="区域")
+):
     """
-    return execute_query(sql)
+    发现市场空白点
+
+    识别策略:
+    1. 有需求但竞品少的品类
+    2. 竞品渗透率低的区域
+    3. 价格差异巨大的细分市场
+    """
+    return await execute_named_async("market_white_space", category=category, region=region)
 
 
 # ============================================
@@ -377,19 +391,7 @@ async def analyze_price_competition(
     return result
 
 
-@app.get("/api/v1/price/trend", tags=["价格分析"])
-async def get_price_trend(
-    product_id: str = Query(..., description="产品ID"),
-    start_date: date = Query(..., description="开始日期"),
-    end_date: date = Query(..., description="结束日期"),
-    granularity: str = Query("month", description="聚合粒度: day/week/month")
-):
-    """
-    价格趋势分析
-
-    支持多时间粒度: 日、周、月
-    """
-    sql = f"""
+queries.register("price_trend", """
     SELECT
         toStartOfMonth(sale_date) as month,
         AVG(unit_price) as avg_price,
@@ -405,12 +407,26 @@ async def get_price_trend(
         SUM(sales_quantity) as sales_quantity
 
     FROM sales_data
-    WHERE product_id = '{product_id}'
-      AND sale_date BETWEEN '{start_date}' AND '{end_date}'
+    WHERE product_id = {product_id:String}
+      AND sale_date BETWEEN {start_date:Date} AND {end_date:Date}
     GROUP BY month
     ORDER BY month
+    """)
+
+
+@app.get("/api/v1/price/trend", tags=["价格分析"])
+async def get_price_trend(
+    product_id: str = Query(..., description="产品ID"),
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期"),
+    granularity: str = Query("month", description="聚合粒度: day/week/month")
+):
+    """
+    价格趋势分析
+
+    支持多时间粒度: 日、周、月
     """
-    return execute_query(sql)
+    return await execute_named_async("price_trend", product_id=product_id, start_date=start_date, end_date=end_date)
 
 
 # ============================================
@@ -428,22 +444,7 @@ async def get_hospital_profile(params: HospitalProfileRequest):
     return result
 
 
-@app.get("/api/v1/customer/hospital-segmentation", tags=["客户洞察"])
-async def segment_hospitals(
-    category: str = Query(..., description="治疗领域"),
-    region: Optional[str] = Query(None, description="区域筛选")
-):
-    """
-    医院客户分层
-
-    使用RFM模型:
-    - Recency: 最近采购时间
-    - Frequency: 采购频率
-    - Monetary: 采购金额
-
-    分层: 高价值客户、主力客户、潜力客户、低价值客户
-    """
-    sql = f"""
+queries.register("hospital_segmentation", """
     WITH hospital_rfm AS (
         SELECT
             buyer_id,
@@ -460,8 +461,8 @@ async def segment_hospitals(
             SUM(sales_amount) as monetary
 
         FROM sales_data
-        WHERE category_l1 = '{category}'
-          {f"AND sales_province = '{region}'" if region else ""}
+        WHERE category_l1 = {category:String}
+          /*:region*/
           AND sale_date >= today() - INTERVAL 12 MONTH
         GROUP BY buyer_id, buyer_name, hospital_level
     ),
@@ -494,26 +495,30 @@ async def segment_hospitals(
 
     FROM rfm_scores
     ORDER BY monetary DESC
-    """
-    return execute_query(sql)
+    """,
+    clauses={"region": "AND sales_province = {region:String}"},
+)
 
 
-@app.get("/api/v1/customer/doctor-prescription-pattern", tags=["客户洞察"])
-async def analyze_doctor_pattern(
-    doctor_id: str = Query(..., description="医生ID"),
-    start_date: date = Query(..., description="开始日期"),
-    end_date: date = Query(..., description="结束日期")
+@app.get("/api/v1/customer/hospital-segmentation", tags=["客户洞察"])
+async def segment_hospitals(
+    category: str = Query(..., description="治疗领域"),
+    region: Optional[str] = Query(None, description="区域筛选")
 ):
     """
-    医生处方行为分析
+    医院客户分层
 
-    分析维度:
-    - 处方量趋势
-    - 用药偏好(品牌/通用名)
-    - 费效比
-    - 合规性(指南符合度)
+    使用RFM模型:
+    - Recency: 最近采购时间
+    - Frequency: 采购频率
+    - Monetary: 采购金额
+
+    分层: 高价值客户、主力客户、潜力客户、低价值客户
     """
-    sql = f"""
+    return await execute_named_async("hospital_segmentation", category=category, region=region)
+
+
+queries.register("doctor_prescription_pattern", """
     SELECT
         doctor_id,
         doctor_name,
@@ -537,31 +542,37 @@ async def analyze_doctor_pattern(
         ARRAY_AGG(drug_name ORDER BY COUNT(*) DESC) FILTER (WHERE drug_name IS NOT NULL)[1:5] as top_drugs
 
     FROM prescription_data
-    WHERE doctor_id = '{doctor_id}'
-      AND prescription_date BETWEEN '{start_date}' AND '{end_date}'
+    WHERE doctor_id = {doctor_id:String}
+      AND prescription_date BETWEEN {start_date:Date} AND {end_date:Date}
     GROUP BY doctor_id, doctor_name, department, hospital_name
-    """
-    return execute_query(sql)
-
+    """)
 
-# ============================================
-# 6. 仪表盘数据API
-# ============================================
 
-@app.get("/api/v1/dashboard/overview", tags=["仪表盘"])
-async def get_dashboard_overview(
-    company_id: str = Query(..., description="企业ID"),
-    date_range: str = Query("12m", description="时间范围: 1m/3m/6m/12m")
+@app.get("/api/v1/customer/doctor-prescription-pattern", tags=["客户洞察"])
+async def analyze_doctor_pattern(
+    doctor_id: str = Query(..., description="医生ID"),
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期")
 ):
     """
-    市场洞察仪表盘 - 总览数据
+    医生处方行为分析
 
-    返回核心KPI和趋势图数据
+    分析维度:
+    - 处方量趋势
+    - 用药偏好(品牌/通用名)
+    - 费效比
+    - 合规性(指南符合度)
     """
-    period_map = {"1m": 1, "3m": 3, "6m": 6, "12m": 12}
-    months = period_map.get(date_range, 12)
+    return await execute_named_async(
+        "doctor_prescription_pattern", doctor_id=doctor_id, start_date=start_date, end_date=end_date
+    )
+
+
+# ============================================
+# 6. 仪表盘数据API
+# ============================================
 
-    sql = f"""
+queries.register("dashboard_overview", """
     WITH company_stats AS (
         SELECT
             -- 核心KPI
@@ -580,23 +591,23 @@ async def get_dashboard_overview(
 
             -- 去年同期
             (SUM(sales_amount) FILTER (
-                WHERE sale_date >= today() - INTERVAL {months} MONTH
+                WHERE sale_date >= today() - INTERVAL {months:UInt32} MONTH
             ) / NULLIF(SUM(sales_amount) FILTER (
-                WHERE sale_date >= today() - INTERVAL {months * 2} MONTH
-                    AND sale_date < today() - INTERVAL {months} MONTH
+                WHERE sale_date >= today() - INTERVAL {prev_months:UInt32} MONTH
+                    AND sale_date < today() - INTERVAL {months:UInt32} MONTH
             ), 0) - 1) * 100 as yoy_growth
 
         FROM sales_data
-        WHERE manufacturer_id = '{company_id}'
-          AND sale_date >= today() - INTERVAL {months} MONTH
+        WHERE manufacturer_id = {company_id:String}
+          AND sale_date >= today() - INTERVAL {months:UInt32} MONTH
     ),
     top_products AS (
         SELECT
             product_name,
             SUM(sales_amount) as sales
         FROM sales_data
-        WHERE manufacturer_id = '{company_id}'
-          AND sale_date >= today() - INTERVAL {months} MONTH
+        WHERE manufacturer_id = {company_id:String}
+          AND sale_date >= today() - INTERVAL {months:UInt32} MONTH
         GROUP BY product_name
         ORDER BY sales DESC
         LIMIT 5
@@ -606,30 +617,34 @@ async def get_dashboard_overview(
             toStartOfMonth(sale_date) as month,
             SUM(sales_amount) as sales_amount
         FROM sales_data
-        WHERE manufacturer_id = '{company_id}'
-          AND sale_date >= today() - INTERVAL {months} MONTH
+        WHERE manufacturer_id = {company_id:String}
+          AND sale_date >= today() - INTERVAL {months:UInt32} MONTH
         GROUP BY month
         ORDER BY month
     )
     SELECT * FROM company_stats, top_products, sales_trend
-    """
-    return execute_query(sql)
+    """)
 
 
-@app.get("/api/v1/dashboard/realtime-alerts", tags=["仪表盘"])
-async def get_realtime_alerts(
-    user_id: str = Query(..., description="用户ID")
+@app.get("/api/v1/dashboard/overview", tags=["仪表盘"])
+async def get_dashboard_overview(
+    company_id: str = Query(..., description="企业ID"),
+    date_range: str = Query("12m", description="时间范围: 1m/3m/6m/12m")
 ):
     """
-    实时预警信息
+    市场洞察仪表盘 - 总览数据
 
-    预警类型:
-    - 销售异常 (突增/突降/断货)
-    - 竞品动态 (降价/新品)
-    - 市场机会 (高增长区域)
-    - 风险提示 (政策变化/供应问题)
+    返回核心KPI和趋势图数据
     """
-    sql = f"""
+    period_map = {"1m": 1, "3m": 3, "6m": 6, "12m": 12}
+    months = period_map.get(date_range, 12)
+
+    return await execute_named_async(
+        "dashboard_overview", company_id=company_id, months=months, prev_months=months * 2
+    )
+
+
+queries.register("realtime_alerts", """
     WITH alerts AS (
         -- 销售异常预警
         SELECT
@@ -658,30 +673,58 @@ async def get_realtime_alerts(
         LIMIT 20
     )
     SELECT * FROM alerts
+    """)
+
+
+@app.get("/api/v1/dashboard/realtime-alerts", tags=["仪表盘"])
+async def get_realtime_alerts(
+    user_id: str = Query(..., description="用户ID")
+):
+    """
+    实时预警信息
+
+    预警类型:
+    - 销售异常 (突增/突降/断货)
+    - 竞品动态 (降价/新品)
+    - 市场机会 (高增长区域)
+    - 风险提示 (政策变化/供应问题)
     """
-    return execute_query(sql)
+    return await execute_named_async("realtime_alerts")
 
 
 # ============================================
 # 辅助函数
 # ============================================
 
-def execute_query(sql: str):
+def execute_query(sql: str, parameters: Optional[dict] = None):
     """
-    执行SQL查询 (示例)
-    实际项目中应该使用数据库连接池
+    执行SQL查询 (同步)
+    使用进程级共享连接池, 避免每次查询重新建立连接
     """
-    import clickhouse_connect
-    client = clickhouse_connect.get_client(
-        host='localhost',
-        port=8123,
-        username='default',
-        password='',
-        database='pharma_insights'
-    )
-    result = client.query(sql)
-    return result.named_results()
+    return get_pool().query(sql, parameters)
+
+
+async def execute_query_async(sql: str, parameters: Optional[dict] = None):
+    """
+    执行SQL查询 (异步)
+    在连接池线程中执行, 不阻塞事件循环
+    """
+    return await get_pool().query_async(sql, parameters)
+
+
+async def execute_named_async(name: str, **params):
+    """
+    按模板名执行参数化查询
+    取值由ClickHouse服务端绑定, 相同模板共享同一条规范化SQL
+    """
+    query = queries.render(name, **params)
+    return await execute_query_async(query.sql, query.parameters)
+
 
+@app.on_event("shutdown")
+async def shutdown_clickhouse_pool():
+    """服务关闭时释放连接池"""
+    close_pool()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
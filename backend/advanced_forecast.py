@@ -3,24 +3,20 @@
 """
 
 from fastapi import FastAPI, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import List, Optional, Dict
-from datetime import datetime, date, timedelta
-import random
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 import numpy as np
 
-security = HTTPBearer()
-app = FastAPI(title="高级预测模型API")
+from auth import verify_token
+from feature_store import FeatureStore
+from backtest import BACKTEST_MODELS, MODEL_NAMES, BacktestStore, backtest, backtest_rows
+from forecast_models import DEFAULT_LEVEL, MODEL_PROFILES, forecast_matrix
+from model_registry import PRODUCT_ID_PATTERN, ModelRegistry
+from stat_forecast import Z_SCORES, fit_ets, forecast_metrics
+from training_scheduler import TrainingQueueFullError, TrainingScheduler
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        import jwt
-        token = credentials.credentials
-        payload = jwt.decode(token, "your-secret-key-here-change-in-production", algorithms=["HS256"])
-        return payload.get("sub")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+app = FastAPI(title="高级预测模型API")
 
 # ============================================
 # 数据模型
@@ -40,6 +36,114 @@ class ModelComparisonRequest(BaseModel):
     product_id: str
     models: List[str]
 
+class BatchTrainRequest(BaseModel):
+    product_ids: List[str]
+    model_type: str = "xgboost"
+    training_days: int = 365
+    revenues: Dict[str, float] = {}  # 产品销售额, 用作训练优先级
+
+class BatchForecastRequest(BaseModel):
+    product_ids: List[str]
+    model_type: str = "xgboost"  # xgboost, lstm, transformer
+    forecast_periods: int = 30
+
+class BacktestRequest(BaseModel):
+    series: Dict[str, List[float]]  # 产品ID -> 等间隔历史值, 各序列长度需一致
+    models: List[str] = list(BACKTEST_MODELS)
+    horizon: int = 3
+    origins: int = 6
+    season_length: Optional[int] = 12
+
+class ETSForecastRequest(BaseModel):
+    series: Dict[str, List[float]]  # 序列ID -> 等间隔历史值, 各序列长度需一致
+    horizon: int = 12
+    season_length: Optional[int] = 12
+    coverage: float = 0.95
+
+# ============================================
+# 向量化预测
+# ============================================
+
+MAX_BATCH_PRODUCTS = 10000
+MAX_FORECAST_PERIODS = 365
+
+# 训练产物注册表, 推理时优先使用内存中的热模型
+model_registry = ModelRegistry.from_env()
+# 训练任务在独立进程中执行
+training_scheduler = TrainingScheduler.from_env(model_registry)
+# 最近一次回测结果
+backtest_store = BacktestStore.from_env()
+# 滚动特征(由 feature_store.py 同步任务写入, 只读内存映射)
+feature_store = FeatureStore.from_env(mmap_mode="r")
+
+# 模型类型 -> (注册表代数, 产品ID -> 已训练模型的基线)
+_trained_levels: Dict[str, Tuple[Any, Dict[str, float]]] = {}
+
+def trained_levels(model_type: str) -> Dict[str, float]:
+    """
+    已训练产品的模型基线; 注册表代数不变时直接复用, 有新模型保存后才重建.
+    只收录由真实历史销量训练的模型, 默认基线训练的模型不覆盖特征库中的销售水平
+    """
+    generation = model_registry.generation(model_type)
+    cached = _trained_levels.get(model_type)
+    if cached is None or cached[0] != generation:
+        models = model_registry.latest_models(model_type)
+        cached = (generation, {
+            product_id: model.level
+            for product_id, model in models.items()
+            if model.fitted_on_history
+        })
+        _trained_levels[model_type] = cached
+    return cached[1]
+
+def model_levels(product_ids: List[str], model_type: str) -> np.ndarray:
+    """各产品的需求基线, 已训练的产品取模型中的基线, 否则取特征库中的30天日均销售额"""
+    feature_store.refresh(mmap_mode="r")
+    features = feature_store.product_features(product_ids)
+    levels = np.where(features["found"], features["sales_mean_30d"], DEFAULT_LEVEL)
+    trained = trained_levels(model_type)
+    model_level = np.array([trained.get(product_id, np.nan) for product_id in product_ids], dtype=np.float64)
+    has_model = ~np.isnan(model_level)
+    levels[has_model] = model_level[has_model]
+    return levels
+
+def direction(change: float, threshold: float = 0.05) -> str:
+    """相对变化超过阈值时为 up/down, 否则为 stable"""
+    if change > threshold:
+        return "up"
+    if change < -threshold:
+        return "down"
+    return "stable"
+
+def forecast_dates(periods: int) -> List[str]:
+    base_date = datetime.now()
+    return [(base_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(periods)]
+
+def backtested_metrics(product_id: str, model_type: str, default: Dict) -> Dict:
+    """产品在该模型上的回测指标, 尚未回测时返回默认值"""
+    entry = backtest_store.for_product(product_id).get(model_type)
+    if entry is None:
+        return default
+    return {key: entry[key] for key in ("mape", "rmse", "mae", "r2_score")}
+
+def forecast_rows(product_id: str, model_type: str, periods: int, value_key: str) -> List[Dict]:
+    """单条序列预测, 以逐日记录的形式返回"""
+    level = model_levels([product_id], model_type)
+    forecast, lower, upper = forecast_matrix(model_type, 1, periods, level=level)
+    confidence = MODEL_PROFILES[model_type]["confidence"]
+    return [
+        {
+            "date": day,
+            value_key: value,
+            "lower_bound": low,
+            "upper_bound": high,
+            "confidence": confidence
+        }
+        for day, value, low, high in zip(
+            forecast_dates(periods), forecast[0].tolist(), lower[0].tolist(), upper[0].tolist()
+        )
+    ]
+
 # ============================================
 # 1. XGBoost预测API
 # ============================================
@@ -72,35 +176,20 @@ async def forecast_xgboost(
         {"feature": "其他", "importance": 0.03}
     ]
 
-    # 生成预测数据
-    forecast_data = []
-    base_date = datetime.now()
-
-    for i in range(request.forecast_periods):
-        forecast_date = base_date + timedelta(days=i)
-
-        # XGBoost预测 (更准确)
-        xgb_demand = int(1000 + np.sin(i * 0.1) * 100 + random.uniform(-30, 30) + i * 2)
-
-        forecast_data.append({
-            "date": forecast_date.strftime("%Y-%m-%d"),
-            "xgboost_forecast": xgb_demand,
-            "lower_bound": int(xgb_demand * 0.88),
-            "upper_bound": int(xgb_demand * 1.12),
-            "confidence": 0.89
-        })
+    # 生成预测数据 (XGBoost预测, 更准确)
+    forecast_data = forecast_rows(request.product_id, "xgboost", request.forecast_periods, "xgboost_forecast")
 
     return {
         "model": "XGBoost",
         "product_id": request.product_id,
         "feature_importance": feature_importance,
         "forecast_data": forecast_data,
-        "model_metrics": {
+        "model_metrics": backtested_metrics(request.product_id, "xgboost", {
             "mape": 5.8,
             "rmse": 850,
             "mae": 620,
             "r2_score": 0.94
-        }
+        })
     }
 
 # ============================================
@@ -121,34 +210,20 @@ async def forecast_lstm(
     - 非线性关系建模
     """
 
-    forecast_data = []
-    base_date = datetime.now()
-
-    for i in range(request.forecast_periods):
-        forecast_date = base_date + timedelta(days=i)
-
-        # LSTM预测 (捕捉长期依赖)
-        lstm_demand = int(1000 + np.sin(i * 0.08) * 120 + np.cos(i * 0.15) * 80 + random.uniform(-40, 40))
-
-        forecast_data.append({
-            "date": forecast_date.strftime("%Y-%m-%d"),
-            "lstm_forecast": lstm_demand,
-            "lower_bound": int(lstm_demand * 0.85),
-            "upper_bound": int(lstm_demand * 1.15),
-            "confidence": 0.87
-        })
+    # LSTM预测 (捕捉长期依赖)
+    forecast_data = forecast_rows(request.product_id, "lstm", request.forecast_periods, "lstm_forecast")
 
     return {
         "model": "LSTM",
         "product_id": request.product_id,
         "sequence_length": request.sequence_length,
         "forecast_data": forecast_data,
-        "model_metrics": {
+        "model_metrics": backtested_metrics(request.product_id, "lstm", {
             "mape": 6.2,
             "rmse": 920,
             "mae": 680,
             "r2_score": 0.93
-        },
+        }),
         "training_info": {
             "epochs": 100,
             "batch_size": 32,
@@ -177,119 +252,238 @@ async def forecast_transformer(
     - 多头注意力机制
     """
 
-    forecast_data = []
-    base_date = datetime.now()
-
-    for i in range(forecast_periods):
-        forecast_date = base_date + timedelta(days=i)
-
-        # Transformer预测
-        trans_demand = int(1000 + np.sin(i * 0.07) * 110 + random.uniform(-35, 35) + i * 1.5)
-
-        forecast_data.append({
-            "date": forecast_date.strftime("%Y-%m-%d"),
-            "transformer_forecast": trans_demand,
-            "lower_bound": int(trans_demand * 0.86),
-            "upper_bound": int(trans_demand * 1.14),
-            "confidence": 0.91
-        })
+    # Transformer预测
+    forecast_data = forecast_rows(product_id, "transformer", forecast_periods, "transformer_forecast")
 
     return {
         "model": "Transformer",
         "product_id": product_id,
         "context_length": context_length,
         "forecast_data": forecast_data,
-        "model_metrics": {
+        "model_metrics": backtested_metrics(product_id, "transformer", {
             "mape": 5.2,
             "rmse": 780,
             "mae": 580,
             "r2_score": 0.95
-        }
+        })
+    }
+
+@app.post("/api/forecast/advanced/batch")
+async def forecast_batch(
+    request: BatchForecastRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量预测
+
+    一次计算多个产品的预测, 结果为 产品 x 日期 矩阵的列式结构:
+    forecast[i][j] 为 product_ids[i] 在 dates[j] 的预测值
+    """
+    if request.model_type not in MODEL_PROFILES:
+        raise HTTPException(status_code=400, detail=f"不支持的模型类型: {request.model_type}")
+    if not request.product_ids or len(request.product_ids) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"产品数量需在1-{MAX_BATCH_PRODUCTS}之间")
+    if not 1 <= request.forecast_periods <= MAX_FORECAST_PERIODS:
+        raise HTTPException(status_code=400, detail=f"预测天数需在1-{MAX_FORECAST_PERIODS}之间")
+
+    forecast, lower, upper = forecast_matrix(
+        request.model_type,
+        len(request.product_ids),
+        request.forecast_periods,
+        level=model_levels(request.product_ids, request.model_type)
+    )
+
+    return {
+        "model": request.model_type,
+        "product_ids": request.product_ids,
+        "dates": forecast_dates(request.forecast_periods),
+        "forecast": forecast.tolist(),
+        "lower_bound": lower.tolist(),
+        "upper_bound": upper.tolist(),
+        "confidence": MODEL_PROFILES[request.model_type]["confidence"],
+        "totals": forecast.sum(axis=1).tolist()
+    }
+
+@app.post("/api/forecast/advanced/ets")
+async def forecast_ets(
+    request: ETSForecastRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    指数平滑统计基线 (Holt-Winters 加法模型)
+
+    多条序列一次拟合, 每条序列独立选择平滑参数;
+    返回预测值、预测区间和样本内一步预测的误差指标
+    """
+    if not request.series or len(request.series) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"序列数量需在1-{MAX_BATCH_PRODUCTS}之间")
+    if not 1 <= request.horizon <= MAX_FORECAST_PERIODS:
+        raise HTTPException(status_code=400, detail=f"预测期数需在1-{MAX_FORECAST_PERIODS}之间")
+    if request.coverage not in Z_SCORES:
+        raise HTTPException(status_code=400, detail=f"置信水平可选: {sorted(Z_SCORES)}")
+    lengths = {len(values) for values in request.series.values()}
+    if len(lengths) != 1 or lengths.pop() < 3:
+        raise HTTPException(status_code=400, detail="各序列长度需一致且不少于3")
+
+    series_ids = list(request.series)
+    y = np.array([request.series[sid] for sid in series_ids], dtype=np.float64)
+    fit = fit_ets(y, season_length=request.season_length)
+    mean, lower, upper = fit.forecast(request.horizon, request.coverage)
+
+    start = fit.season_length or 1
+    metrics = forecast_metrics(y[:, start:], fit.fitted[:, start:])
+
+    def rounded(values):
+        return np.round(np.nan_to_num(values), 2).tolist()
+
+    return {
+        "model": "ETS",
+        "series_ids": series_ids,
+        "season_length": fit.season_length,
+        "coverage": request.coverage,
+        "forecast": rounded(mean),
+        "lower_bound": rounded(lower),
+        "upper_bound": rounded(upper),
+        "params": {
+            "alpha": fit.alpha.tolist(),
+            "beta": fit.beta.tolist(),
+            "gamma": fit.gamma.tolist() if fit.season is not None else None
+        },
+        "model_metrics": {name: rounded(values) for name, values in metrics.items()}
     }
 
 # ============================================
 # 4. 模型对比API
 # ============================================
 
+# 未回测时的参考指标
+REFERENCE_METRICS = {
+    "arima": {"mape": 8.5, "rmse": 1250, "mae": 980, "r2_score": 0.89, "training_time_ms": 120000, "inference_time_ms": 15},
+    "prophet": {"mape": 7.2, "rmse": 1100, "mae": 850, "r2_score": 0.91, "training_time_ms": 300000, "inference_time_ms": 25},
+    "xgboost": {"mape": 5.8, "rmse": 850, "mae": 620, "r2_score": 0.94, "training_time_ms": 900000, "inference_time_ms": 8},
+    "lstm": {"mape": 6.2, "rmse": 920, "mae": 680, "r2_score": 0.93, "training_time_ms": 9000000, "inference_time_ms": 45},
+    "transformer": {"mape": 5.2, "rmse": 780, "mae": 580, "r2_score": 0.95, "training_time_ms": 10800000, "inference_time_ms": 35},
+}
+
+DISPLAY_NAMES = {**MODEL_NAMES, "arima": "ARIMA", "prophet": "Prophet"}
+
+MODEL_NOTES = {
+    "naive": {"pros": ["无需训练", "基准对照"], "cons": ["不能外推趋势"]},
+    "ets": {"pros": ["训练极快", "趋势与季节性"], "cons": ["无法利用外部特征"]},
+    "arima": {"pros": ["简单快速", "适合稳定数据"], "cons": ["难以处理复杂模式"]},
+    "prophet": {"pros": ["自动季节性检测", "处理节假日"], "cons": ["参数敏感"]},
+    "xgboost": {"pros": ["特征工程", "高准确度", "快速推理"], "cons": ["需要特征工程"]},
+    "lstm": {"pros": ["序列建模", "长期依赖"], "cons": ["训练慢", "需要大量数据"]},
+    "transformer": {"pros": ["最高准确度", "并行计算"], "cons": ["计算资源需求高"]},
+}
+
 @app.post("/api/forecast/advanced/compare")
 async def compare_models(
     product_id: str,
-    models: List[str] = ["arima", "prophet", "xgboost", "lstm", "transformer"],
+    models: List[str] = ["arima", "prophet", "ets", "xgboost", "lstm", "transformer"],
     current_user: str = Depends(verify_token)
 ):
     """
     多模型对比分析
+
+    已回测的模型使用该产品最近一次滚动回测的实测指标与耗时(source=backtest),
+    其余模型使用参考指标(source=reference)
     """
+    backtested = backtest_store.for_product(product_id)
+
+    results = []
+    for key in models:
+        key = key.lower()
+        if key in backtested:
+            entry = backtested[key]
+            source = "backtest"
+        elif key in REFERENCE_METRICS:
+            entry = REFERENCE_METRICS[key]
+            source = "reference"
+        else:
+            continue
+        results.append({
+            "name": DISPLAY_NAMES.get(key, key),
+            "mape": entry["mape"],
+            "rmse": entry["rmse"],
+            "mae": entry["mae"],
+            "r2_score": entry["r2_score"],
+            "training_time_ms": entry["training_time_ms"],
+            "inference_time_ms": entry["inference_time_ms"],
+            "source": source,
+            **MODEL_NOTES.get(key, {"pros": [], "cons": []})
+        })
+
+    if not results:
+        raise HTTPException(status_code=400, detail="没有可对比的模型")
 
-    comparison_results = {
+    def best(metric):
+        ranked = [r for r in results if r[metric] is not None]
+        return min(ranked, key=lambda r: r[metric])["name"] if ranked else None
+
+    names = {r["name"] for r in results}
+    return {
         "product_id": product_id,
-        "models": [
-            {
-                "name": "ARIMA",
-                "mape": 8.5,
-                "rmse": 1250,
-                "mae": 980,
-                "r2_score": 0.89,
-                "training_time_min": 2,
-                "inference_time_ms": 15,
-                "pros": ["简单快速", "适合稳定数据"],
-                "cons": ["难以处理复杂模式"]
-            },
-            {
-                "name": "Prophet",
-                "mape": 7.2,
-                "rmse": 1100,
-                "mae": 850,
-                "r2_score": 0.91,
-                "training_time_min": 5,
-                "inference_time_ms": 25,
-                "pros": ["自动季节性检测", "处理节假日"],
-                "cons": ["参数敏感"]
-            },
-            {
-                "name": "XGBoost",
-                "mape": 5.8,
-                "rmse": 850,
-                "mae": 620,
-                "r2_score": 0.94,
-                "training_time_min": 15,
-                "inference_time_ms": 8,
-                "pros": ["特征工程", "高准确度", "快速推理"],
-                "cons": ["需要特征工程"]
-            },
-            {
-                "name": "LSTM",
-                "mape": 6.2,
-                "rmse": 920,
-                "mae": 680,
-                "r2_score": 0.93,
-                "training_time_min": 150,
-                "inference_time_ms": 45,
-                "pros": ["序列建模", "长期依赖"],
-                "cons": ["训练慢", "需要大量数据"]
-            },
-            {
-                "name": "Transformer",
-                "mape": 5.2,
-                "rmse": 780,
-                "mae": 580,
-                "r2_score": 0.95,
-                "training_time_min": 180,
-                "inference_time_ms": 35,
-                "pros": ["最高准确度", "并行计算"],
-                "cons": ["计算资源需求高"]
-            }
-        ],
+        "models": results,
         "recommendation": {
-            "best_model": "Transformer",
-            "best_for_accuracy": "Transformer",
-            "best_for_speed": "XGBoost",
-            "best_for_simplicity": "ARIMA",
-            "best_for_seasonality": "Prophet"
+            "best_model": best("mape"),
+            "best_for_accuracy": best("mape"),
+            "best_for_speed": best("inference_time_ms"),
+            "best_for_simplicity": "ARIMA" if "ARIMA" in names else best("training_time_ms"),
+            "best_for_seasonality": "Prophet" if "Prophet" in names else None
         }
     }
 
-    return comparison_results
+@app.post("/api/forecast/advanced/backtest")
+async def run_model_backtest(
+    request: BacktestRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    滚动起点回测
+
+    对提交的各产品历史序列按多个预测起点重放, 计算各模型的误差指标与训练/推理耗时;
+    结果保存后由模型对比接口使用
+    """
+    unknown = [m for m in request.models if m not in BACKTEST_MODELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的回测模型: {unknown}, 可选 {list(BACKTEST_MODELS)}")
+    if not request.series or len(request.series) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"产品数量需在1-{MAX_BATCH_PRODUCTS}之间")
+    if len({len(values) for values in request.series.values()}) != 1:
+        raise HTTPException(status_code=400, detail="各序列长度需一致")
+    if request.horizon < 1 or request.origins < 1:
+        raise HTTPException(status_code=400, detail="预测期数和起点数需大于0")
+
+    product_ids = list(request.series)
+    y = np.array([request.series[pid] for pid in product_ids], dtype=np.float64)
+    try:
+        results = backtest(
+            y,
+            models=request.models,
+            horizon=request.horizon,
+            n_origins=request.origins,
+            season_length=request.season_length
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = backtest_rows(product_ids, results, request.horizon, request.origins)
+    backtest_store.save(rows)
+
+    return {
+        "products": len(product_ids),
+        "horizon": request.horizon,
+        "origins": request.origins,
+        "summary": {
+            name: {
+                "mape": float(np.nanmean(metrics["mape"])) if np.isfinite(metrics["mape"]).any() else None,
+                "training_time_ms": metrics["training_time_ms"],
+                "inference_time_ms": metrics["inference_time_ms"]
+            }
+            for name, metrics in results.items()
+        }
+    }
 
 # ============================================
 # 5. 特征工程API
@@ -356,6 +550,26 @@ async def get_feature_importance(
         }
     ]
 
+    # 特征库中有该产品时, 返回滚动特征的当前值和实际走势
+    feature_store.refresh(mmap_mode="r")
+    current = feature_store.product_features([product_id])
+    if current["found"][0]:
+        mean_7d = float(current["sales_mean_7d"][0])
+        mean_30d = float(current["sales_mean_30d"][0])
+        seasonality = float(current["seasonality_index"][0])
+        price_change = float(current["price_change_rate"][0])
+        values = {
+            "历史销售_7天均值": (mean_7d, direction(mean_7d / mean_30d - 1 if mean_30d else 0)),
+            "历史销售_30天均值": (mean_30d, "stable"),
+            "季节性指数": (seasonality, direction(seasonality - 1)),
+            "价格变动率": (price_change, direction(price_change / 100))
+        }
+        for feature in features:
+            if feature["feature"] in values:
+                value, trend = values[feature["feature"]]
+                feature["value"] = round(value, 4)
+                feature["trend"] = trend
+
     return {
         "product_id": product_id,
         "model": model,
@@ -371,24 +585,102 @@ async def train_model(
     product_id: str,
     model_type: str = "xgboost",
     training_days: int = 365,
+    revenue: float = 0,
     current_user: str = Depends(verify_token)
 ):
     """
     训练新模型
+
+    提交到训练进程池排队执行, 立即返回任务ID; revenue(产品销售额)越高越先训练.
+    训练结果保存到模型注册表(新版本), 并预热到内存缓存供推理使用
+    """
+    if model_type not in MODEL_PROFILES:
+        raise HTTPException(status_code=400, detail=f"不支持的模型类型: {model_type}")
+    if not PRODUCT_ID_PATTERN.match(product_id):
+        raise HTTPException(status_code=400, detail=f"不合法的产品ID: {product_id!r}")
+
+    try:
+        job = training_scheduler.submit(product_id, model_type, training_days, priority=revenue)
+    except TrainingQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return job.to_dict(training_scheduler.queue_position(job))
+
+@app.post("/api/forecast/advanced/train/batch")
+async def train_models_batch(
+    request: BatchTrainRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量提交训练任务(夜间全量重训)
+    """
+    if request.model_type not in MODEL_PROFILES:
+        raise HTTPException(status_code=400, detail=f"不支持的模型类型: {request.model_type}")
+    invalid = [product_id for product_id in request.product_ids if not PRODUCT_ID_PATTERN.match(product_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不合法的产品ID: {invalid}")
+
+    jobs = training_scheduler.submit_many(
+        (product_id, request.model_type, request.training_days, request.revenues.get(product_id, 0))
+        for product_id in request.product_ids
+    )
+    job_ids = [job.job_id for job in jobs if job is not None]
+    rejected = [product_id for product_id, job in zip(request.product_ids, jobs) if job is None]
+
+    return {"job_ids": job_ids, "rejected": rejected, "scheduler": training_scheduler.stats()}
+
+@app.get("/api/forecast/advanced/train/{job_id}")
+async def get_training_job(
+    job_id: str,
+    current_user: str = Depends(verify_token)
+):
+    """
+    查询训练任务状态
     """
+    job = training_scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="训练任务不存在")
+    return job.to_dict(training_scheduler.queue_position(job))
+
+@app.delete("/api/forecast/advanced/train/{job_id}")
+async def cancel_training_job(
+    job_id: str,
+    current_user: str = Depends(verify_token)
+):
+    """
+    取消排队中的训练任务
+    """
+    job = training_scheduler.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="训练任务不存在")
+    return job.to_dict()
 
-    training_status = {
-        "status": "training",
+@app.on_event("shutdown")
+async def shutdown_training_scheduler():
+    training_scheduler.shutdown()
+
+@app.get("/api/forecast/advanced/models/{product_id}")
+async def get_model_versions(
+    product_id: str,
+    model_type: str = "xgboost",
+    current_user: str = Depends(verify_token)
+):
+    """
+    查询产品已训练的模型版本及元数据
+    """
+    if model_type not in MODEL_PROFILES:
+        raise HTTPException(status_code=400, detail=f"不支持的模型类型: {model_type}")
+    if not PRODUCT_ID_PATTERN.match(product_id):
+        raise HTTPException(status_code=400, detail=f"不合法的产品ID: {product_id!r}")
+    versions = model_registry.versions(product_id, model_type)
+    return {
         "product_id": product_id,
         "model_type": model_type,
-        "training_data_points": training_days,
-        "started_at": datetime.now().isoformat(),
-        "estimated_completion_minutes": 15 if model_type == "xgboost" else 180,
-        "progress": 0
+        "versions": [model_registry.metadata(product_id, model_type, v) for v in versions],
+        "cache": model_registry.cache.stats(),
+        "training": training_scheduler.stats()
     }
 
-    return training_status
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8003)
@@ -0,0 +1,220 @@
+"""
+告警引擎 - 事件驱动的规则评估与有界告警存储
+每条规则声明所关注的字段, 引擎按字段建立规则索引: 事件到达时只评估关注了变化字段的规则;
+同一规则对同一对象只保留一条活动告警, 条件解除后自动关闭.
+告警按严重级别分别建索引, 总数有上限, 超出时先淘汰低级别的旧告警
+"""
+
+import itertools
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+# 从高到低
+SEVERITIES = ("critical", "high", "medium", "low")
+
+
+class AlertRule:
+    """
+    告警规则
+
+    condition(state) 返回告警内容(message / suggested_action 等字段)或 None;
+    state 为对象当前的全部字段
+    """
+
+    def __init__(
+        self,
+        alert_type: str,
+        severity: str,
+        watches: Iterable[str],
+        condition: Callable[[Dict], Optional[Dict]],
+    ):
+        if severity not in SEVERITIES:
+            raise ValueError(f"未知的告警级别: {severity}")
+        self.alert_type = alert_type
+        self.severity = severity
+        self.watches: Set[str] = set(watches)
+        self.condition = condition
+
+
+class AlertStore:
+    """
+    有界告警存储
+
+    每个级别一个按时间排序的 OrderedDict, 按级别查询只访问该级别的索引
+    """
+
+    def __init__(self, max_alerts: int = 10000):
+        self.max_alerts = max_alerts
+        self._by_severity: Dict[str, "OrderedDict[int, Dict]"] = {s: OrderedDict() for s in SEVERITIES}
+        self._ids = itertools.count(1)
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self._evict_listeners: List[Callable[[List[Dict]], None]] = []
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def subscribe(self, listener: Callable[[str, Dict], None]):
+        """
+        注册监听: 新告警以 ("alert", 告警) 调用, 告警解除以 ("resolved", 告警) 调用,
+        因容量上限被淘汰的告警以 ("evicted", 告警) 调用
+        """
+        self._listeners.append(listener)
+
+    def on_evict(self, listener: Callable[[List[Dict]], None]):
+        """注册淘汰监听: 因容量上限被淘汰的告警列表(在 add() 的调用线程中回调)"""
+        self._evict_listeners.append(listener)
+
+    def _publish(self, event: str, alert: Dict):
+        for listener in self._listeners:
+            listener(event, alert)
+
+    def add(self, alert: Dict) -> Dict:
+        with self._lock:
+            alert = {**alert, "alert_id": next(self._ids)}
+            alert.setdefault("created_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._by_severity[alert["severity"]][alert["alert_id"]] = alert
+            evicted = self._evict()
+        if evicted:
+            for listener in self._evict_listeners:
+                listener(evicted)
+            for old in evicted:
+                self._publish("evicted", old)
+        self._publish("alert", alert)
+        return alert
+
+    def _evict(self) -> List[Dict]:
+        """超出上限时按 低级别 -> 旧告警 淘汰, 返回被淘汰的告警"""
+        total = sum(len(index) for index in self._by_severity.values())
+        evicted = []
+        for severity in reversed(SEVERITIES):
+            index = self._by_severity[severity]
+            while total > self.max_alerts and index:
+                evicted.append(index.popitem(last=False)[1])
+                total -= 1
+        self.evicted += len(evicted)
+        return evicted
+
+    def remove(self, alert_id: int, severity: str) -> Optional[Dict]:
+        with self._lock:
+            alert = self._by_severity[severity].pop(alert_id, None)
+        if alert is not None:
+            self._publish("resolved", alert)
+        return alert
+
+    def query(self, severity: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """最新的告警在前"""
+        with self._lock:
+            if severity is not None:
+                alerts = list(reversed(self._by_severity.get(severity, {}).values()))
+            else:
+                alerts = sorted(
+                    (a for index in self._by_severity.values() for a in index.values()),
+                    key=lambda a: a["alert_id"],
+                    reverse=True,
+                )
+        return alerts[:limit] if limit else alerts
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {severity: len(index) for severity, index in self._by_severity.items()}
+
+
+class AlertEngine:
+    """
+    规则引擎
+
+    process(entity, fields) 合并对象的字段变化, 只评估关注这些字段的规则
+
+    - **max_entities**: 保留字段状态的对象数上限, 超出时丢弃最久未更新的对象状态;
+      被丢弃对象的下一个事件按其携带的全部字段重新评估
+    """
+
+    def __init__(self, rules: Iterable[AlertRule], store: Optional[AlertStore] = None, max_entities: int = 100000):
+        self.rules = list(rules)
+        self.store = store or AlertStore()
+        self.max_entities = max_entities
+        self._rules_by_field: Dict[str, List[AlertRule]] = {}
+        for rule in self.rules:
+            for field in rule.watches:
+                self._rules_by_field.setdefault(field, []).append(rule)
+        self._states: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._active: Dict[tuple, Dict] = {}  # (告警类型, 对象) -> 活动告警
+        self._active_keys: Dict[int, tuple] = {}  # 告警ID -> (告警类型, 对象)
+        # 存储淘汰的告警ID; 淘汰回调可能发生在持有引擎锁时, 先入队, 在 process() 中处理
+        self._evicted_ids: deque = deque()
+        self.store.on_evict(lambda alerts: self._evicted_ids.extend(a["alert_id"] for a in alerts))
+        self._lock = threading.Lock()
+        self.evaluations = 0
+
+    def _drop_evicted(self):
+        """已被存储淘汰的活动告警不再阻止重新告警"""
+        while self._evicted_ids:
+            key = self._active_keys.pop(self._evicted_ids.popleft(), None)
+            if key is not None:
+                del self._active[key]
+
+    def process(self, entity: Hashable, fields: Dict, context: Optional[Dict] = None) -> List[Dict]:
+        """
+        处理一个对象的字段变化, 返回新产生的告警
+
+        context 中的字段(如产品名称、仓库)会带入告警但不触发规则
+        """
+        fired = []
+        with self._lock:
+            self._drop_evicted()
+            state = self._states.get(entity)
+            if state is None:
+                state = self._states[entity] = {}
+                while len(self._states) > self.max_entities:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(entity)
+            changed = [name for name, value in fields.items() if state.get(name) != value]
+            state.update(fields)
+            if context:
+                state.update(context)
+            if not changed:
+                return fired
+
+            rules = []
+            for name in changed:
+                for rule in self._rules_by_field.get(name, ()):
+                    if rule not in rules:
+                        rules.append(rule)
+
+            for rule in rules:
+                self.evaluations += 1
+                result = rule.condition(state)
+                key = (rule.alert_type, entity)
+                active = self._active.get(key)
+                if result is None:
+                    if active is not None:
+                        self.store.remove(active["alert_id"], active["severity"])
+                        del self._active[key]
+                        del self._active_keys[active["alert_id"]]
+                    continue
+                if active is not None:
+                    continue
+                alert = self.store.add({
+                    "alert_type": rule.alert_type,
+                    "severity": result.pop("severity", rule.severity),
+                    **(context or {}),
+                    **result,
+                })
+                self._active[key] = alert
+                self._active_keys[alert["alert_id"]] = key
+                fired.append(alert)
+            self._drop_evicted()
+        return fired
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rules": len(self.rules),
+                "entities": len(self._states),
+                "active": len(self._active),
+                "evaluations": self.evaluations,
+                "by_severity": self.store.counts(),
+                "evicted": self.store.evicted,
+            }
@@ -0,0 +1,147 @@
+"""
+告警推送 - Server-Sent Events
+告警存储的新增/解除/淘汰事件编号后写入有界回放缓冲区, 并推送给各在线连接;
+每个连接可按级别、仓库、医院过滤, 断线重连时按 Last-Event-ID 从缓冲区补发
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from alert_engine import AlertStore
+
+# 连接的待发送事件上限, 超出说明客户端过慢, 断开后由其按 Last-Event-ID 重连补发
+SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_SECONDS = 15.0
+
+
+class AlertFilter:
+    """连接级过滤条件, 未指定的条件不过滤"""
+
+    def __init__(
+        self,
+        severities: Optional[Set[str]] = None,
+        warehouse: Optional[str] = None,
+        hospital: Optional[str] = None,
+    ):
+        self.severities = severities or None
+        self.warehouse = warehouse
+        self.hospital = hospital
+
+    @classmethod
+    def from_params(cls, severity: Optional[str], warehouse: Optional[str] = None, hospital: Optional[str] = None):
+        # severity 可为逗号分隔的多个级别
+        severities = {s.strip() for s in severity.split(",") if s.strip()} if severity else None
+        return cls(severities, warehouse, hospital)
+
+    def matches(self, alert: Dict) -> bool:
+        if self.severities and alert.get("severity") not in self.severities:
+            return False
+        if self.warehouse and alert.get("warehouse") != self.warehouse:
+            return False
+        if self.hospital and alert.get("hospital") != self.hospital:
+            return False
+        return True
+
+
+class _Subscriber:
+    def __init__(self, alert_filter: AlertFilter, loop: asyncio.AbstractEventLoop):
+        self.filter = alert_filter
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, item):
+        # 在事件循环线程中执行
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class AlertBroadcaster:
+    """
+    告警广播
+
+    - **replay_size**: 回放缓冲区保留的事件数, 重连时更早的事件无法补发(会收到 reset 事件)
+    """
+
+    def __init__(self, store: AlertStore, replay_size: int = 5000):
+        self.replay_size = replay_size
+        self._buffer: deque = deque(maxlen=replay_size)  # (event_id, event, alert)
+        self._ids = itertools.count(1)
+        self._subscribers: List[_Subscriber] = []
+        self._lock = threading.Lock()
+        store.subscribe(self.publish)
+
+    def publish(self, event: str, alert: Dict):
+        """由告警存储调用(可能在任意线程)"""
+        with self._lock:
+            item = (next(self._ids), event, alert)
+            self._buffer.append(item)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.filter.matches(alert):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, item)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    pass
+
+    @staticmethod
+    def format(item) -> str:
+        event_id, event, alert = item
+        data = json.dumps(alert, ensure_ascii=False, default=str)
+        return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+    async def stream(self, alert_filter: AlertFilter, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        SSE 事件流
+
+        先补发 last_event_id 之后的缓冲事件, 再推送实时事件; 空闲时发送心跳注释保持连接
+        """
+        subscriber = _Subscriber(alert_filter, asyncio.get_running_loop())
+        with self._lock:
+            # 先登记再取回放快照, 保证两者之间发布的事件不会丢失(重复的按编号跳过)
+            self._subscribers.append(subscriber)
+            backlog = list(self._buffer)
+        try:
+            yield "retry: 3000\n\n"
+            latest_id = backlog[-1][0] if backlog else 0
+            if last_event_id is None:
+                sent_id = latest_id
+            elif last_event_id > latest_id or (backlog and backlog[0][0] > last_event_id + 1):
+                # 服务已重启或需要的事件已被淘汰, 客户端应重新拉取告警列表
+                yield f"event: reset\ndata: {json.dumps({'latest_id': latest_id})}\n\n"
+                sent_id = latest_id
+            else:
+                sent_id = last_event_id
+                for item in backlog:
+                    if item[0] > sent_id and alert_filter.matches(item[2]):
+                        yield self.format(item)
+                sent_id = latest_id
+
+            while not subscriber.overflowed:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item[0] <= sent_id:
+                    continue
+                yield self.format(item)
+                sent_id = item[0]
+        finally:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "buffered_events": len(self._buffer),
+                "last_event_id": self._buffer[-1][0] if self._buffer else 0,
+            }
@@ -4,22 +4,20 @@ FastAPI + JWT认证 + 模拟数据
 """
 
 from fastapi import FastAPI, Depends, HTTPException, status, Header
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime, timedelta, date
-import jwt
+from datetime import datetime, date
 import uvicorn
 import random
 import json
+import os
 from enum import Enum
 
-# JWT配置
-SECRET_KEY = "your-secret-key-here-change-in-production"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24小时
+from auth import create_access_token, verify_token, get_permission_scope
+from result_cache import ResultCache, DataVersionWatcher, clickhouse_update_log_probe
+from backtest import MODEL_NAMES, BacktestStore
 
 app = FastAPI(
     title="智能数据平台 API",
@@ -36,8 +34,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 安全认证
-security = HTTPBearer()
+# 接口结果缓存 (数据仅在 data_update_log 出现新记录时变化)
+result_cache = ResultCache.from_env()
+data_version_watcher = None
+# 模型回测结果 (由 backtest.py 定时任务写入)
+backtest_store = BacktestStore.from_env()
 
 # ============================================
 # 数据模型
@@ -80,39 +81,6 @@ class OpportunityData(BaseModel):
     score: float
     level: str
 
-# ============================================
-# 认证功能
-# ============================================
-
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的认证凭证",
-            )
-        return username
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="登录已过期,请重新登录",
-        )
-    except jwt.JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭证",
-        )
-
 # ============================================
 # API接口
 # ============================================
@@ -157,7 +125,8 @@ async def verify_auth(current_user: str = Depends(verify_token)):
 # ============================================
 
 @app.get("/api/dashboard/kpi")
-async def get_dashboard_kpi(current_user: str = Depends(verify_token)):
+@result_cache.cached("dashboard_kpi", ttl=300)
+async def get_dashboard_kpi(scope: str = Depends(get_permission_scope)):
     """获取仪表盘KPI数据"""
     kpis = [
         {
@@ -192,7 +161,8 @@ async def get_dashboard_kpi(current_user: str = Depends(verify_token)):
     return {"data": kpis}
 
 @app.get("/api/dashboard/sales-trend")
-async def get_sales_trend(current_user: str = Depends(verify_token)):
+@result_cache.cached("dashboard_sales_trend", ttl=3600)
+async def get_sales_trend(scope: str = Depends(get_permission_scope)):
     """获取销售趋势数据"""
     months = ['2024-01', '2024-02', '2024-03', '2024-04', '2024-05', '2024-06',
               '2024-07', '2024-08', '2024-09', '2024-10', '2024-11', '2024-12']
@@ -206,7 +176,8 @@ async def get_sales_trend(current_user: str = Depends(verify_token)):
     return data
 
 @app.get("/api/dashboard/market-share")
-async def get_market_share_trend(current_user: str = Depends(verify_token)):
+@result_cache.cached("dashboard_market_share", ttl=3600)
+async def get_market_share_trend(scope: str = Depends(get_permission_scope)):
     """获取市场份额趋势"""
     quarters = ['Q1', 'Q2', 'Q3', 'Q4']
     data = {
@@ -221,7 +192,8 @@ async def get_market_share_trend(current_user: str = Depends(verify_token)):
     return data
 
 @app.get("/api/dashboard/opportunities")
-async def get_opportunities(current_user: str = Depends(verify_token)):
+@result_cache.cached("dashboard_opportunities", ttl=1800)
+async def get_opportunities(scope: str = Depends(get_permission_scope)):
     """获取市场机会数据"""
     opportunities = [
         {"region": "华东", "city": "杭州", "market_size": 8520, "growth_rate": 28.5, "competitor_count": 12, "penetration_rate": 35, "score": 92, "level": "高潜力"},
@@ -233,6 +205,46 @@ async def get_opportunities(current_user: str = Depends(verify_token)):
     ]
     return {"data": opportunities}
 
+# ============================================
+# 缓存管理
+# ============================================
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(version: Optional[str] = None, current_user: str = Depends(verify_token)):
+    """
+    数据更新后使缓存失效
+
+    供ETL在写入 data_update_log 后调用; 传入 version 时按数据版本失效
+    """
+    if version is not None:
+        invalidated = result_cache.set_data_version(version)
+    else:
+        result_cache.invalidate_all()
+        invalidated = True
+    return {"invalidated": invalidated, "data_version": result_cache.data_version}
+
+@app.get("/api/cache/stats")
+async def get_cache_stats(current_user: str = Depends(verify_token)):
+    """缓存命中统计"""
+    return result_cache.stats()
+
+@app.on_event("startup")
+async def start_data_version_watcher():
+    """配置了ClickHouse时, 定期检查 data_update_log 以触发缓存失效"""
+    global data_version_watcher
+    if os.getenv("CLICKHOUSE_HOST"):
+        data_version_watcher = DataVersionWatcher(
+            result_cache,
+            clickhouse_update_log_probe,
+            interval=float(os.getenv("DATA_VERSION_CHECK_INTERVAL", "60")),
+        )
+        data_version_watcher.start()
+
+@app.on_event("shutdown")
+async def stop_data_version_watcher():
+    if data_version_watcher is not None:
+        await data_version_watcher.stop()
+
 # ============================================
 # 竞品分析
 # ============================================
@@ -313,13 +325,23 @@ async def get_forecast_trend(current_user: str = Depends(verify_token)):
 
 @app.get("/api/forecast/accuracy")
 async def get_forecast_accuracy(current_user: str = Depends(verify_token)):
-    """获取预测准确率"""
+    """获取预测准确率 (各模型在全部产品上的回测平均指标, 尚无回测结果时返回参考值)"""
+    summary = backtest_store.summary()
+    if summary:
+        return {
+            "models": [
+                {"name": MODEL_NAMES.get(name, name), **metrics}
+                for name, metrics in sorted(summary.items(), key=lambda item: float("inf") if item[1]["mape"] is None else item[1]["mape"])
+            ],
+            "source": "backtest"
+        }
     data = {
         "models": [
             {"name": "ARIMA", "mape": 8.5, "rmse": 1250, "mae": 980},
             {"name": "Prophet", "mape": 7.2, "rmse": 1100, "mae": 850},
             {"name": "XGBoost", "mape": 6.8, "rmse": 1050, "mae": 820}
-        ]
+        ],
+        "source": "reference"
     }
     return data
 
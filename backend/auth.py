@@ -0,0 +1,144 @@
+"""
+认证模块 - JWT签发与校验
+各服务共享, 已校验的Token按摘要缓存, 避免每个请求重复做HMAC校验
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt
+
+# JWT配置
+SECRET_KEY = "your-secret-key-here-change-in-production"
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24小时
+
+# 安全认证
+security = HTTPBearer()
+# 推送接口: 浏览器 EventSource 无法设置请求头, 允许缺省并改用查询参数
+optional_security = HTTPBearer(auto_error=False)
+
+
+class VerifiedTokenCache:
+    """
+    已校验Token缓存 (LRU)
+
+    - key 为Token的SHA-256摘要, 不保存Token原文
+    - 条目在Token的exp到期或超过max_age后失效, 过期Token不会因缓存而通过校验
+    """
+
+    def __init__(self, max_entries: int = 4096, max_age: float = 300.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self.digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: dict):
+        now = time.time()
+        expires_at = now + self.max_age
+        exp = payload.get("exp")
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        if expires_at <= now:
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries}
+
+
+token_cache = VerifiedTokenCache()
+
+
+def create_access_token(data: dict):
+    to_encode = data.copy()
+    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+
+def decode_token(token: str) -> dict:
+    """校验Token并返回载荷, 命中缓存时跳过签名校验"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="登录已过期,请重新登录",
+        )
+    except jwt.JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的认证凭证",
+        )
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的认证凭证",
+        )
+    token_cache.put(token, payload)
+    return payload
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return decode_token(credentials.credentials)["sub"]
+
+
+def verify_stream_token(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    """推送接口的认证: 优先使用 Authorization 头, 否则使用 ?token= 参数"""
+    raw = credentials.credentials if credentials else token
+    if not raw:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="未提供认证凭证",
+        )
+    return decode_token(raw)["sub"]
+
+
+def get_permission_scope(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """校验Token并返回用户权限范围, 权限相同的用户共享缓存结果"""
+    user_info = decode_token(credentials.credentials).get("user_info") or {}
+    role = user_info.get("role", "")
+    permissions = ",".join(sorted(user_info.get("permissions", [])))
+    return f"{role}|{permissions}"
@@ -0,0 +1,295 @@
+"""
+模型回测 - 滚动起点回测与结果存储
+在历史序列上按多个预测起点重放: 起点之前的数据训练, 之后 horizon 期对比实际值;
+各模型对全部序列一次训练/推理, 误差指标按序列向量化计算, 同时记录训练与推理耗时
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from forecast_models import MODEL_PROFILES, forecast_matrix
+from stat_forecast import add_months, build_series_matrix, fit_ets, forecast_metrics
+
+# 模型展示名称
+MODEL_NAMES = {
+    "naive": "Seasonal Naive",
+    "ets": "ETS",
+    "xgboost": "XGBoost",
+    "lstm": "LSTM",
+    "transformer": "Transformer",
+}
+
+METRIC_KEYS = ("mape", "rmse", "mae", "r2_score")
+
+
+# ============================================
+# 回测模型
+# ============================================
+# 每个模型为 (train, predict): train(y, season_length) 返回训练状态,
+# predict(state, horizon) 返回 (N, horizon) 预测矩阵
+
+def _train_naive(y: np.ndarray, season_length: Optional[int]):
+    m = season_length if season_length and y.shape[1] >= season_length else 1
+    return y[:, -m:]
+
+
+def _predict_naive(last_season: np.ndarray, horizon: int) -> np.ndarray:
+    idx = np.arange(horizon) % last_season.shape[1]
+    return last_season[:, idx]
+
+
+def _train_ets(y: np.ndarray, season_length: Optional[int]):
+    return fit_ets(y, season_length=season_length)
+
+
+def _predict_ets(fit, horizon: int) -> np.ndarray:
+    return fit.forecast(horizon)[0]
+
+
+def _profile_model(model_type: str):
+    def train(y: np.ndarray, season_length: Optional[int]):
+        # 与 ProfileForecastModel.fit 一致: 基线取训练窗口均值
+        return y.mean(axis=1)
+
+    def predict(levels: np.ndarray, horizon: int) -> np.ndarray:
+        rng = np.random.default_rng(0)
+        return forecast_matrix(model_type, len(levels), horizon, rng=rng, level=levels)[0]
+
+    return train, predict
+
+
+BACKTEST_MODELS: Dict[str, tuple] = {
+    "naive": (_train_naive, _predict_naive),
+    "ets": (_train_ets, _predict_ets),
+    **{name: _profile_model(name) for name in MODEL_PROFILES},
+}
+
+
+# ============================================
+# 滚动起点回测
+# ============================================
+
+def rolling_origins(n_obs: int, horizon: int, n_origins: int, step: int = 1, min_train: int = 3) -> List[int]:
+    """回测起点(训练集长度)列表, 最后一个起点的预测窗口恰好落在序列末尾"""
+    last = n_obs - horizon
+    origins = [last - i * step for i in range(n_origins)]
+    return sorted(o for o in origins if o >= min_train)
+
+
+def backtest(
+    y: np.ndarray,
+    models: Sequence[str] = tuple(BACKTEST_MODELS),
+    horizon: int = 3,
+    n_origins: int = 6,
+    step: int = 1,
+    season_length: Optional[int] = 12,
+) -> Dict[str, Dict]:
+    """
+    对 (N, T) 序列矩阵执行滚动起点回测
+
+    返回 {模型: {"mape"/"rmse"/"mae"/"r2_score": 形状 (N,) 的数组,
+                 "training_time_ms"/"inference_time_ms": 按序列分摊的耗时}}
+    """
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    if y.ndim == 1:
+        y = y[np.newaxis, :]
+    n = len(y)
+    origins = rolling_origins(y.shape[1], horizon, n_origins, step)
+    if not origins:
+        raise ValueError(f"序列长度不足, 至少需要 {horizon + 3} 期")
+
+    # 各起点的实际值拼接为 (N, 起点数 x horizon), 指标一次计算
+    actual = np.concatenate([y[:, o:o + horizon] for o in origins], axis=1)
+
+    results = {}
+    for name in models:
+        if name not in BACKTEST_MODELS:
+            raise ValueError(f"不支持的回测模型: {name}")
+        train, predict = BACKTEST_MODELS[name]
+        train_seconds = 0.0
+        predict_seconds = 0.0
+        predictions = []
+        for origin in origins:
+            started = time.perf_counter()
+            state = train(y[:, :origin], season_length)
+            trained = time.perf_counter()
+            predictions.append(predict(state, horizon))
+            predict_seconds += time.perf_counter() - trained
+            train_seconds += trained - started
+
+        metrics = forecast_metrics(actual, np.concatenate(predictions, axis=1))
+        metrics["training_time_ms"] = train_seconds / len(origins) / n * 1000
+        metrics["inference_time_ms"] = predict_seconds / len(origins) / n * 1000
+        results[name] = metrics
+    return results
+
+
+def _clean(value) -> Optional[float]:
+    value = float(value)
+    return round(value, 6) if np.isfinite(value) else None
+
+
+def backtest_rows(product_ids: List[str], results: Dict[str, Dict], horizon: int, origins: int) -> List[Dict]:
+    """整理为 model_backtest 表的行"""
+    run_id = uuid.uuid4().hex
+    today = date.today()
+    rows = []
+    for name, metrics in results.items():
+        for i, product_id in enumerate(product_ids):
+            rows.append({
+                "run_id": run_id,
+                "run_date": today,
+                "model_name": name,
+                "product_id": product_id,
+                "horizon": horizon,
+                "origins": origins,
+                **{key: _clean(metrics[key][i]) for key in METRIC_KEYS},
+                "training_time_ms": _clean(metrics["training_time_ms"]),
+                "inference_time_ms": _clean(metrics["inference_time_ms"]),
+            })
+    return rows
+
+
+# ============================================
+# 结果存储
+# ============================================
+
+class BacktestStore:
+    """
+    最近一次回测结果, 按 产品 -> 模型 保存为JSON文件
+
+    回测任务与API服务可能在不同进程, 读取时按文件修改时间自动重新加载
+    """
+
+    def __init__(self, path: str = "/tmp/data-insights-models/backtest.json"):
+        self.path = path
+        self._results: Dict[str, Dict[str, Dict]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "BacktestStore":
+        return cls(path=os.getenv("BACKTEST_RESULTS_PATH", "/tmp/data-insights-models/backtest.json"))
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self._results = json.load(f)
+        self._mtime = mtime
+
+    def save(self, rows: List[Dict]):
+        """合并新结果(同一 产品+模型 覆盖旧结果)并写盘"""
+        with self._lock:
+            self._reload()
+            for row in rows:
+                entry = {k: v for k, v in row.items() if k not in ("product_id", "model_name")}
+                entry["run_date"] = str(entry["run_date"])
+                self._results.setdefault(row["product_id"], {})[row["model_name"]] = entry
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._results, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    def for_product(self, product_id: str) -> Dict[str, Dict]:
+        with self._lock:
+            self._reload()
+            return dict(self._results.get(product_id, {}))
+
+    def summary(self) -> Dict[str, Dict]:
+        """各模型在全部产品上的平均指标"""
+        with self._lock:
+            self._reload()
+            by_model: Dict[str, List[Dict]] = {}
+            for models in self._results.values():
+                for name, entry in models.items():
+                    by_model.setdefault(name, []).append(entry)
+
+        summary = {}
+        for name, entries in by_model.items():
+            keys = METRIC_KEYS + ("training_time_ms", "inference_time_ms")
+            values = np.array([[np.nan if e.get(k) is None else e[k] for k in keys] for e in entries])
+            with np.errstate(all="ignore"):
+                means = np.nanmean(values, axis=0)
+            summary[name] = {k: _clean(v) for k, v in zip(keys, means)}
+            summary[name]["products"] = len(entries)
+        return summary
+
+
+# ============================================
+# 定时回测
+# ============================================
+
+MONTHLY_PRODUCT_SQL = """
+SELECT
+    product_id,
+    groupArray((month, amount)) AS points
+FROM (
+    SELECT product_id, toStartOfMonth(sale_date) AS month, sum(sales_amount) AS amount
+    FROM sales_data
+    WHERE sale_date >= toStartOfMonth(today()) - INTERVAL {months:UInt32} MONTH
+      AND sale_date < toStartOfMonth(today())
+    GROUP BY product_id, month
+)
+GROUP BY product_id
+"""
+
+
+def run_backtest(
+    client,
+    store: BacktestStore,
+    months: int = 36,
+    horizon: int = 3,
+    n_origins: int = 6,
+    log: Callable[[str], None] = print,
+) -> Dict:
+    """
+    对全部产品的月度销售额回测, 结果写入 model_backtest 表和本地结果存储
+
+    client 为 clickhouse_connect 客户端
+    """
+    this_month = date.today().replace(day=1)
+    result = client.query(MONTHLY_PRODUCT_SQL, parameters={"months": months})
+    series = list(result.named_results())
+    if not series:
+        return {"products": 0, "rows": 0}
+
+    y = build_series_matrix(series, add_months(this_month, -months), months)
+    results = backtest(y, horizon=horizon, n_origins=n_origins)
+    for name, metrics in results.items():
+        log(f"{MODEL_NAMES.get(name, name):>15}: MAPE {np.nanmean(metrics['mape']):.2f}%  "
+            f"训练 {metrics['training_time_ms']:.3f}ms/序列  推理 {metrics['inference_time_ms']:.3f}ms/序列")
+
+    rows = backtest_rows([s["product_id"] for s in series], results, horizon, n_origins)
+    columns = list(rows[0])
+    client.insert("model_backtest", [[row[c] for c in columns] for row in rows], column_names=columns)
+    store.save(rows)
+    return {"products": len(series), "rows": len(rows)}
+
+
+if __name__ == "__main__":
+    import clickhouse_connect
+
+    client = clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+    )
+    summary = run_backtest(client, BacktestStore.from_env())
+    print(f"✅ 已回测 {summary['products']} 个产品, 写入 {summary['rows']} 行")
@@ -0,0 +1,45 @@
+"""
+认证开销基准测试
+对比每次完整JWT校验与命中已校验Token缓存时的单次请求认证耗时
+
+用法: python bench_auth.py [次数]
+"""
+
+import sys
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from auth import create_access_token, verify_token, token_cache
+
+
+def bench(label: str, func, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed / rounds * 1e6:>10.2f} µs/次")
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = create_access_token(
+        data={"sub": "admin", "user_info": {"role": "admin", "permissions": ["dashboard"]}}
+    )
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def uncached():
+        token_cache.clear()
+        verify_token(credentials)
+
+    def cached():
+        verify_token(credentials)
+
+    print(f"认证开销基准 ({rounds} 次)")
+    bench("完整JWT校验", uncached, rounds)
+    verify_token(credentials)
+    bench("命中Token缓存", cached, rounds)
+
+
+if __name__ == "__main__":
+    main()
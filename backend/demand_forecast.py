@@ -0,0 +1,90 @@
+"""
+需求预测 - 多个 产品 x 仓库 序列的批量预测
+每条序列从日销量历史学习星期季节性(乘法指数, 向全局均值收缩), 去季节后做线性趋势回归;
+全部序列组成二维矩阵一次计算, 汇总指标同样按矩阵计算
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+# 每个星期几的观测数较少时, 季节指数向1收缩的强度(相当于的先验观测数)
+SEASONAL_SHRINKAGE = 2.0
+# 预测区间 (约85%置信度)
+INTERVAL_Z = 1.44
+
+
+def weekly_profiles(history: np.ndarray, end: date) -> np.ndarray:
+    """
+    每条序列的星期季节指数, 形状 (N, 7), 下标为 date.weekday()
+
+    history 为 (N, T) 日销量矩阵, 最后一列对应 end
+    """
+    n, t_len = history.shape
+    weekdays = (np.arange(t_len) - (t_len - 1) + end.weekday()) % 7
+    sums = np.zeros((n, 7))
+    counts = np.bincount(weekdays, minlength=7).astype(np.float64)
+    for wd in range(7):
+        sums[:, wd] = history[:, weekdays == wd].sum(axis=1)
+
+    overall = history.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raw = (sums / counts) / overall
+    raw = np.where(np.isfinite(raw), raw, 1.0)
+    profile = (raw * counts + SEASONAL_SHRINKAGE) / (counts + SEASONAL_SHRINKAGE)
+    # 归一化, 使一周的平均指数为1
+    return profile / profile.mean(axis=1, keepdims=True)
+
+
+def forecast_batch(history: np.ndarray, horizon: int, end: date = None, rounded: bool = True) -> Dict[str, np.ndarray]:
+    """
+    批量预测未来 horizon 天
+
+    返回 forecast / lower / upper (N, horizon) 矩阵, 以及 total / avg_daily / peak_index (N,) 汇总;
+    rounded=False 时不取整(供补货计算使用, 避免低销量产品被取整为0)
+    """
+    end = end or date.today()
+    history = np.asarray(history, dtype=np.float64)
+    n, t_len = history.shape
+    profile = weekly_profiles(history, end)
+
+    past_wd = (np.arange(t_len) - (t_len - 1) + end.weekday()) % 7
+    deseason = history / profile[:, past_wd]
+
+    # 按行最小二乘拟合线性趋势
+    t = np.arange(t_len, dtype=np.float64)
+    t_centered = t - t.mean()
+    slope = (deseason * t_centered).sum(axis=1) / (t_centered ** 2).sum()
+    intercept = deseason.mean(axis=1) - slope * t.mean()
+    residual = deseason - (intercept[:, np.newaxis] + slope[:, np.newaxis] * t)
+    sigma = residual.std(axis=1)
+
+    steps = np.arange(1, horizon + 1, dtype=np.float64)
+    future_wd = (end.weekday() + steps.astype(np.int64)) % 7
+    base = intercept[:, np.newaxis] + slope[:, np.newaxis] * (t_len - 1 + steps)
+    season = profile[:, future_wd]
+    forecast = np.maximum(base * season, 0)
+
+    width = INTERVAL_Z * sigma[:, np.newaxis] * np.sqrt(1 + steps / t_len) * season
+    lower = np.maximum(forecast - width, 0)
+    upper = forecast + width
+
+    if rounded:
+        forecast, lower, upper = np.round(forecast), np.round(lower), np.round(upper)
+    total = forecast.sum(axis=1)
+    return {
+        "forecast": forecast,
+        "lower": lower,
+        "upper": upper,
+        "total": total,
+        "avg_daily": total / horizon,
+        "peak_index": forecast.argmax(axis=1),
+        "weekly_profile": profile,
+    }
+
+
+def forecast_dates(horizon: int, start: date = None) -> List[str]:
+    """预测日期, 从明天开始"""
+    start = start or date.today()
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, horizon + 1)]
@@ -2,26 +2,39 @@
 数据导出API - 支持Excel和PDF导出
 """
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-from datetime import datetime
-import json
-import os
+from typing import Iterable, Iterator, List, Dict, Optional
+from datetime import date, datetime
+from html import escape
+from urllib.parse import quote
+import csv
+import io
+
+from export_jobs import ExportJob, ExportJobManager, ExportQueueFullError
 
 app = FastAPI(title="数据导出服务", version="1.0.0")
 
+# 后台导出任务
+export_jobs = ExportJobManager.from_env()
+
 class ExportRequest(BaseModel):
     """导出请求模型"""
     data_type: str  # 数据类型: sales, competitors, customers, inventory, medical等
     filters: Optional[Dict] = {}  # 筛选条件
-    format: str = "excel"  # 导出格式: excel, pdf, csv
+    format: str = "excel"  # 导出格式: excel, pdf, csv, parquet, arrow
     date_range: Optional[Dict] = None  # 时间范围
+    stream: bool = True  # CSV/HTML是否以分块流式响应返回(不落盘)
+    rows_per_page: Optional[int] = None  # HTML报告每页行数, 为空时不分页
+
+# 流式导出每批读取/写出的行数
+EXPORT_BATCH_SIZE = 5000
 
 # 模拟数据存储
 MOCK_DATA = {
     "sales": {
         "columns": ["日期", "产品名称", "销售额(万元)", "销售量(盒)", "增长率(%)", "区域"],
+        "types": ["date", "string", "int64", "int64", "float64", "string"],
         "data": [
             ["2024-12-01", "阿莫西林胶囊", 5200, 350000, 5.2, "华东"],
             ["2024-12-02", "布洛芬缓释", 4800, 320000, 4.8, "华南"],
@@ -32,6 +45,7 @@ MOCK_DATA = {
     },
     "competitors": {
         "columns": ["竞品名称", "市场份额(%)", "月销售额(万元)", "增长率(%)", "主力产品"],
+        "types": ["string", "float64", "int64", "float64", "string"],
         "data": [
             ["竞品A", 26.0, 16200, -1.5, "抗生素系列"],
             ["竞品B", 21.0, 12800, 3.0, "解热镇痛类"],
@@ -41,6 +55,7 @@ MOCK_DATA = {
     },
     "customers": {
         "columns": ["医院名称", "区域", "等级", "月销售额(万元)", "RFM分层", "增长潜力"],
+        "types": ["string", "string", "string", "int64", "string", "string"],
         "data": [
             ["北京市协和医院", "华北", "三甲", 2850, "重要价值客户", "高"],
             ["上海市华山医院", "华东", "三甲", 2680, "重要发展客户", "高"],
@@ -51,6 +66,7 @@ MOCK_DATA = {
     },
     "inventory": {
         "columns": ["产品名称", "当前库存", "安全库存", "库存状态", "周转天数", "需求预测(30天)"],
+        "types": ["string", "int64", "int64", "string", "int64", "int64"],
         "data": [
             ["阿莫西林胶囊", 85000, 50000, "正常", 25, 95000],
             ["布洛芬缓释", 42000, 30000, "正常", 22, 48000],
@@ -61,6 +77,7 @@ MOCK_DATA = {
     },
     "medical": {
         "columns": ["医院名称", "处方总数", "合理处方(%)", "不合理处方", "主要问题", "优化建议"],
+        "types": ["string", "int64", "float64", "int64", "string", "string"],
         "data": [
             ["北京市协和医院", 15200, 96.5, 528, "剂量偏高", "调整用药方案"],
             ["上海市华山医院", 14800, 95.8, 620, "疗程过长", "缩短用药周期"],
@@ -70,67 +87,234 @@ MOCK_DATA = {
     }
 }
 
+def iter_data_batches(data: Dict, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List]:
+    """按批读取数据行, 接入 sales_data 等数据表时替换为分页/游标查询"""
+    rows = data['data']
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+def iter_csv_chunks(columns: List[str], batches: Iterable[List]) -> Iterator[bytes]:
+    """逐批生成CSV内容, 内存占用只与批大小有关"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # 带BOM, 与原 utf-8-sig 文件一致, 便于Excel识别编码
+    writer.writerow(columns)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
 def generate_csv_file(data_type: str, data: Dict) -> str:
     """生成CSV文件"""
     filename = f"/tmp/{data_type}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 
-    with open(filename, 'w', encoding='utf-8-sig') as f:
-        # 写入列头
-        f.write(','.join(data['columns']) + '\n')
-        # 写入数据
-        for row in data['data']:
-            f.write(','.join(str(v) for v in row) + '\n')
+    with open(filename, 'wb') as f:
+        for chunk in iter_csv_chunks(data['columns'], iter_data_batches(data)):
+            f.write(chunk)
 
     return filename
 
-def generate_html_report(data_type: str, data: Dict) -> str:
-    """生成HTML报告(可用于PDF转换)"""
-    html_content = f"""
-    <!DOCTYPE html>
+class _ChunkSink(io.RawIOBase):
+    """收集写入的字节, 供流式响应按批取出"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+# 列类型 -> Arrow类型
+ARROW_TYPES = {
+    "string": "string",
+    "int64": "int64",
+    "float64": "float64",
+    "date": "date32",
+}
+
+def arrow_schema(data: Dict):
+    """根据数据的列定义生成Arrow schema"""
+    import pyarrow as pa
+    return pa.schema([
+        pa.field(name, getattr(pa, ARROW_TYPES[col_type])())
+        for name, col_type in zip(data['columns'], data['types'])
+    ])
+
+def to_record_batch(schema, col_types: List[str], rows: List):
+    """将一批行数据转换为按列存储的RecordBatch"""
+    import pyarrow as pa
+    arrays = []
+    for i, (field, col_type) in enumerate(zip(schema, col_types)):
+        values = [row[i] for row in rows]
+        if col_type == "date":
+            values = [date.fromisoformat(v) if isinstance(v, str) else v for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def iter_columnar_chunks(data: Dict, file_format: str, batches: Iterable[List]) -> Iterator[bytes]:
+    """
+    逐批生成Parquet / Arrow IPC内容
+
+    每批数据写为一个row group (Parquet) 或一个record batch (Arrow IPC),
+    内存占用只与批大小有关
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(data)
+    sink = _ChunkSink()
+    out = pa.PythonFile(sink, mode='w')
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(out, schema, compression='zstd')
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_file(out, schema)
+        write = writer.write_batch
+
+    try:
+        for batch in batches:
+            if batch:
+                write(to_record_batch(schema, data['types'], batch))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+COLUMNAR_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+def stream_columnar_response(data_type: str, data: Dict, file_format: str) -> StreamingResponse:
+    """以分块传输的方式返回Parquet / Arrow IPC文件"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="服务端未安装pyarrow, 不支持列式格式导出")
+
+    extension, media_type = COLUMNAR_FORMATS[file_format]
+    filename = f"{data_type}_export_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return StreamingResponse(
+        iter_columnar_chunks(data, file_format, iter_data_batches(data)),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+    )
+
+def stream_csv_response(data_type: str, data: Dict) -> StreamingResponse:
+    """以分块传输的方式返回CSV, 不生成临时文件"""
+    filename = f"{data_type}_export_{datetime.now().strftime('%Y%m%d')}.csv"
+    return StreamingResponse(
+        iter_csv_chunks(data['columns'], iter_data_batches(data)),
+        media_type='text/csv; charset=utf-8',
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+    )
+
+HTML_REPORT_STYLE = """
+            body { font-family: Arial, sans-serif; padding: 20px; }
+            h1 { color: #3b82f6; }
+            table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+            th { background: #3b82f6; color: white; padding: 12px; text-align: left; }
+            td { border: 1px solid #ddd; padding: 10px; }
+            tr:nth-child(even) { background: #f9f9f9; }
+            .page + .page { page-break-before: always; }
+            .page-no { color: #666; font-size: 12px; margin-top: 20px; }
+            .footer { margin-top: 30px; color: #666; font-size: 12px; }
+"""
+
+def iter_html_chunks(
+    data_type: str,
+    columns: List[str],
+    batches: Iterable[List],
+    rows_per_page: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    流式渲染HTML报告: 先输出页头, 再逐批输出表格行, 最后输出页脚
+
+    设置 rows_per_page 时每页单独成表并重复表头, 打印/转PDF时自动分页;
+    内存占用只与批大小有关
+    """
+    title = escape(data_type.upper())
+    header_row = '<tr>' + ''.join(f'<th>{escape(str(col))}</th>' for col in columns) + '</tr>\n'
+
+    yield f"""<!DOCTYPE html>
     <html>
     <head>
         <meta charset="UTF-8">
-        <title>{data_type.upper()} 数据报告</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; padding: 20px; }}
-            h1 {{ color: #3b82f6; }}
-            table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
-            th {{ background: #3b82f6; color: white; padding: 12px; text-align: left; }}
-            td {{ border: 1px solid #ddd; padding: 10px; }}
-            tr:nth-child(even) {{ background: #f9f9f9; }}
-            .footer {{ margin-top: 30px; color: #666; font-size: 12px; }}
-        </style>
+        <title>{title} 数据报告</title>
+        <style>{HTML_REPORT_STYLE}        </style>
     </head>
     <body>
-        <h1>{data_type.upper()} 数据分析报告</h1>
+        <h1>{title} 数据分析报告</h1>
         <p>生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-        <table>
-            <tr>
-                {''.join(f'<th>{col}</th>' for col in data['columns'])}
-            </tr>
-            {''.join(f'<tr>{"".join(f"<td>{v}</td>" for v in row)}</tr>' for row in data['data'])}
-        </table>
-        <div class="footer">
+""".encode('utf-8')
+
+    page_no = 1
+    rows_on_page = 0
+    parts = ['<div class="page"><table>\n', header_row]
+    for batch in batches:
+        for row in batch:
+            if rows_per_page and rows_on_page >= rows_per_page:
+                page_no += 1
+                rows_on_page = 0
+                parts.append('</table></div>\n')
+                parts.append(f'<div class="page"><p class="page-no">第 {page_no} 页</p><table>\n')
+                parts.append(header_row)
+            parts.append('<tr>' + ''.join(f'<td>{escape(str(v))}</td>' for v in row) + '</tr>\n')
+            rows_on_page += 1
+        yield ''.join(parts).encode('utf-8')
+        parts.clear()
+    parts.append('</table></div>\n')
+
+    parts.append("""        <div class="footer">
             <p>本报告由智能数据平台自动生成</p>
             <p>DATA INSIGHTS - Pharmaceutical Data Platform</p>
         </div>
     </body>
     </html>
-    """
+""")
+    yield ''.join(parts).encode('utf-8')
 
+def generate_html_report(data_type: str, data: Dict, rows_per_page: Optional[int] = None) -> str:
+    """生成HTML报告(可用于PDF转换)"""
     filename = f"/tmp/{data_type}_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    with open(filename, 'wb') as f:
+        for chunk in iter_html_chunks(data_type, data['columns'], iter_data_batches(data), rows_per_page):
+            f.write(chunk)
 
     return filename
 
+def stream_html_response(data_type: str, data: Dict, rows_per_page: Optional[int] = None) -> StreamingResponse:
+    """以分块传输的方式返回HTML报告, 不生成临时文件"""
+    filename = f"{data_type}_report_{datetime.now().strftime('%Y%m%d')}.html"
+    return StreamingResponse(
+        iter_html_chunks(data_type, data['columns'], iter_data_batches(data), rows_per_page),
+        media_type='text/html; charset=utf-8',
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+    )
+
 @app.get("/")
 async def root():
     """根路径"""
     return {
         "service": "数据导出服务",
         "version": "1.0.0",
-        "formats": ["excel", "csv", "html"],
+        "formats": ["excel", "csv", "html", "parquet", "arrow"],
         "data_types": list(MOCK_DATA.keys())
     }
 
@@ -145,22 +329,30 @@ async def export_data(request: ExportRequest):
     data = MOCK_DATA[request.data_type]
 
     # 根据格式生成文件
-    if request.format == "csv":
+    if request.format == "csv" and request.stream:
+        return stream_csv_response(request.data_type, data)
+    elif request.format == "csv":
         filename = generate_csv_file(request.data_type, data)
         return FileResponse(
             filename,
             media_type='text/csv',
             filename=f"{request.data_type}_export_{datetime.now().strftime('%Y%m%d')}.csv"
         )
+    elif request.format in COLUMNAR_FORMATS:
+        return stream_columnar_response(request.data_type, data, request.format)
+    elif request.format == "html" and request.stream:
+        return stream_html_response(request.data_type, data, request.rows_per_page)
     elif request.format == "html":
-        filename = generate_html_report(request.data_type, data)
+        filename = generate_html_report(request.data_type, data, request.rows_per_page)
         return FileResponse(
             filename,
             media_type='text/html',
             filename=f"{request.data_type}_report_{datetime.now().strftime('%Y%m%d')}.html"
         )
-    else:
+    elif request.stream:
         # 默认返回CSV
+        return stream_csv_response(request.data_type, data)
+    else:
         filename = generate_csv_file(request.data_type, data)
         return FileResponse(
             filename,
@@ -168,6 +360,88 @@ async def export_data(request: ExportRequest):
             filename=f"{request.data_type}_export_{datetime.now().strftime('%Y%m%d')}.csv"
         )
 
+def build_job_chunks(data_type: str, data: Dict, file_format: str, rows_per_page: Optional[int] = None):
+    """返回 (文件名, 内容生成函数), 供后台任务写文件"""
+    suffix = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if file_format in COLUMNAR_FORMATS:
+        extension = COLUMNAR_FORMATS[file_format][0]
+
+        def make_chunks(job: ExportJob):
+            return iter_columnar_chunks(data, file_format, job.track(iter_data_batches(data)))
+    elif file_format == "html":
+        extension = "html"
+
+        def make_chunks(job: ExportJob):
+            return iter_html_chunks(
+                data_type, data['columns'], job.track(iter_data_batches(data)), rows_per_page
+            )
+    else:
+        extension = "csv"
+
+        def make_chunks(job: ExportJob):
+            return iter_csv_chunks(data['columns'], job.track(iter_data_batches(data)))
+
+    return f"{data_type}_export_{suffix}.{extension}", make_chunks
+
+@app.post("/api/export/jobs")
+async def create_export_job(request: ExportRequest):
+    """提交后台导出任务, 立即返回任务ID"""
+    if request.data_type not in MOCK_DATA:
+        raise HTTPException(status_code=400, detail=f"不支持的数据类型: {request.data_type}")
+    if request.format in COLUMNAR_FORMATS:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="服务端未安装pyarrow, 不支持列式格式导出")
+
+    data = MOCK_DATA[request.data_type]
+    filename, make_chunks = build_job_chunks(
+        request.data_type, data, request.format, request.rows_per_page
+    )
+    try:
+        job = export_jobs.submit(
+            request.data_type,
+            request.format,
+            filename,
+            make_chunks,
+            total_rows=len(data['data'])
+        )
+    except ExportQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return job.to_dict()
+
+@app.get("/api/export/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """查询导出任务进度"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    return job.to_dict()
+
+@app.get("/api/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str):
+    """下载已完成任务的导出文件"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"导出任务未完成: {job.status}")
+    return FileResponse(job.path, filename=job.filename)
+
+@app.delete("/api/export/jobs/{job_id}")
+async def cancel_export_job(job_id: str):
+    """取消导出任务"""
+    job = export_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    return job.to_dict()
+
+@app.on_event("shutdown")
+async def shutdown_export_jobs():
+    export_jobs.shutdown()
+
 @app.get("/api/export/data-types")
 async def get_data_types():
     """获取可导出的数据类型列表"""
@@ -186,8 +460,8 @@ async def get_export_status():
     """获取导出服务状态"""
     return {
         "status": "running",
-        "supported_formats": ["csv", "html"],
-        "total_exports": len(os.listdir("/tmp")) if os.path.exists("/tmp") else 0,
+        "supported_formats": ["csv", "html", "parquet", "arrow"],
+        **export_jobs.stats(),
         "last_check": datetime.now().isoformat()
     }
 
@@ -196,5 +470,5 @@ if __name__ == "__main__":
     print("📊 数据导出服务启动中...")
     print("📍 访问地址: http://localhost:8004")
     print("📖 API文档: http://localhost:8004/docs")
-    print("✅ 支持格式: CSV, HTML")
+    print("✅ 支持格式: CSV, HTML, Parquet, Arrow")
     uvicorn.run(app, host="0.0.0.0", port=8004)
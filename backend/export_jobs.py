@@ -0,0 +1,232 @@
+"""
+导出任务队列 - 后台生成导出文件
+提交后立即返回任务ID, 由有界线程池生成文件, 支持进度查询、取消和结果保留/淘汰
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class ExportQueueFullError(Exception):
+    """排队任务数已达上限"""
+
+
+class ExportCancelledError(Exception):
+    """任务已被取消"""
+
+
+class ExportJob:
+    """单个导出任务的状态"""
+
+    def __init__(self, data_type: str, file_format: str, filename: str, total_rows: Optional[int]):
+        self.job_id = uuid.uuid4().hex
+        self.data_type = data_type
+        self.format = file_format
+        self.filename = filename
+        self.total_rows = total_rows
+        self.rows_written = 0
+        self.status = "queued"  # queued, running, completed, failed, cancelled
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.size_bytes = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def cancel(self):
+        self._cancel.set()
+
+    def track(self, batches: Iterable[List]) -> Iterator[List]:
+        """包装数据批次迭代器: 统计已写行数, 并在批次之间响应取消"""
+        for batch in batches:
+            if self._cancel.is_set():
+                raise ExportCancelledError()
+            yield batch
+            self.rows_written += len(batch)
+
+    def to_dict(self) -> Dict:
+        progress = None
+        if self.status == "completed":
+            progress = 100.0
+        elif self.total_rows:
+            progress = round(min(self.rows_written / self.total_rows, 1.0) * 100, 1)
+
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        return {
+            "job_id": self.job_id,
+            "data_type": self.data_type,
+            "format": self.format,
+            "status": self.status,
+            "rows_written": self.rows_written,
+            "total_rows": self.total_rows,
+            "progress": progress,
+            "size_bytes": self.size_bytes,
+            "error": self.error,
+            "created_at": fmt(self.created_at),
+            "started_at": fmt(self.started_at),
+            "finished_at": fmt(self.finished_at),
+        }
+
+
+class ExportJobManager:
+    """
+    导出任务管理
+
+    - **max_workers**: 同时生成的任务数
+    - **max_pending**: 排队+执行中的任务上限, 超出时拒绝提交
+    - **retention_seconds**: 已完成任务及其文件的保留时长
+    - **max_total_bytes**: 保留文件的总大小上限, 超出时淘汰最早完成的任务
+    """
+
+    def __init__(
+        self,
+        export_dir: str = "/tmp/data-insights-exports",
+        max_workers: int = 2,
+        max_pending: int = 32,
+        retention_seconds: float = 3600.0,
+        max_total_bytes: int = 2 * 1024 ** 3,
+    ):
+        self.export_dir = export_dir
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.max_total_bytes = max_total_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self.total_exports = 0
+        os.makedirs(export_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ExportJobManager":
+        return cls(
+            export_dir=os.getenv("EXPORT_DIR", "/tmp/data-insights-exports"),
+            max_workers=int(os.getenv("EXPORT_WORKERS", "2")),
+            max_pending=int(os.getenv("EXPORT_MAX_PENDING", "32")),
+            retention_seconds=float(os.getenv("EXPORT_RETENTION_SECONDS", "3600")),
+            max_total_bytes=int(os.getenv("EXPORT_MAX_TOTAL_BYTES", str(2 * 1024 ** 3))),
+        )
+
+    def submit(
+        self,
+        data_type: str,
+        file_format: str,
+        filename: str,
+        make_chunks: Callable[[ExportJob], Iterable[bytes]],
+        total_rows: Optional[int] = None,
+    ) -> ExportJob:
+        """
+        提交导出任务
+
+        make_chunks 接收任务对象, 返回文件内容的字节块迭代器;
+        数据批次应经过 job.track() 以便统计进度和响应取消
+        """
+        self.evict()
+        job = ExportJob(data_type, file_format, filename, total_rows)
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if not j.finished)
+            if active >= self.max_pending:
+                raise ExportQueueFullError(f"导出任务排队已满({self.max_pending})")
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, make_chunks)
+        return job
+
+    def _finish(self, job: ExportJob, status: str, path: Optional[str] = None, error: Optional[str] = None):
+        """在锁内同时写入结束时间和终态, evict() 看到已结束的任务时 finished_at 必然已设置"""
+        with self._lock:
+            job.finished_at = time.time()
+            job.path = path
+            job.error = error
+            job.status = status
+            if status == "completed":
+                self.total_exports += 1
+
+    def _run(self, job: ExportJob, make_chunks: Callable[[ExportJob], Iterable[bytes]]):
+        if job._cancel.is_set():
+            self._finish(job, "cancelled")
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        path = os.path.join(self.export_dir, f"{job.job_id}_{job.filename}")
+        try:
+            with open(path, "wb") as f:
+                for chunk in make_chunks(job):
+                    f.write(chunk)
+                    job.size_bytes += len(chunk)
+            self._finish(job, "completed", path=path)
+        except ExportCancelledError:
+            self._remove_file(path)
+            self._finish(job, "cancelled")
+        except Exception as e:
+            self._remove_file(path)
+            self._finish(job, "failed", error=str(e))
+        self.evict()
+
+    @staticmethod
+    def _remove_file(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ExportJob]:
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+        return job
+
+    def evict(self) -> int:
+        """淘汰超过保留时长或超出总大小上限的已完成任务, 返回淘汰数量"""
+        now = time.time()
+        evicted = []
+        with self._lock:
+            finished = sorted(
+                (j for j in self._jobs.values() if j.finished),
+                key=lambda j: j.finished_at,
+            )
+            total_bytes = sum(j.size_bytes for j in finished if j.path)
+            for job in finished:
+                expired = now - job.finished_at > self.retention_seconds
+                if expired or total_bytes > self.max_total_bytes:
+                    if job.path:
+                        total_bytes -= job.size_bytes
+                    evicted.append(self._jobs.pop(job.job_id))
+        for job in evicted:
+            self._remove_file(job.path)
+        return len(evicted)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            total_exports = self.total_exports
+        by_status: Dict[str, int] = {}
+        for job in jobs:
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "total_exports": total_exports,
+            "jobs": by_status,
+            "retained_bytes": sum(j.size_bytes for j in jobs if j.path),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=False)
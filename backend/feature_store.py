@@ -0,0 +1,418 @@
+"""
+特征库 - 按 产品 x 省份 增量维护滚动窗口特征
+sales_data 只追加, 新数据到达时只更新受影响的累计量, 不从原始明细重算;
+状态按列存放为NumPy数组, 预测接口可直接以向量形式读取
+
+维护的特征:
+- 历史销售_7天均值 / 历史销售_30天均值: 30天环形缓冲区的日销售额
+- 季节性指数: 各自然月(1-12月)已结束月份的月均销售额 / 全部月份的月均销售额
+- 价格变动率: 本月均价相对上月均价的变化(%)
+"""
+
+import json
+import os
+import shutil
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WINDOW_DAYS = 30
+SHORT_WINDOW_DAYS = 7
+
+FEATURE_NAMES = ("sales_mean_7d", "sales_mean_30d", "seasonality_index", "price_change_rate")
+
+# 列名 -> (每行的形状, dtype)
+COLUMNS = {
+    "daily_amount": ((WINDOW_DAYS,), np.float64),     # 按 日序号 % 30 存放的日销售额
+    "month_amount": ((2,), np.float64),               # [上月, 本月] 销售额
+    "month_quantity": ((2,), np.float64),             # [上月, 本月] 销售数量
+    "moy_amount": ((12,), np.float64),                # 各自然月已结束月份的销售额合计
+    "moy_count": ((12,), np.int32),                   # 各自然月已结束月份的个数
+    "moy_years": ((12,), np.int64),                   # 各自然月已计数的年份, 按位记录(第 年份-MOY_BASE_YEAR 位)
+}
+
+# moy_years 按位记录年份的起始年份, 超出 0-62 位的年份记在边界位上
+MOY_BASE_YEAR = 2000
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def _year_bit(month: int) -> np.int64:
+    return np.int64(1) << np.int64(min(max(month // 12 - MOY_BASE_YEAR, 0), 62))
+
+
+def compute_features(
+    daily_amount: np.ndarray,
+    month_amount: np.ndarray,
+    month_quantity: np.ndarray,
+    moy_amount: np.ndarray,
+    moy_count: np.ndarray,
+    current_day: int,
+    current_month: int,
+) -> Dict[str, np.ndarray]:
+    """由累计量计算特征, 输入为按行排列的状态数组(可以是单个键, 也可以是按产品汇总后的结果)"""
+    short_slots = [(current_day - k) % WINDOW_DAYS for k in range(SHORT_WINDOW_DAYS)]
+    mean_7d = daily_amount[:, short_slots].sum(axis=1) / SHORT_WINDOW_DAYS
+    mean_30d = daily_amount.sum(axis=1) / WINDOW_DAYS
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        month_mean = moy_amount / moy_count
+        overall_mean = moy_amount.sum(axis=1) / moy_count.sum(axis=1)
+        seasonality = month_mean[:, current_month % 12] / overall_mean
+
+        price = month_amount / month_quantity
+        price_change = (price[:, 1] - price[:, 0]) / price[:, 0] * 100
+
+    return {
+        "sales_mean_7d": mean_7d,
+        "sales_mean_30d": mean_30d,
+        "seasonality_index": np.where(np.isfinite(seasonality), seasonality, 1.0),
+        "price_change_rate": np.where(np.isfinite(price_change), price_change, 0.0),
+    }
+
+
+class FeatureStore:
+    """
+    滚动特征库
+
+    每个 (产品ID, 省份) 对应各列数组中的一行; 全局时钟 current_day/current_month
+    为已接收数据中的最大日期, 时钟前进时环形缓冲区过期的日期和结束的月份被批量滚动
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 1024):
+        self.path = path
+        self.keys: List[Tuple[str, str]] = []
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._product_rows: Dict[str, List[int]] = {}
+        self.columns = {name: np.zeros((capacity,) + shape, dtype=dtype) for name, (shape, dtype) in COLUMNS.items()}
+        self.current_day: Optional[int] = None
+        self.current_month: Optional[int] = None
+        self.watermark: Optional[str] = None  # 已同步的 sales_data.create_time
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, mmap_mode: Optional[str] = None) -> "FeatureStore":
+        store = cls(path=os.getenv("FEATURE_STORE_DIR", "/tmp/data-insights-features"))
+        store.refresh(mmap_mode=mmap_mode)
+        return store
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ------------------------------------------
+    # 增量更新
+    # ------------------------------------------
+
+    def _rows_for(self, product_ids: Sequence[str], provinces: Sequence[str]) -> np.ndarray:
+        rows = np.empty(len(product_ids), dtype=np.int64)
+        for i, key in enumerate(zip(product_ids, provinces)):
+            row = self._index.get(key)
+            if row is None:
+                row = len(self.keys)
+                self._index[key] = row
+                self._product_rows.setdefault(key[0], []).append(row)
+                self.keys.append(key)
+            rows[i] = row
+
+        capacity = len(next(iter(self.columns.values())))
+        if len(self.keys) > capacity:
+            new_capacity = max(capacity * 2, len(self.keys))
+            for name, (shape, dtype) in COLUMNS.items():
+                grown = np.zeros((new_capacity,) + shape, dtype=dtype)
+                grown[:capacity] = self.columns[name]
+                self.columns[name] = grown
+        return rows
+
+    def _advance_day(self, day: int):
+        if self.current_day is None:
+            self.current_day = day
+            return
+        if day <= self.current_day:
+            return
+        # 清空从上次时钟到新时钟之间(已滑出窗口)的槽位
+        expired = range(self.current_day + 1, min(day, self.current_day + WINDOW_DAYS) + 1)
+        self.columns["daily_amount"][:, [d % WINDOW_DAYS for d in expired]] = 0
+        self.current_day = day
+
+    def _advance_month(self, month: int):
+        if self.current_month is None:
+            self.current_month = month
+            return
+        steps = month - self.current_month
+        if steps <= 0:
+            return
+        amount = self.columns["month_amount"]
+        quantity = self.columns["month_quantity"]
+        # 离开 [上月, 本月] 窗口的月份计入自然月累计
+        leaving = [(0, self.current_month - 1)]
+        if steps >= 2:
+            leaving.append((1, self.current_month))
+        for col, closed_month in leaving:
+            has_sales = amount[:, col] > 0
+            self.columns["moy_amount"][:, closed_month % 12] += amount[:, col]
+            self.columns["moy_count"][:, closed_month % 12] += has_sales
+            self.columns["moy_years"][has_sales, closed_month % 12] |= _year_bit(closed_month)
+        if steps == 1:
+            amount[:, 0] = amount[:, 1]
+            quantity[:, 0] = quantity[:, 1]
+        else:
+            amount[:, 0] = 0
+            quantity[:, 0] = 0
+        amount[:, 1] = 0
+        quantity[:, 1] = 0
+        self.current_month = month
+
+    def append(
+        self,
+        product_ids: Sequence[str],
+        provinces: Sequence[str],
+        dates: Sequence[date],
+        amounts: Sequence[float],
+        quantities: Sequence[float],
+    ):
+        """追加一批销售记录(可为明细或已按日汇总的数据)"""
+        if not len(product_ids):
+            return
+        days = np.array([d.toordinal() for d in dates], dtype=np.int64)
+        months = np.array([_month_index(d) for d in dates], dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        with self._lock:
+            rows = self._rows_for(product_ids, provinces)
+            # 按月份顺序推进时钟, 跨多个月的批次(如首次同步)也能正确结转自然月累计
+            for month in np.unique(months):
+                if self.current_month is not None and month < self.current_month - 1:
+                    # 早于 [上月, 本月] 窗口的迟到数据直接计入自然月累计
+                    hit = months == month
+                    self._add_closed_month(rows[hit], int(month), amounts[hit])
+                    continue
+                hit = months == month
+                self._add_month(rows[hit], days[hit], int(month), amounts[hit], quantities[hit])
+
+    def _add_closed_month(self, rows: np.ndarray, month: int, amounts: np.ndarray):
+        """迟到数据计入已结束月份; 该月份此前没有销售的行, 月份个数加一"""
+        moy = month % 12
+        bit = _year_bit(month)
+        np.add.at(self.columns["moy_amount"][:, moy], rows, amounts)
+        sold = np.unique(rows[amounts > 0])
+        first_sales = sold[(self.columns["moy_years"][sold, moy] & bit) == 0]
+        self.columns["moy_count"][first_sales, moy] += 1
+        self.columns["moy_years"][sold, moy] |= bit
+
+    def _add_month(self, rows: np.ndarray, days: np.ndarray, month: int, amounts: np.ndarray, quantities: np.ndarray):
+        self._advance_month(month)
+        self._advance_day(int(days.max()))
+
+        in_window = days > self.current_day - WINDOW_DAYS
+        np.add.at(
+            self.columns["daily_amount"],
+            (rows[in_window], days[in_window] % WINDOW_DAYS),
+            amounts[in_window],
+        )
+        col = 1 if month == self.current_month else 0
+        np.add.at(self.columns["month_amount"][:, col], rows, amounts)
+        np.add.at(self.columns["month_quantity"][:, col], rows, quantities)
+
+    # ------------------------------------------
+    # 读取
+    # ------------------------------------------
+
+    def _state(self, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """计算特征所需的累计量(moy_years 只用于增量维护月份个数)"""
+        n = len(self.keys)
+        return {
+            name: (col[:n] if rows is None else col[rows])
+            for name, col in self.columns.items()
+            if name != "moy_years"
+        }
+
+    def features(self) -> Dict[str, np.ndarray]:
+        """全部 产品 x 省份 的特征, 行顺序与 self.keys 一致"""
+        with self._lock:
+            if self.current_day is None:
+                return {name: np.zeros(0) for name in FEATURE_NAMES}
+            return compute_features(**self._state(), current_day=self.current_day, current_month=self.current_month)
+
+    def product_features(self, product_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        按产品汇总各省份的累计量后计算特征
+
+        返回各特征长度为 len(product_ids) 的数组, 另含 "found" 标记特征库中是否有该产品
+        """
+        with self._lock:
+            n = len(self.keys)
+            rows, targets = [], []
+            for i, product_id in enumerate(product_ids):
+                product_rows = self._product_rows.get(product_id, ())
+                rows.extend(product_rows)
+                targets.extend([i] * len(product_rows))
+            rows = np.array(rows, dtype=np.int64)
+            targets = np.array(targets, dtype=np.int64)
+            state = self._state(rows) if n else None
+            current_day, current_month = self.current_day, self.current_month
+
+        found = np.zeros(len(product_ids), dtype=bool)
+        if state is None or current_day is None:
+            return {**{name: np.zeros(len(product_ids)) for name in FEATURE_NAMES}, "found": found}
+
+        found[targets] = True
+        totals = {}
+        for name, values in state.items():
+            total = np.zeros((len(product_ids),) + values.shape[1:], dtype=values.dtype)
+            np.add.at(total, targets, values)
+            totals[name] = total
+        return {
+            **compute_features(**totals, current_day=current_day, current_month=current_month),
+            "found": found,
+        }
+
+    def daily_history(self, product_id: str) -> Optional[np.ndarray]:
+        """产品各省份合计的近30天日销售额, 按日期从早到晚排列; 特征库中没有该产品时返回None"""
+        with self._lock:
+            rows = self._product_rows.get(product_id)
+            if not rows or self.current_day is None:
+                return None
+            daily = self.columns["daily_amount"][rows].sum(axis=0)
+            current_day = self.current_day
+        slots = [(current_day - k) % WINDOW_DAYS for k in range(WINDOW_DAYS - 1, -1, -1)]
+        return daily[slots]
+
+    # ------------------------------------------
+    # 持久化
+    # ------------------------------------------
+
+    def save(self, path: Optional[str] = None):
+        """每列保存为一个 .npy 文件; 先写临时目录再替换, 读取方不会看到写了一半的数据"""
+        path = path or self.path
+        with self._lock:
+            n = len(self.keys)
+            tmp_dir = f"{path}.tmp-{os.getpid()}"
+            os.makedirs(tmp_dir, exist_ok=True)
+            for name, col in self.columns.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), col[:n])
+            with open(os.path.join(tmp_dir, "keys.json"), "w", encoding="utf-8") as f:
+                json.dump(self.keys, f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "current_day": self.current_day,
+                    "current_month": self.current_month,
+                    "watermark": self.watermark,
+                    "saved_at": datetime.now().isoformat(),
+                }, f)
+
+            old_dir = f"{path}.old-{os.getpid()}"
+            if os.path.isdir(path):
+                os.rename(path, old_dir)
+            os.rename(tmp_dir, path)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            self._loaded_mtime = os.path.getmtime(os.path.join(path, "meta.json"))
+
+    def refresh(self, mmap_mode: Optional[str] = None) -> bool:
+        """
+        磁盘上的数据比内存中新时重新加载, 返回是否加载
+
+        mmap_mode="r" 时以内存映射方式只读打开, 适合只读取特征的API进程
+        """
+        if not self.path:
+            return False
+        meta_path = os.path.join(self.path, "meta.json")
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except OSError:
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(self.path, "keys.json"), encoding="utf-8") as f:
+            keys = [tuple(key) for key in json.load(f)]
+        columns = {}
+        for name, (shape, dtype) in COLUMNS.items():
+            column_path = os.path.join(self.path, f"{name}.npy")
+            if os.path.exists(column_path):
+                columns[name] = np.load(column_path, mmap_mode=mmap_mode)
+            else:
+                # 旧版本保存的特征库没有该列
+                columns[name] = np.zeros((len(keys),) + shape, dtype=dtype)
+
+        with self._lock:
+            self.keys = keys
+            self._index = {key: i for i, key in enumerate(keys)}
+            self._product_rows = {}
+            for i, (product_id, _) in enumerate(keys):
+                self._product_rows.setdefault(product_id, []).append(i)
+            self.columns = columns
+            self.current_day = meta["current_day"]
+            self.current_month = meta["current_month"]
+            self.watermark = meta["watermark"]
+            self._loaded_mtime = mtime
+        return True
+
+
+# ============================================
+# 从 sales_data 增量同步
+# ============================================
+
+# 只读取水位线之后写入的记录, 按 产品 x 省份 x 日 汇总后追加
+INCREMENTAL_SALES_SQL = """
+SELECT
+    product_id,
+    sales_province AS province,
+    sale_date,
+    sum(sales_amount) AS amount,
+    sum(sales_quantity) AS quantity,
+    max(create_time) AS max_create_time
+FROM sales_data
+WHERE create_time > parseDateTimeBestEffort({watermark:String})
+  AND sale_date >= toStartOfMonth(today()) - INTERVAL {months:UInt32} MONTH
+GROUP BY product_id, sales_province, sale_date
+ORDER BY sale_date
+"""
+
+
+def sync_from_clickhouse(client, store: FeatureStore, history_months: int = 24) -> int:
+    """
+    拉取上次同步之后新增的销售数据并更新特征库, 返回处理的汇总行数
+
+    首次同步时读取最近 history_months 个月的数据
+    """
+    result = client.query(
+        INCREMENTAL_SALES_SQL,
+        parameters={"watermark": store.watermark or "1970-01-01 00:00:00", "months": history_months},
+    )
+    rows = list(result.named_results())
+    if not rows:
+        return 0
+
+    store.append(
+        [r["product_id"] for r in rows],
+        [r["province"] for r in rows],
+        [r["sale_date"] for r in rows],
+        [float(r["amount"]) for r in rows],
+        [float(r["quantity"]) for r in rows],
+    )
+    store.watermark = max(r["max_create_time"] for r in rows).strftime("%Y-%m-%d %H:%M:%S")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import clickhouse_connect
+
+    client = clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+    )
+    store = FeatureStore.from_env()
+    count = sync_from_clickhouse(client, store)
+    store.save()
+    print(f"✅ 特征库已更新: 新增 {count} 行汇总数据, 共 {len(store)} 个 产品 x 省份")
@@ -0,0 +1,98 @@
+"""
+预测模型 - 模型参数与向量化推理
+模型对象会被序列化保存到模型注册表, 因此定义在独立模块中, 训练进程与服务进程都可导入
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+# 各模型的预测曲线参数: 正弦/余弦周期与振幅、趋势斜率、噪声幅度、置信区间宽度、置信度
+MODEL_PROFILES = {
+    "xgboost": {"sin": (0.1, 100), "cos": (0.0, 0), "slope": 2.0, "noise": 30, "band": 0.12, "confidence": 0.89},
+    "lstm": {"sin": (0.08, 120), "cos": (0.15, 80), "slope": 0.0, "noise": 40, "band": 0.15, "confidence": 0.87},
+    "transformer": {"sin": (0.07, 110), "cos": (0.0, 0), "slope": 1.5, "noise": 35, "band": 0.14, "confidence": 0.91},
+}
+
+# 未训练产品的默认需求基线
+DEFAULT_LEVEL = 1000.0
+
+
+def forecast_matrix(
+    model_type: str,
+    n_series: int,
+    periods: int,
+    rng: Optional[np.random.Generator] = None,
+    level: Union[float, np.ndarray] = DEFAULT_LEVEL,
+):
+    """
+    一次计算多条序列的预测值
+
+    level 可为标量或长度为 n_series 的数组(每条序列的需求基线);
+    返回 (forecast, lower_bound, upper_bound), 均为 n_series x periods 的整数矩阵
+    """
+    profile = MODEL_PROFILES[model_type]
+    rng = rng or np.random.default_rng()
+    t = np.arange(periods, dtype=np.float64)
+
+    sin_freq, sin_amp = profile["sin"]
+    cos_freq, cos_amp = profile["cos"]
+    curve = np.sin(t * sin_freq) * sin_amp + np.cos(t * cos_freq) * cos_amp + t * profile["slope"]
+
+    level = np.broadcast_to(np.asarray(level, dtype=np.float64), (n_series,))
+    noise = rng.uniform(-profile["noise"], profile["noise"], size=(n_series, periods))
+    forecast = (level[:, np.newaxis] + curve[np.newaxis, :] + noise).astype(np.int64)
+    lower = (forecast * (1 - profile["band"])).astype(np.int64)
+    upper = (forecast * (1 + profile["band"])).astype(np.int64)
+    return forecast, lower, upper
+
+
+class ProfileForecastModel:
+    """
+    基于曲线参数的预测模型
+
+    训练时由历史销量估计需求基线(level), 推理为一次向量化计算
+    """
+
+    def __init__(self, model_type: str, level: float = DEFAULT_LEVEL, training_window: Optional[Dict] = None):
+        if model_type not in MODEL_PROFILES:
+            raise ValueError(f"不支持的模型类型: {model_type}")
+        self.model_type = model_type
+        self.level = float(level)
+        self.training_window = training_window or {}
+
+    @classmethod
+    def fit(cls, model_type: str, history: Optional[np.ndarray] = None, training_days: int = 365):
+        """
+        训练模型
+
+        history 为按日排列的历史销量; 未提供时使用默认基线,
+        training_window["data_points"] 记录实际使用的历史天数(0 表示未使用真实数据)
+        """
+        end = date.today()
+        start = end - timedelta(days=training_days)
+        level = DEFAULT_LEVEL
+        data_points = 0
+        if history is not None and len(history):
+            history = np.asarray(history, dtype=np.float64)[-training_days:]
+            level = float(history.mean())
+            data_points = len(history)
+        return cls(
+            model_type,
+            level=level,
+            training_window={
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "days": training_days,
+                "data_points": data_points,
+            },
+        )
+
+    @property
+    def fitted_on_history(self) -> bool:
+        """是否由真实历史销量训练得到"""
+        return self.training_window.get("data_points", 0) > 0
+
+    def predict(self, periods: int, rng: Optional[np.random.Generator] = None):
+        return forecast_matrix(self.model_type, 1, periods, rng=rng, level=self.level)
@@ -0,0 +1,227 @@
+"""
+药物相互作用索引 - 成分 -> 药理分类 -> 分类间相互作用矩阵
+分类间的严重程度和说明编号各存为一个 C x C 的紧凑矩阵(uint8 / uint16), 保存为 .npy 后
+以内存映射方式打开; 两药检查为两次下标查找, 批量扫描按处方内的药品对整列计算
+"""
+
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from prescription_rules import DRUGS
+
+SEVERITIES = ("none", "minor", "moderate", "major", "contraindicated")
+SEVERITY_LEVELS = {name: level for level, name in enumerate(SEVERITIES)}
+
+# 分类间相互作用: (分类A, 分类B, 严重程度, 说明)
+CLASS_INTERACTIONS = [
+    ("penicillin", "cephalosporin", "moderate", "两种β-内酰胺类抗生素联用, 可能导致抗生素相关性腹泻"),
+    ("penicillin", "macrolide", "moderate", "繁殖期与抑菌型抗生素联用, 可能相互拮抗"),
+    ("cephalosporin", "macrolide", "moderate", "繁殖期与抑菌型抗生素联用, 可能相互拮抗"),
+    ("macrolide", "quinolone", "major", "联用可延长QT间期, 增加心律失常风险"),
+    ("quinolone", "nsaid", "major", "联用增加中枢神经兴奋和惊厥风险"),
+    ("nsaid", "salicylate", "major", "联用增加消化道出血风险, 并减弱阿司匹林的心血管保护作用"),
+    ("nsaid", "antiplatelet", "major", "联用增加出血风险"),
+    ("salicylate", "antiplatelet", "moderate", "双联抗血小板增加出血风险, 需评估获益并监测"),
+    ("nsaid", "nsaid", "contraindicated", "两种非甾体抗炎药联用, 不良反应叠加"),
+    ("biguanide", "insulin", "minor", "联用降糖作用增强, 注意监测血糖"),
+    ("insulin", "alpha_glucosidase_inhibitor", "minor", "联用降糖作用增强, 低血糖时需口服葡萄糖纠正"),
+    ("insulin", "salicylate", "minor", "大剂量水杨酸类可增强降糖作用"),
+]
+
+# 名称解析缓存上限, 超出后清空重建
+NAME_CACHE_SIZE = 100000
+
+
+class InteractionIndex:
+    """
+    相互作用索引
+
+    - check(a, b): 两个药品的相互作用, O(1)
+    - scan(prescription_ids, drug_names): 批量扫描处方内全部药品对
+    """
+
+    def __init__(
+        self,
+        ingredients: List[str],
+        ingredient_class: np.ndarray,
+        class_names: List[str],
+        severity: np.ndarray,
+        message_id: np.ndarray,
+        messages: List[str],
+    ):
+        self.ingredients = ingredients
+        self.ingredient_class = ingredient_class
+        self.class_names = class_names
+        self.severity = severity
+        self.message_id = message_id
+        self.messages = messages
+        self.n_classes = len(class_names)
+        # 长名称优先匹配
+        self._match_order = sorted(range(len(ingredients)), key=lambda i: len(ingredients[i]), reverse=True)
+        self._name_cache: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(
+        cls,
+        ingredients: Dict[str, tuple] = DRUGS,
+        interactions: Sequence[Tuple[str, str, str, str]] = CLASS_INTERACTIONS,
+    ) -> "InteractionIndex":
+        """由 成分->(分类, ...) 和分类间相互作用规则编译索引; 未知分类对应矩阵最后一行/列(无相互作用)"""
+        class_names = sorted({spec[0] for spec in ingredients.values()} | {c for rule in interactions for c in rule[:2]})
+        class_index = {name: i for i, name in enumerate(class_names)}
+        n = len(class_names) + 1
+        severity = np.zeros((n, n), dtype=np.uint8)
+        message_id = np.zeros((n, n), dtype=np.uint16)
+        messages = [""]
+        for class_a, class_b, level, message in interactions:
+            a, b = class_index[class_a], class_index[class_b]
+            messages.append(message)
+            for i, j in ((a, b), (b, a)):
+                if SEVERITY_LEVELS[level] > severity[i, j]:
+                    severity[i, j] = SEVERITY_LEVELS[level]
+                    message_id[i, j] = len(messages) - 1
+        names = list(ingredients)
+        ingredient_class = np.array([class_index[ingredients[name][0]] for name in names], dtype=np.int32)
+        return cls(names, ingredient_class, class_names, severity, message_id, messages)
+
+    # ------------------------------------------
+    # 持久化
+    # ------------------------------------------
+
+    def save(self, path: str):
+        """先写临时目录再替换"""
+        tmp_dir = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, "severity.npy"), np.asarray(self.severity))
+        np.save(os.path.join(tmp_dir, "message_id.npy"), np.asarray(self.message_id))
+        np.save(os.path.join(tmp_dir, "ingredient_class.npy"), np.asarray(self.ingredient_class))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "ingredients": self.ingredients,
+                "class_names": self.class_names,
+                "messages": self.messages,
+                "saved_at": datetime.now().isoformat(),
+            }, f, ensure_ascii=False)
+
+        old_dir = f"{path}.old-{os.getpid()}"
+        if os.path.isdir(path):
+            os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "InteractionIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(
+            meta["ingredients"],
+            np.load(os.path.join(path, "ingredient_class.npy"), mmap_mode=mmap_mode),
+            meta["class_names"],
+            np.load(os.path.join(path, "severity.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "message_id.npy"), mmap_mode=mmap_mode),
+            meta["messages"],
+        )
+
+    @classmethod
+    def from_env(cls) -> "InteractionIndex":
+        """INTERACTION_INDEX_DIR 下有已编译的索引时内存映射打开, 否则按内置规则编译"""
+        path = os.getenv("INTERACTION_INDEX_DIR", "/tmp/data-insights-interactions")
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return cls.load(path)
+        return cls.build()
+
+    # ------------------------------------------
+    # 查询
+    # ------------------------------------------
+
+    def classes_of(self, drug_names: Sequence[str]) -> np.ndarray:
+        """药品名称 -> 分类下标(按名称中包含的成分匹配), 未知药品为 n_classes"""
+        result = np.empty(len(drug_names), dtype=np.int64)
+        with self._lock:
+            if len(self._name_cache) > NAME_CACHE_SIZE:
+                self._name_cache.clear()
+            for k, name in enumerate(drug_names):
+                cls = self._name_cache.get(name)
+                if cls is None:
+                    cls = self.n_classes
+                    for i in self._match_order:
+                        if self.ingredients[i] in name:
+                            cls = int(self.ingredient_class[i])
+                            break
+                    self._name_cache[name] = cls
+                result[k] = cls
+        return result
+
+    def check(self, drug_a: str, drug_b: str) -> Dict:
+        a, b = self.classes_of([drug_a, drug_b])
+        level = int(self.severity[a, b])
+        return {
+            "drug_a": drug_a,
+            "drug_b": drug_b,
+            "severity": SEVERITIES[level],
+            "message": self.messages[int(self.message_id[a, b])] if level else None,
+        }
+
+    def scan(
+        self,
+        prescription_ids: Sequence[str],
+        drug_names: Sequence[str],
+        min_severity: str = "minor",
+    ) -> Dict[str, np.ndarray]:
+        """
+        扫描每张处方内的全部药品对
+
+        按处方排序后, 对组内偏移 k=1..(最大药品数-1) 整列取 (i, i+k) 药品对查矩阵.
+        返回达到 min_severity 的药品对: line_a / line_b(输入中的行号), severity, message_id
+        """
+        ids = np.asarray(prescription_ids)
+        names, inverse = np.unique(np.asarray(drug_names), return_inverse=True)
+        classes = self.classes_of(list(names))[inverse]
+
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        n = len(order)
+        empty = np.zeros(0, dtype=np.int64)
+        if n == 0:
+            return {"line_a": empty, "line_b": empty, "severity": empty, "message_id": empty}
+        # 每行在所属处方内的位置和处方的药品数
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        group_end = np.repeat(starts + sizes, sizes)
+        positions = np.arange(n)
+        sorted_classes = classes[order]
+
+        threshold = SEVERITY_LEVELS[min_severity]
+        line_a, line_b, severity, message_id = [], [], [], []
+        for k in range(1, int(sizes.max())):
+            i = np.flatnonzero(positions + k < group_end)
+            j = i + k
+            level = self.severity[sorted_classes[i], sorted_classes[j]]
+            hit = level >= threshold
+            line_a.append(order[i[hit]])
+            line_b.append(order[j[hit]])
+            severity.append(level[hit])
+            message_id.append(self.message_id[sorted_classes[i[hit]], sorted_classes[j[hit]]])
+        if not line_a:
+            return {"line_a": empty, "line_b": empty, "severity": empty, "message_id": empty}
+        return {
+            "line_a": np.concatenate(line_a),
+            "line_b": np.concatenate(line_b),
+            "severity": np.concatenate(severity).astype(np.int64),
+            "message_id": np.concatenate(message_id).astype(np.int64),
+        }
+
+
+if __name__ == "__main__":
+    # 按内置规则编译索引并写入 INTERACTION_INDEX_DIR
+    path = os.getenv("INTERACTION_INDEX_DIR", "/tmp/data-insights-interactions")
+    index = InteractionIndex.build()
+    index.save(path)
+    print(f"✅ 已编译 {len(index.ingredients)} 个成分 / {index.n_classes} 个分类的相互作用索引: {path}")
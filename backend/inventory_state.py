@@ -0,0 +1,319 @@
+"""
+库存状态 - 按 (仓库, 产品) 增量维护的库存物化视图
+库存变动到达时只更新对应记录: 当前库存、30天滚动日均销量、可售天数和状态分类;
+按仓库建立索引, 按仓库筛选的开销只与结果条数相关
+"""
+
+import threading
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+SALES_WINDOW_DAYS = 30
+# 可售天数超过该值视为积压
+OVERSTOCK_DAYS = 90
+
+# 变动类型 -> (库存方向, 是否计入销量)
+MOVEMENT_TYPES = {
+    "inbound": (1, False),        # 采购入库
+    "transfer_in": (1, False),    # 调拨入库
+    "return": (1, False),         # 销售退回
+    "sale": (-1, True),           # 销售出库
+    "transfer_out": (-1, False),  # 调拨出库
+    "adjustment": (1, False),     # 盘点调整, 数量可为负
+}
+
+
+def _local_naive(at: datetime) -> datetime:
+    """带时区的时间换算为本地时间并去掉时区, 与期初数据的 datetime.now() 一致"""
+    return at.astimezone().replace(tzinfo=None) if at.tzinfo is not None else at
+
+
+class InventoryRecord:
+    """单个 (仓库, 产品) 的库存状态"""
+
+    def __init__(self, warehouse: str, product_id: str, product_name: str = "", reorder_point: int = 0):
+        self.warehouse = warehouse
+        self.product_id = product_id
+        self.product_name = product_name
+        self.reorder_point = reorder_point
+        self.current_stock = 0
+        self.updated_at: Optional[datetime] = None
+        self.supplier_id: Optional[str] = None
+        # 按日汇总的销量 [(日期序号, 销量)], 与窗口内合计、平方和一起维护
+        self._daily_sales: deque = deque()
+        self._window_sales = 0.0
+        self._window_sq = 0.0
+        self._snapshot: Optional[Dict] = None
+        self._snapshot_day: Optional[int] = None
+
+    def _expire(self, today: int):
+        while self._daily_sales and self._daily_sales[0][0] <= today - SALES_WINDOW_DAYS:
+            quantity = self._daily_sales.popleft()[1]
+            self._window_sales -= quantity
+            self._window_sq -= quantity ** 2
+
+    def record_sale(self, day: int, quantity: float):
+        if self._daily_sales and self._daily_sales[-1][0] == day:
+            before = self._daily_sales[-1][1]
+            self._daily_sales[-1] = (day, before + quantity)
+        elif not self._daily_sales or self._daily_sales[-1][0] < day:
+            before = 0
+            self._daily_sales.append((day, quantity))
+        else:
+            # 迟到的销售记录, 插入对应日期
+            buckets = dict(self._daily_sales)
+            before = buckets.get(day, 0)
+            buckets[day] = before + quantity
+            self._daily_sales = deque(sorted(buckets.items()))
+        self._window_sales += quantity
+        self._window_sq += (before + quantity) ** 2 - before ** 2
+
+    def avg_daily_sales(self, today: int) -> float:
+        self._expire(today)
+        return self._window_sales / SALES_WINDOW_DAYS
+
+    def recent_daily_sales(self, today: int, days: int = 3) -> float:
+        """最近几天(含当天)的日均销量, 用于识别需求突增"""
+        total = 0.0
+        for day, quantity in reversed(self._daily_sales):
+            if day <= today - days:
+                break
+            if day <= today:
+                total += quantity
+        return total / days
+
+    def daily_sales_std(self, today: int) -> float:
+        """窗口内日销量的标准差(无销售的日期按0计)"""
+        mean = self.avg_daily_sales(today)
+        return max(self._window_sq / SALES_WINDOW_DAYS - mean ** 2, 0.0) ** 0.5
+
+    def classify(self, days_of_stock: Optional[int]) -> str:
+        if self.current_stock <= 0:
+            return "out"
+        if self.current_stock < self.reorder_point:
+            return "low"
+        if days_of_stock is not None and days_of_stock > OVERSTOCK_DAYS:
+            return "overstock"
+        return "normal"
+
+    def to_dict(self, today: int) -> Dict:
+        """接口返回的记录; 同一天内未变化时复用上次的结果"""
+        if self._snapshot is not None and self._snapshot_day == today:
+            return self._snapshot
+        avg = self.avg_daily_sales(today)
+        days_of_stock = int(max(self.current_stock, 0) / avg) if avg > 0 else None
+        self._snapshot = {
+            "product_id": self.product_id,
+            "product_name": self.product_name,
+            "current_stock": self.current_stock,
+            "avg_daily_sales": round(avg, 1),
+            "days_of_stock": days_of_stock,
+            "reorder_point": self.reorder_point,
+            "status": self.classify(days_of_stock),
+            "warehouse": self.warehouse,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+        self._snapshot_day = today
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+class InventoryState:
+    """
+    全部仓库的库存状态
+
+    - apply_movements(): 增量应用库存变动
+    - seed(): 以期初库存快照初始化记录
+    - records(warehouse): 按仓库索引读取
+    """
+
+    def __init__(self):
+        self._by_warehouse: Dict[str, Dict[str, InventoryRecord]] = {}
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def subscribe(self, listener: Callable[[List[Dict]], None], replay: bool = False):
+        """
+        注册变更监听: 每次更新后以变更记录(含近3天日均销量)列表调用
+
+        replay=True 时先以全部现有记录调用一次
+        """
+        self._listeners.append(listener)
+        if replay:
+            with self._lock:
+                records = [r for products in self._by_warehouse.values() for r in products.values()]
+            self._notify(records, [listener])
+
+    def _notify(self, records: List[InventoryRecord], listeners: Optional[List[Callable]] = None):
+        listeners = self._listeners if listeners is None else listeners
+        if not listeners or not records:
+            return
+        today = date.today().toordinal()
+        with self._lock:
+            changes = [
+                {**record.to_dict(today), "recent_daily_sales": round(record.recent_daily_sales(today), 1)}
+                for record in records
+            ]
+        for listener in listeners:
+            listener(changes)
+
+    def _record(self, warehouse: str, product_id: str) -> InventoryRecord:
+        products = self._by_warehouse.setdefault(warehouse, {})
+        record = products.get(product_id)
+        if record is None:
+            record = products[product_id] = InventoryRecord(warehouse, product_id)
+        return record
+
+    def seed(
+        self,
+        warehouse: str,
+        product_id: str,
+        product_name: str,
+        current_stock: int,
+        reorder_point: int,
+        avg_daily_sales: float = 0.0,
+        supplier_id: Optional[str] = None,
+    ):
+        """写入期初快照; 期初日均销量按窗口内每日均匀分布计入"""
+        today = date.today().toordinal()
+        with self._lock:
+            record = self._record(warehouse, product_id)
+            record.product_name = product_name
+            record.supplier_id = supplier_id
+            record.reorder_point = reorder_point
+            record.current_stock = current_stock
+            record.updated_at = datetime.now()
+            for day in range(today - SALES_WINDOW_DAYS + 1, today + 1):
+                record.record_sale(day, avg_daily_sales)
+            record.invalidate()
+            self.version += 1
+        self._notify([record])
+
+    def apply_movements(self, movements: Iterable[Dict]) -> int:
+        """
+        应用一批库存变动, 返回处理条数
+
+        每条变动: warehouse, product_id, movement_type, quantity, 可选 occurred_at / product_name / reorder_point
+        """
+        movements = list(movements)
+        # 先校验整批并解析发生时间, 避免部分应用
+        occurred: List[datetime] = []
+        for movement in movements:
+            if movement["movement_type"] not in MOVEMENT_TYPES:
+                raise ValueError(f"未知的库存变动类型: {movement['movement_type']}")
+            occurred_at = movement.get("occurred_at") or datetime.now()
+            if isinstance(occurred_at, str):
+                occurred_at = datetime.fromisoformat(occurred_at)
+            occurred.append(_local_naive(occurred_at))
+
+        applied = 0
+        changed: Dict[int, InventoryRecord] = {}
+        with self._lock:
+            for movement, occurred_at in zip(movements, occurred):
+                sign, is_sale = MOVEMENT_TYPES[movement["movement_type"]]
+                record = self._record(movement["warehouse"], movement["product_id"])
+                if movement.get("product_name"):
+                    record.product_name = movement["product_name"]
+                if movement.get("reorder_point") is not None:
+                    record.reorder_point = movement["reorder_point"]
+                if movement.get("supplier_id"):
+                    record.supplier_id = movement["supplier_id"]
+
+                quantity = movement["quantity"]
+                record.current_stock += sign * quantity
+                if is_sale:
+                    record.record_sale(occurred_at.date().toordinal(), quantity)
+                if record.updated_at is None or occurred_at > record.updated_at:
+                    record.updated_at = occurred_at
+                record.invalidate()
+                changed[id(record)] = record
+                applied += 1
+            self.version += 1
+        self._notify(list(changed.values()))
+        return applied
+
+    def warehouses(self) -> List[str]:
+        with self._lock:
+            return list(self._by_warehouse)
+
+    def get(self, warehouse: str, product_id: str) -> Optional[Dict]:
+        today = date.today().toordinal()
+        with self._lock:
+            record = self._by_warehouse.get(warehouse, {}).get(product_id)
+            return record.to_dict(today) if record else None
+
+    def records(self, warehouse: Optional[str] = None, status: Optional[str] = None) -> List[Dict]:
+        """库存记录; 指定仓库时只访问该仓库的索引"""
+        today = date.today().toordinal()
+        with self._lock:
+            if warehouse is not None:
+                groups = [self._by_warehouse.get(warehouse, {})]
+            else:
+                groups = list(self._by_warehouse.values())
+            rows = [record.to_dict(today) for products in groups for record in products.values()]
+        if status is not None:
+            rows = [row for row in rows if row["status"] == status]
+        return rows
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """各仓库按状态的记录数"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in self.records():
+            by_status = counts.setdefault(row["warehouse"], {})
+            by_status[row["status"]] = by_status.get(row["status"], 0) + 1
+        return counts
+
+    def arrays(self) -> Dict:
+        """
+        全部记录的列式快照, 供向量化计算使用
+
+        返回 keys([(仓库, 产品ID)]), product_names, supplier_ids 列表
+        以及 current_stock / avg_daily_sales / daily_sales_std 数组
+        """
+        today = date.today().toordinal()
+        with self._lock:
+            records = [r for products in self._by_warehouse.values() for r in products.values()]
+            stock = np.fromiter((r.current_stock for r in records), dtype=np.float64, count=len(records))
+            avg = np.fromiter((r.avg_daily_sales(today) for r in records), dtype=np.float64, count=len(records))
+            std = np.fromiter((r.daily_sales_std(today) for r in records), dtype=np.float64, count=len(records))
+            return {
+                "keys": [(r.warehouse, r.product_id) for r in records],
+                "product_names": [r.product_name for r in records],
+                "supplier_ids": [r.supplier_id for r in records],
+                "current_stock": stock,
+                "avg_daily_sales": avg,
+                "daily_sales_std": std,
+            }
+
+    def contains(self, keys: List[tuple]) -> np.ndarray:
+        """每个 (仓库, 产品ID) 是否有库存记录"""
+        with self._lock:
+            return np.fromiter(
+                (product_id in self._by_warehouse.get(warehouse, {}) for warehouse, product_id in keys),
+                dtype=bool,
+                count=len(keys),
+            )
+
+    def daily_history(self, keys: List[tuple], days: int = SALES_WINDOW_DAYS) -> np.ndarray:
+        """
+        指定 (仓库, 产品ID) 最近 days 天的日销量矩阵, 形状 (len(keys), days), 最后一列为今天;
+        不存在的记录为全0
+        """
+        today = date.today().toordinal()
+        history = np.zeros((len(keys), days))
+        with self._lock:
+            for i, (warehouse, product_id) in enumerate(keys):
+                record = self._by_warehouse.get(warehouse, {}).get(product_id)
+                if record is None:
+                    continue
+                for day, quantity in record._daily_sales:
+                    offset = day - today + days - 1
+                    if 0 <= offset < days:
+                        history[i, offset] = quantity
+        return history
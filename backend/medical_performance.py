@@ -2,19 +2,23 @@
 医疗效能优化模块 - 处方合理性分析与成本控制
 """
 
-from fastapi import FastAPI, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date
+import numpy as np
+import os
 import random
 
-security = HTTPBearer()
-app = FastAPI(title="医疗效能优化API")
+from alert_engine import AlertEngine, AlertRule, AlertStore
+from alert_stream import AlertBroadcaster, AlertFilter
+from auth import verify_stream_token, verify_token
+from interaction_index import SEVERITIES, InteractionIndex
+from prescription_rules import ISSUE_LABELS, evaluate, explain, first_lines, issue_labels, prescription_columns
+from prescription_stats import DailyStatsStore, PrescriptionStats, WorkerStatsSet
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    from backend.app import verify_token as verify
-    return verify(credentials)
+app = FastAPI(title="医疗效能优化API")
 
 # ============================================
 # 数据模型
@@ -32,6 +36,26 @@ class PrescriptionAnalysis(BaseModel):
     issues: List[str]
     suggestions: List[str]
 
+class PrescriptionAuditRequest(BaseModel):
+    # 处方明细列, 每个位置一行 处方 x 药品
+    prescription_id: List[str]
+    patient_age: List[int]
+    diagnosis: List[str]
+    drug_name: List[str]
+    dose_mg: List[Optional[float]]  # 单次剂量(mg), 无法换算时为 null
+    frequency_per_day: List[float]
+    days_supply: List[int]  # 0 表示长期
+    department: Optional[List[str]] = None
+    hospital_name: Optional[List[str]] = None
+
+class InteractionScanRequest(BaseModel):
+    # 处方明细列, 每个位置一行 处方 x 药品
+    prescription_id: List[str]
+    drug_name: List[str]
+    hospital: Optional[List[str]] = None
+    min_severity: str = "minor"
+    raise_alerts: bool = False  # 严重及以上的相互作用写入不良用药预警
+
 class CostOptimization(BaseModel):
     hospital_name: str
     department: str
@@ -45,6 +69,62 @@ class CostOptimization(BaseModel):
 # 1. 处方合理性分析API
 # ============================================
 
+# 药物相互作用索引(已编译时内存映射打开)
+interaction_index = InteractionIndex.from_env()
+
+SAMPLE_PRESCRIPTIONS = [
+    {
+        "prescription_id": "RX20250107001",
+        "doctor_name": "张医生",
+        "department": "呼吸内科",
+        "hospital_name": "北京协和医院",
+        "patient_age": 45,
+        "diagnosis": "急性支气管炎",
+        "drugs": [
+            {"name": "阿莫西林胶囊", "dose": "500mg", "frequency": "3次/日", "duration": "7天"},
+            {"name": "盐酸氨溴索口服液", "dose": "10ml", "frequency": "3次/日", "duration": "5天"}
+        ]
+    },
+    {
+        "prescription_id": "RX20250107002",
+        "doctor_name": "李医生",
+        "department": "心血管内科",
+        "hospital_name": "上海瑞金医院",
+        "patient_age": 62,
+        "diagnosis": "高血压II级",
+        "drugs": [
+            {"name": "硝苯地平控释片", "dose": "30mg", "frequency": "1次/日", "duration": "30天"},
+            {"name": "阿司匹林肠溶片", "dose": "100mg", "frequency": "1次/日", "duration": "长期"}
+        ]
+    },
+    {
+        "prescription_id": "RX20250107003",
+        "doctor_name": "王医生",
+        "department": "儿科",
+        "hospital_name": "广州中山医院",
+        "patient_age": 5,
+        "diagnosis": "上呼吸道感染",
+        "drugs": [
+            {"name": "阿莫西林颗粒", "dose": "125mg", "frequency": "3次/日", "duration": "5天"},
+            {"name": "布洛芬混悬液", "dose": "5ml", "frequency": "3次/日(必要时)", "duration": "3天"},
+            {"name": "头孢克肟分散片", "dose": "50mg", "frequency": "2次/日", "duration": "5天"}
+        ]
+    },
+    {
+        "prescription_id": "RX20250107004",
+        "doctor_name": "刘医生",
+        "department": "内分泌科",
+        "hospital_name": "成都华西医院",
+        "patient_age": 50,
+        "diagnosis": "2型糖尿病",
+        "drugs": [
+            {"name": "二甲双胍缓释片", "dose": "500mg", "frequency": "2次/日", "duration": "长期"},
+            {"name": "胰岛素注射液", "dose": "10u", "frequency": "3次/日", "duration": "长期"},
+            {"name": "阿卡波糖片", "dose": "50mg", "frequency": "3次/日", "duration": "长期"}
+        ]
+    }
+]
+
 @app.get("/api/medical/prescription/analysis")
 async def analyze_prescriptions(
     hospital_id: Optional[str] = None,
@@ -55,79 +135,114 @@ async def analyze_prescriptions(
 ):
     """
     处方合理性分析
-    基于临床指南评估处方质量
+    基于用药规则(重复用药、年龄剂量、疗程、禁忌症)评估处方质量
     """
-    prescriptions = [
-        {
-            "prescription_id": "RX20250107001",
-            "doctor_name": "张医生",
-            "department": "呼吸内科",
-            "hospital_name": "北京协和医院",
-            "patient_age": 45,
-            "diagnosis": "急性支气管炎",
-            "drugs": [
-                {"name": "阿莫西林胶囊", "dose": "500mg", "frequency": "3次/日", "duration": "7天", "rational": True},
-                {"name": "盐酸氨溴索口服液", "dose": "10ml", "frequency": "3次/日", "duration": "5天", "rational": True}
-            ],
-            "rationality_score": 95,
-            "issues": [],
-            "suggestions": ["处方符合指南,用药合理"]
-        },
-        {
-            "prescription_id": "RX20250107002",
-            "doctor_name": "李医生",
-            "department": "心血管内科",
-            "hospital_name": "上海瑞金医院",
-            "patient_age": 62,
-            "diagnosis": "高血压II级",
-            "drugs": [
-                {"name": "硝苯地平控释片", "dose": "30mg", "frequency": "1次/日", "duration": "30天", "rational": True},
-                {"name": "阿司匹林肠溶片", "dose": "100mg", "frequency": "1次/日", "duration": "长期", "rational": True}
-            ],
-            "rationality_score": 98,
-            "issues": [],
-            "suggestions": ["规范用药,定期监测血压"]
-        },
-        {
-            "prescription_id": "RX20250107003",
-            "doctor_name": "王医生",
-            "department": "儿科",
-            "hospital_name": "广州中山医院",
-            "patient_age": 5,
-            "diagnosis": "上呼吸道感染",
-            "drugs": [
-                {"name": "阿莫西林颗粒", "dose": "125mg", "frequency": "3次/日", "duration": "5天", "rational": True},
-                {"name": "布洛芬混悬液", "dose": "5ml", "frequency": "3次/日(必要时)", "duration": "3天", "rational": True},
-                {"name": "头孢克肟分散片", "dose": "50mg", "frequency": "2次/日", "duration": "5天", "rational": False}
-            ],
-            "rationality_score": 72,
-            "issues": ["重复用药:阿莫西林和头孢克肟均为抗生素", "儿童用药剂量偏高"],
-            "suggestions": ["建议取消头孢克肟,单一抗生素治疗", "调整布洛芬剂量至3ml/次"]
-        },
-        {
-            "prescription_id": "RX20250107004",
-            "doctor_name": "刘医生",
-            "department": "内分泌科",
-            "hospital_name": "成都华西医院",
-            "patient_age": 50,
-            "diagnosis": "2型糖尿病",
-            "drugs": [
-                {"name": "二甲双胍缓释片", "dose": "500mg", "frequency": "2次/日", "duration": "长期", "rational": True},
-                {"name": "胰岛素注射液", "dose": "10u", "frequency": "3次/日", "duration": "长期", "rational": True},
-                {"name": "阿卡波糖片", "dose": "50mg", "frequency": "3次/日", "duration": "长期", "rational": True}
-            ],
-            "rationality_score": 92,
-            "issues": ["三种降糖药联用,需密切监测血糖"],
-            "suggestions": ["定期监测血糖,防止低血糖", "建议每3个月复查糖化血红蛋白"]
-        }
-    ]
-
+    prescriptions = SAMPLE_PRESCRIPTIONS
     if hospital_id:
         prescriptions = [p for p in prescriptions if p["hospital_name"].find(hospital_id) != -1]
     if department:
         prescriptions = [p for p in prescriptions if p["department"] == department]
+    if not prescriptions:
+        return {"data": []}
+
+    columns = prescription_columns(prescriptions)
+    result = evaluate(columns, interactions=interaction_index)
+    position = {pid: i for i, pid in enumerate(result["prescription_id"])}
+    line = 0
+    data = []
+    for p in prescriptions:
+        i = position[p["prescription_id"]]
+        drugs = []
+        for drug in p["drugs"]:
+            drugs.append({**drug, "rational": bool(result["line_issues"][line] == 0)})
+            line += 1
+        data.append({
+            **p,
+            "drugs": drugs,
+            "rationality_score": float(result["score"][i]),
+            **explain(columns, result, i)
+        })
+
+    return {"data": data}
 
-    return {"data": prescriptions}
+@app.post("/api/medical/prescription/audit")
+async def audit_prescriptions(
+    request: PrescriptionAuditRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量处方审核 - 明细按列提交(与 prescription_data 字段对应), 一次向量化评分
+
+    返回每张处方的评分和问题类型, 以及问题汇总; 提供科室和医院列时计入处方统计
+    """
+    columns = {k: v for k, v in request.dict().items() if v is not None}
+    lengths = {len(v) for v in columns.values()}
+    if len(lengths) != 1:
+        raise HTTPException(status_code=400, detail="各列长度必须一致")
+    if not columns["prescription_id"]:
+        return {"total": 0, "data": {}}
+    columns["dose_mg"] = [np.nan if v is None else v for v in columns["dose_mg"]]
+
+    result = evaluate(columns, interactions=interaction_index)
+    issues = result["issues"]
+    if "department" in columns and "hospital_name" in columns:
+        first = first_lines(result["line_prescription"], len(issues))
+        live_stats.add(
+            result["score"], result["rational"], issues,
+            np.asarray(columns["department"])[first], np.asarray(columns["hospital_name"])[first]
+        )
+    return {
+        "total": len(issues),
+        "rational": int(result["rational"].sum()),
+        "issue_counts": {label: int(((issues & bit) != 0).sum()) for bit, label in ISSUE_LABELS.items()},
+        "data": {
+            "prescription_id": result["prescription_id"].tolist(),
+            "rationality_score": result["score"].tolist(),
+            "is_rational": result["rational"].tolist(),
+            "issues": [issue_labels(int(flags)) for flags in issues]
+        }
+    }
+
+# 期初统计: (科室, 处方数, 合理数, 平均评分) 与 (问题, 次数)
+BASELINE_DEPARTMENTS = [
+    ("呼吸内科", 2340, 2265, 94.2),
+    ("心血管内科", 3120, 3015, 93.8),
+    ("内分泌科", 1890, 1785, 91.5),
+    ("儿科", 2680, 2520, 90.2),
+    ("消化内科", 1560, 1510, 94.5),
+    ("神经内科", 1890, 1815, 93.0),
+    ("急诊科", 1750, 1670, 92.0)
+]
+BASELINE_ISSUES = [
+    ("重复用药", 185),
+    ("剂量不当", 232),
+    ("疗程不当", 158),
+    ("配伍禁忌", 45),
+    ("超说明书用药", 30)
+]
+
+# 本进程实时审核的统计(含期初统计), 与审核任务按日保存的部分状态合并后输出
+live_stats = PrescriptionStats()
+for department_name, total, rational, avg_score in BASELINE_DEPARTMENTS:
+    live_stats.add_group(department_name, total, rational, avg_score)
+for issue_label, issue_count in BASELINE_ISSUES:
+    live_stats.add_issue(issue_label, issue_count)
+daily_stats = DailyStatsStore.from_env()
+# 其他进程推送的部分状态, 按 worker_id 替换
+worker_stats = WorkerStatsSet()
+_combined_stats = {"key": None, "stats": None}
+
+def combined_stats() -> PrescriptionStats:
+    """合并实时统计、各进程推送的统计与审核任务的统计; 都未变化时复用上次的合并结果"""
+    batch = daily_stats.merged()
+    workers = worker_stats.merged()
+    key = (daily_stats.generation, worker_stats.version, live_stats.version)
+    if _combined_stats["key"] != key:
+        stats = PrescriptionStats.from_state(batch.to_state())
+        stats.merge(workers)
+        stats.merge(live_stats)
+        _combined_stats.update(key=key, stats=stats)
+    return _combined_stats["stats"]
 
 @app.get("/api/medical/prescription/statistics")
 async def get_prescription_statistics(
@@ -135,31 +250,27 @@ async def get_prescription_statistics(
 ):
     """
     处方统计概览
+
+    读取流式聚合的统计(按科室/医院/问题类型的计数和评分), 不扫描处方明细
     """
-    stats = {
-        "total_prescriptions": 15230,
-        "rational_prescriptions": 14580,
-        "rationality_rate": 95.7,
-        "avg_rationality_score": 92.5,
-        "by_department": [
-            {"department": "呼吸内科", "total": 2340, "rational": 2265, "rate": 96.8, "avg_score": 94.2},
-            {"department": "心血管内科", "total": 3120, "rational": 3015, "rate": 96.6, "avg_score": 93.8},
-            {"department": "内分泌科", "total": 1890, "rational": 1785, "rate": 94.4, "avg_score": 91.5},
-            {"department": "儿科", "total": 2680, "rational": 2520, "rate": 94.0, "avg_score": 90.2},
-            {"department": "消化内科", "total": 1560, "rational": 1510, "rate": 96.8, "avg_score": 94.5},
-            {"department": "神经内科", "total": 1890, "rational": 1815, "rate": 96.0, "avg_score": 93.0},
-            {"department": "急诊科", "total": 1750, "rational": 1670, "rate": 95.4, "avg_score": 92.0}
-        ],
-        "common_issues": [
-            {"issue": "重复用药", "count": 185, "rate": 1.2},
-            {"issue": "剂量不当", "count": 232, "rate": 1.5},
-            {"issue": "疗程不当", "count": 158, "rate": 1.0},
-            {"issue": "配伍禁忌", "count": 45, "rate": 0.3},
-            {"issue": "超说明书用药", "count": 30, "rate": 0.2}
-        ]
-    }
+    return combined_stats().summary()
 
-    return stats
+@app.post("/api/medical/prescription/statistics/merge")
+async def merge_prescription_statistics(
+    worker_id: str,
+    state: Dict,
+    current_user: str = Depends(verify_token)
+):
+    """
+    合并其他进程导出的统计部分状态(PrescriptionStats.to_state() 格式)
+
+    state 为该进程的累计统计; 同一 worker_id 再次推送时替换上次的状态, 不会重复计数
+    """
+    try:
+        version = worker_stats.put(worker_id, state)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"统计状态格式错误: {e}")
+    return {"version": version, "workers": len(worker_stats.workers())}
 
 # ============================================
 # 2. 成本优化API
@@ -283,76 +394,181 @@ async def get_patient_flow(
 # 4. 不良用药预警API
 # ============================================
 
+# 不良用药预警存储: 按级别索引, 数量有上限
+medical_alerts = AlertStore(max_alerts=int(os.getenv("MEDICAL_ALERTS_MAX", "10000")))
+medical_alert_stream = AlertBroadcaster(medical_alerts)
+
+SEED_ALERTS = [
+    {
+        "alert_type": "drug_interaction",
+        "severity": "critical",
+        "doctor": "王医生",
+        "hospital": "广州中山医院",
+        "department": "儿科",
+        "message": "检测到潜在药物相互作用",
+        "details": "阿莫西林与头孢克肟联用可能导致抗生素相关性腹泻",
+        "suggestion": "建议取消其中一种抗生素,避免重复用药",
+        "created_at": "2025-01-07 10:30:00"
+    },
+    {
+        "alert_type": "dose_warning",
+        "severity": "high",
+        "doctor": "李医生",
+        "hospital": "上海瑞金医院",
+        "department": "老年科",
+        "message": "药物剂量偏高",
+        "details": "85岁患者使用常规成人剂量布洛芬,可能导致肾损伤",
+        "suggestion": "建议减半剂量或改用对乙酰氨基酚",
+        "created_at": "2025-01-07 09:45:00"
+    },
+    {
+        "alert_type": "contraindication",
+        "severity": "critical",
+        "doctor": "张医生",
+        "hospital": "北京协和医院",
+        "department": "心血管内科",
+        "message": "存在禁忌症",
+        "details": "患者有消化道溃疡史,处方中含阿司匹林",
+        "suggestion": "建议改用氯吡格雷或停用抗血小板药物",
+        "created_at": "2025-01-07 09:15:00"
+    },
+    {
+        "alert_type": "off_label_use",
+        "severity": "medium",
+        "doctor": "刘医生",
+        "hospital": "成都华西医院",
+        "department": "神经内科",
+        "message": "超说明书用药",
+        "details": "使用该药物用于非批准适应症",
+        "suggestion": "需签署知情同意书,并做好病历记录",
+        "created_at": "2025-01-07 08:50:00"
+    },
+    {
+        "alert_type": "duration_warning",
+        "severity": "medium",
+        "doctor": "陈医生",
+        "hospital": "杭州第一医院",
+        "department": "呼吸内科",
+        "message": "用药疗程过长",
+        "details": "抗生素疗程超过14天,可能增加耐药性",
+        "suggestion": "建议重新评估,适时停药或降阶梯治疗",
+        "created_at": "2025-01-07 08:20:00"
+    }
+]
+
+for seed_alert in reversed(SEED_ALERTS):
+    medical_alerts.add(seed_alert)
+
 @app.get("/api/medical/alerts")
 async def get_medical_alerts(
     severity: Optional[str] = None,
+    limit: Optional[int] = None,
     current_user: str = Depends(verify_token)
 ):
     """
     不良用药预警
+
+    按级别查询只读取该级别的索引
     """
-    alerts = [
-        {
-            "alert_type": "drug_interaction",
-            "severity": "critical",
-            "doctor": "王医生",
-            "hospital": "广州中山医院",
-            "department": "儿科",
-            "message": "检测到潜在药物相互作用",
-            "details": "阿莫西林与头孢克肟联用可能导致抗生素相关性腹泻",
-            "suggestion": "建议取消其中一种抗生素,避免重复用药",
-            "created_at": "2025-01-07 10:30:00"
-        },
-        {
-            "alert_type": "dose_warning",
-            "severity": "high",
-            "doctor": "李医生",
-            "hospital": "上海瑞金医院",
-            "department": "老年科",
-            "message": "药物剂量偏高",
-            "details": "85岁患者使用常规成人剂量布洛芬,可能导致肾损伤",
-            "suggestion": "建议减半剂量或改用对乙酰氨基酚",
-            "created_at": "2025-01-07 09:45:00"
-        },
-        {
-            "alert_type": "contraindication",
-            "severity": "critical",
-            "doctor": "张医生",
-            "hospital": "北京协和医院",
-            "department": "心血管内科",
-            "message": "存在禁忌症",
-            "details": "患者有消化道溃疡史,处方中含阿司匹林",
-            "suggestion": "建议改用氯吡格雷或停用抗血小板药物",
-            "created_at": "2025-01-07 09:15:00"
-        },
-        {
-            "alert_type": "off_label_use",
-            "severity": "medium",
-            "doctor": "刘医生",
-            "hospital": "成都华西医院",
-            "department": "神经内科",
-            "message": "超说明书用药",
-            "details": "使用该药物用于非批准适应症",
-            "suggestion": "需签署知情同意书,并做好病历记录",
-            "created_at": "2025-01-07 08:50:00"
-        },
-        {
-            "alert_type": "duration_warning",
-            "severity": "medium",
-            "doctor": "陈医生",
-            "hospital": "杭州第一医院",
-            "department": "呼吸内科",
-            "message": "用药疗程过长",
-            "details": "抗生素疗程超过14天,可能增加耐药性",
-            "suggestion": "建议重新评估,适时停药或降阶梯治疗",
-            "created_at": "2025-01-07 08:20:00"
-        }
-    ]
+    alerts = medical_alerts.query(severity=severity, limit=limit)
+    return {"data": alerts, "total": len(alerts)}
 
-    if severity:
-        alerts = [a for a in alerts if a["severity"] == severity]
+@app.get("/api/medical/alerts/stream")
+async def stream_medical_alerts(
+    severity: Optional[str] = None,
+    hospital: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: str = Depends(verify_stream_token)
+):
+    """
+    不良用药预警推送 (Server-Sent Events)
 
-    return {"data": alerts, "total": len(alerts)}
+    - severity: 级别过滤, 可逗号分隔多个
+    - hospital: 医院过滤
+    - 断线重连时按 Last-Event-ID 补发之后的事件
+    """
+    alert_filter = AlertFilter.from_params(severity, hospital=hospital)
+    resume_from = last_event_id_header if last_event_id_header is not None else last_event_id
+    return StreamingResponse(
+        medical_alert_stream.stream(alert_filter, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/medical/drug-interactions/check")
+async def check_drug_interaction(
+    drug_a: str,
+    drug_b: str,
+    current_user: str = Depends(verify_token)
+):
+    """
+    两种药品的相互作用(按成分所属药理分类查索引)
+    """
+    return interaction_index.check(drug_a, drug_b)
+
+# 相互作用严重程度 -> 预警级别
+INTERACTION_ALERT_SEVERITY = {"contraindicated": "critical", "major": "high"}
+
+def interaction_alert_rule(state: Dict) -> Optional[Dict]:
+    alert_severity = INTERACTION_ALERT_SEVERITY.get(state["interaction_severity"])
+    if alert_severity is None:
+        return None
+    return {
+        "severity": alert_severity,
+        "message": "检测到潜在药物相互作用",
+        "details": f"{state['drug_a']}与{state['drug_b']}: {state['interaction_message']}",
+        "suggestion": "建议调整联用方案或加强监测"
+    }
+
+# 相互作用预警按 (处方, 药品对) 去重: 同一对象已有活动预警时, 重复扫描不再产生新预警
+interaction_alerts = AlertEngine(
+    [AlertRule("drug_interaction", "high", ["interaction_severity"], interaction_alert_rule)],
+    medical_alerts
+)
+
+@app.post("/api/medical/drug-interactions/scan")
+async def scan_drug_interactions(
+    request: InteractionScanRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量扫描处方内全部药品对的相互作用
+
+    返回达到 min_severity 的药品对; raise_alerts 时严重及以上的写入不良用药预警
+    """
+    if len(request.drug_name) != len(request.prescription_id) or (
+        request.hospital is not None and len(request.hospital) != len(request.prescription_id)
+    ):
+        raise HTTPException(status_code=400, detail="各列长度必须一致")
+    if request.min_severity not in SEVERITIES[1:]:
+        raise HTTPException(status_code=400, detail=f"min_severity 可选 {list(SEVERITIES[1:])}")
+
+    pairs = interaction_index.scan(request.prescription_id, request.drug_name, request.min_severity)
+    data = []
+    for a, b, level, message_id in zip(pairs["line_a"], pairs["line_b"], pairs["severity"], pairs["message_id"]):
+        item = {
+            "prescription_id": request.prescription_id[a],
+            "drug_a": request.drug_name[a],
+            "drug_b": request.drug_name[b],
+            "severity": SEVERITIES[level],
+            "message": interaction_index.messages[message_id]
+        }
+        data.append(item)
+        if request.raise_alerts and item["severity"] in INTERACTION_ALERT_SEVERITY:
+            interaction_alerts.process(
+                ("interaction", item["prescription_id"], *sorted((item["drug_a"], item["drug_b"]))),
+                {"interaction_severity": item["severity"]},
+                {
+                    "hospital": request.hospital[a] if request.hospital else None,
+                    "prescription_id": item["prescription_id"],
+                    "drug_a": item["drug_a"],
+                    "drug_b": item["drug_b"],
+                    "interaction_message": item["message"]
+                }
+            )
+
+    return {"total": len(data), "data": data}
 
 # ============================================
 # 5. DRG/DIP绩效分析API
@@ -0,0 +1,290 @@
+"""
+模型注册表 - 训练产物持久化与热模型缓存
+磁盘按 模型类型/产品ID/版本 存放模型文件和元数据, 内存中按容量预算缓存已加载的模型
+"""
+
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 模型类型作为目录名, 只允许字母、数字、下划线和连字符
+MODEL_TYPE_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+# 产品ID同样作为目录名: 允许字母、数字、下划线、连字符和点, 但不能只由点组成("."/".."指向上级目录)
+PRODUCT_ID_PATTERN = re.compile(r"^(?!\.+\Z)[\w.-]+\Z")
+# 并发保存时抢占版本号的最大尝试次数
+MAX_VERSION_CLAIMS = 100
+
+
+class ModelNotFoundError(Exception):
+    """注册表中不存在对应模型"""
+
+
+class ModelCache:
+    """
+    已加载模型的LRU缓存, 按内存预算淘汰
+
+    模型大小以序列化后的字节数估算
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[Any, Dict, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str, int]) -> Optional[Tuple[Any, Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key: Tuple[str, str, int], model: Any, metadata: Dict, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (model, metadata, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def discard(self, product_id: str, model_type: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == product_id and k[1] == model_type]:
+                self._bytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "models": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class ModelRegistry:
+    """
+    模型注册表
+
+    目录结构: {root}/{model_type}/{product_id}/v{version}/model.pkl + metadata.json
+    """
+
+    MODEL_FILE = "model.pkl"
+    METADATA_FILE = "metadata.json"
+
+    def __init__(self, root: str = "/tmp/data-insights-models", cache: Optional[ModelCache] = None):
+        self.root = root
+        self.cache = cache or ModelCache()
+        # (model_type, product_id) -> (目录修改时间, 最新版本号)
+        self._latest: Dict[Tuple[str, str], Tuple[int, Optional[int]]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ModelRegistry":
+        return cls(
+            root=os.getenv("MODEL_REGISTRY_DIR", "/tmp/data-insights-models"),
+            cache=ModelCache(max_bytes=int(os.getenv("MODEL_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))),
+        )
+
+    def _model_dir(self, product_id: str, model_type: str) -> str:
+        if not MODEL_TYPE_PATTERN.match(model_type):
+            raise ValueError(f"不合法的模型类型: {model_type!r}")
+        # product_id 来自请求参数, 避免路径穿越或指向模型类型目录本身
+        if not PRODUCT_ID_PATTERN.match(product_id):
+            raise ValueError(f"不合法的产品ID: {product_id!r}")
+        return os.path.join(self.root, model_type, product_id)
+
+    def _generation_path(self, model_type: str) -> str:
+        # 放在根目录下, 以点开头不会与模型类型目录重名
+        return os.path.join(self.root, f".generation-{model_type}")
+
+    def generation(self, model_type: str) -> Optional[Tuple[int, int]]:
+        """
+        某模型类型的注册表代数; 任一进程保存或删除该类型的模型后改变,
+        调用方据此判断按产品汇总的结果是否需要重建, 只需一次 stat
+        """
+        try:
+            stat = os.stat(self._generation_path(model_type))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _bump_generation(self, model_type: str):
+        # 写临时文件后原子替换, inode 必然变化, 不受文件系统时间精度影响
+        path = self._generation_path(model_type)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, path)
+
+    def product_ids(self, model_type: str) -> List[str]:
+        """已有模型目录的产品ID"""
+        if not MODEL_TYPE_PATTERN.match(model_type):
+            raise ValueError(f"不合法的模型类型: {model_type!r}")
+        type_dir = os.path.join(self.root, model_type)
+        if not os.path.isdir(type_dir):
+            return []
+        return [
+            entry.name for entry in os.scandir(type_dir)
+            if entry.is_dir() and PRODUCT_ID_PATTERN.match(entry.name)
+        ]
+
+    def latest_models(self, model_type: str) -> Dict[str, Any]:
+        """该模型类型下各产品的最新版本模型, 产品ID -> 模型"""
+        models = {}
+        for product_id in self.product_ids(model_type):
+            try:
+                models[product_id], _ = self.load(product_id, model_type)
+            except ModelNotFoundError:
+                continue
+        return models
+
+    def versions(self, product_id: str, model_type: str) -> List[int]:
+        """已保存的版本号, 升序(不含正在写入的版本)"""
+        model_dir = self._model_dir(product_id, model_type)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            int(name[1:]) for name in os.listdir(model_dir)
+            if name.startswith("v") and name[1:].isdigit()
+            and os.path.exists(os.path.join(model_dir, name, self.METADATA_FILE))
+        )
+
+    def latest_version(self, product_id: str, model_type: str) -> Optional[int]:
+        """
+        最新版本号; 按目录修改时间缓存, 目录未变化时只需一次 stat,
+        其他进程(训练任务)保存新版本会改变目录修改时间, 下次读取即可生效
+        """
+        model_dir = self._model_dir(product_id, model_type)
+        try:
+            mtime = os.stat(model_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        key = (model_type, product_id)
+        cached = self._latest.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        versions = self.versions(product_id, model_type)
+        latest = versions[-1] if versions else None
+        self._latest[key] = (mtime, latest)
+        return latest
+
+    def _claim_version(self, model_dir: str) -> Tuple[int, str]:
+        """
+        以 os.mkdir 原子地占用下一个版本目录; 其他进程已占用时顺延重试.
+        占用的空目录随后被写好的临时目录原子替换
+        """
+        for _ in range(MAX_VERSION_CLAIMS):
+            claimed = sorted(
+                int(name[1:]) for name in os.listdir(model_dir)
+                if name.startswith("v") and name[1:].isdigit()
+            )
+            version = (claimed[-1] if claimed else 0) + 1
+            version_dir = os.path.join(model_dir, f"v{version}")
+            try:
+                os.mkdir(version_dir)
+            except FileExistsError:
+                continue
+            return version, version_dir
+        raise RuntimeError(f"无法分配模型版本号: {model_dir}")
+
+    def save(self, product_id: str, model_type: str, model: Any, metadata: Optional[Dict] = None) -> Dict:
+        """保存新版本模型, 返回元数据(含版本号)"""
+        payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        model_dir = self._model_dir(product_id, model_type)
+        os.makedirs(model_dir, exist_ok=True)
+
+        # 先写临时目录再改名, 读取方不会看到写了一半的版本
+        tmp_dir = os.path.join(model_dir, f".tmp-{os.getpid()}-{threading.get_ident()}-{time.time_ns()}")
+        version_dir = None
+        try:
+            os.makedirs(tmp_dir)
+            with open(os.path.join(tmp_dir, self.MODEL_FILE), "wb") as f:
+                f.write(payload)
+            version, version_dir = self._claim_version(model_dir)
+            metadata = {
+                **(metadata or {}),
+                "product_id": product_id,
+                "model_type": model_type,
+                "version": version,
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "size_bytes": len(payload),
+            }
+            with open(os.path.join(tmp_dir, self.METADATA_FILE), "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            # 目标为空目录时 rename 原子替换
+            os.rename(tmp_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if version_dir is not None:
+                try:
+                    os.rmdir(version_dir)
+                except OSError:
+                    pass
+            raise
+
+        # 最新版本缓存失效, 下次读取时按目录重新确定(期间其他进程可能也保存了新版本)
+        with self._lock:
+            self._latest.pop((model_type, product_id), None)
+        self.cache.put((product_id, model_type, version), model, metadata, len(payload))
+        self._bump_generation(model_type)
+        return metadata
+
+    def metadata(self, product_id: str, model_type: str, version: Optional[int] = None) -> Dict:
+        version = version or self.latest_version(product_id, model_type)
+        if version is None:
+            raise ModelNotFoundError(f"模型不存在: {model_type}/{product_id}")
+        path = os.path.join(self._model_dir(product_id, model_type), f"v{version}", self.METADATA_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ModelNotFoundError(f"模型不存在: {model_type}/{product_id} v{version}") from None
+
+    def load(self, product_id: str, model_type: str, version: Optional[int] = None) -> Tuple[Any, Dict]:
+        """加载模型, 优先从内存缓存读取; 未指定版本时加载最新版本"""
+        version = version or self.latest_version(product_id, model_type)
+        if version is None:
+            raise ModelNotFoundError(f"模型不存在: {model_type}/{product_id}")
+
+        key = (product_id, model_type, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        version_dir = os.path.join(self._model_dir(product_id, model_type), f"v{version}")
+        try:
+            with open(os.path.join(version_dir, self.MODEL_FILE), "rb") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            raise ModelNotFoundError(f"模型不存在: {model_type}/{product_id} v{version}") from None
+        model = pickle.loads(payload)
+        metadata = self.metadata(product_id, model_type, version)
+        self.cache.put(key, model, metadata, len(payload))
+        return model, metadata
+
+    def delete(self, product_id: str, model_type: str):
+        """删除某产品某模型的所有版本"""
+        with self._lock:
+            shutil.rmtree(self._model_dir(product_id, model_type), ignore_errors=True)
+            self._latest.pop((model_type, product_id), None)
+        self.cache.discard(product_id, model_type)
+        self._bump_generation(model_type)
@@ -0,0 +1,432 @@
+"""
+处方合理性审核 - 规则编译为按药品/药理分类索引的查找表, 批量向量化评分
+输入为 prescription_data 风格的明细列(每行一个 处方 x 药品), 检查:
+重复用药(同类药物或多种抗生素联用)、按年龄调整的日剂量上限、疗程上限、年龄及诊断禁忌,
+以及(传入相互作用索引时)处方内药品对的配伍禁忌.
+药品名称和诊断名称先去重再解析, 其余计算均为整列的数组运算
+"""
+
+import os
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+# 问题类型(按位组合)
+ISSUE_DUPLICATE = 1
+ISSUE_DOSE = 2
+ISSUE_DURATION = 4
+ISSUE_CONTRAINDICATION = 8
+ISSUE_INTERACTION = 16
+
+ISSUE_LABELS = {
+    ISSUE_DUPLICATE: "重复用药",
+    ISSUE_DOSE: "剂量不当",
+    ISSUE_DURATION: "疗程不当",
+    ISSUE_CONTRAINDICATION: "禁忌症",
+    ISSUE_INTERACTION: "配伍禁忌",
+}
+# 每类问题的扣分(同一处方同类问题只扣一次)
+ISSUE_PENALTIES = {
+    ISSUE_DUPLICATE: 15,
+    ISSUE_DOSE: 12,
+    ISSUE_DURATION: 8,
+    ISSUE_CONTRAINDICATION: 25,
+    ISSUE_INTERACTION: 10,
+}
+# 评分不低于该值视为合理处方
+RATIONAL_SCORE = 80
+
+# 达到该严重程度的药物相互作用计为配伍禁忌问题
+INTERACTION_MIN_SEVERITY = "moderate"
+
+PEDIATRIC_AGE = 12
+GERIATRIC_AGE = 65
+
+
+# ============================================
+# 用药规则
+# ============================================
+
+# 药理分类: 是否抗生素 / 疗程上限(天) / 最低适用年龄 / 老年人剂量系数
+DRUG_CLASS_RULES = {
+    "penicillin": {"antibiotic": True, "max_days": 14},
+    "cephalosporin": {"antibiotic": True, "max_days": 14},
+    "macrolide": {"antibiotic": True, "max_days": 14},
+    "quinolone": {"antibiotic": True, "max_days": 14, "min_age": 18},
+    "nsaid": {"max_days": 10, "geriatric_factor": 0.5},
+    "salicylate": {"min_age": 16},
+    "antiplatelet": {},
+    "analgesic": {"max_days": 10},
+    "mucolytic": {"max_days": 14},
+    "calcium_channel_blocker": {},
+    "biguanide": {},
+    "insulin": {},
+    "alpha_glucosidase_inhibitor": {},
+}
+
+# 通用名 -> (药理分类, 成人日剂量上限mg; None 表示不按mg限制)
+DRUGS = {
+    "阿莫西林": ("penicillin", 4000),
+    "头孢克肟": ("cephalosporin", 400),
+    "头孢呋辛": ("cephalosporin", 1000),
+    "阿奇霉素": ("macrolide", 500),
+    "左氧氟沙星": ("quinolone", 750),
+    "布洛芬": ("nsaid", 2400),
+    "阿司匹林": ("salicylate", 4000),
+    "氯吡格雷": ("antiplatelet", 75),
+    "对乙酰氨基酚": ("analgesic", 4000),
+    "氨溴索": ("mucolytic", 180),
+    "硝苯地平": ("calcium_channel_blocker", 120),
+    "二甲双胍": ("biguanide", 2550),
+    "胰岛素": ("insulin", None),
+    "阿卡波糖": ("alpha_glucosidase_inhibitor", 600),
+}
+
+# 诊断关键词 -> 禁用的药理分类
+DIAGNOSIS_CONTRAINDICATIONS = {
+    "消化道溃疡": {"nsaid", "salicylate"},
+    "胃溃疡": {"nsaid", "salicylate"},
+    "肾功能不全": {"nsaid", "biguanide"},
+    "重症肌无力": {"quinolone", "macrolide"},
+}
+
+SUGGESTIONS = {
+    ISSUE_DUPLICATE: "建议保留单一药物,避免同类药物或多种抗生素联用",
+    ISSUE_DOSE: "建议按患者年龄调整剂量",
+    ISSUE_DURATION: "建议重新评估疗程,适时停药",
+    ISSUE_CONTRAINDICATION: "建议更换为无禁忌的替代药物",
+    ISSUE_INTERACTION: "存在药物相互作用,建议调整联用方案或加强监测",
+}
+NO_ISSUE_SUGGESTION = "处方符合指南,用药合理"
+
+
+class RuleTables:
+    """
+    编译后的查找表
+
+    药品下标 -> 分类下标 / 日剂量上限; 分类下标 -> 抗生素标记 / 疗程上限 / 最低年龄 / 老年系数 / 诊断禁忌位;
+    每张表末尾多一项, 供未知药品/分类使用(不触发任何规则)
+    """
+
+    def __init__(
+        self,
+        drugs: Dict[str, tuple] = DRUGS,
+        class_rules: Dict[str, Dict] = DRUG_CLASS_RULES,
+        diagnosis_contraindications: Dict[str, set] = DIAGNOSIS_CONTRAINDICATIONS,
+    ):
+        self.class_names = list(class_rules)
+        class_index = {name: i for i, name in enumerate(self.class_names)}
+        # 长名称优先匹配
+        self.generic_names = sorted(drugs, key=len, reverse=True)
+        self.n_drugs = len(self.generic_names)
+        self.n_classes = len(self.class_names)
+
+        self.drug_class = np.full(self.n_drugs + 1, self.n_classes, dtype=np.int64)
+        self.drug_max_daily_mg = np.full(self.n_drugs + 1, np.nan)
+        for i, name in enumerate(self.generic_names):
+            drug_class, max_daily = drugs[name]
+            self.drug_class[i] = class_index[drug_class]
+            if max_daily is not None:
+                self.drug_max_daily_mg[i] = max_daily
+
+        rules = [class_rules[name] for name in self.class_names] + [{}]
+        self.class_antibiotic = np.array([r.get("antibiotic", False) for r in rules])
+        self.class_max_days = np.array([r.get("max_days", np.inf) for r in rules], dtype=np.float64)
+        self.class_min_age = np.array([r.get("min_age", 0) for r in rules], dtype=np.float64)
+        self.class_geriatric_factor = np.array([r.get("geriatric_factor", 1.0) for r in rules])
+
+        self.conditions = list(diagnosis_contraindications)
+        self.class_contraindication_bits = np.zeros(self.n_classes + 1, dtype=np.int64)
+        for bit, condition in enumerate(self.conditions):
+            for drug_class in diagnosis_contraindications[condition]:
+                self.class_contraindication_bits[class_index[drug_class]] |= 1 << bit
+
+    def resolve_drugs(self, names: Sequence[str]) -> np.ndarray:
+        """药品名称(商品名/剂型) -> 药品下标, 按名称中包含的通用名匹配, 未知为 n_drugs"""
+        index = np.full(len(names), self.n_drugs, dtype=np.int64)
+        for i, name in enumerate(names):
+            for j, generic in enumerate(self.generic_names):
+                if generic in name:
+                    index[i] = j
+                    break
+        return index
+
+    def condition_bits(self, diagnoses: Sequence[str]) -> np.ndarray:
+        bits = np.zeros(len(diagnoses), dtype=np.int64)
+        for i, diagnosis in enumerate(diagnoses):
+            for bit, condition in enumerate(self.conditions):
+                if condition in diagnosis:
+                    bits[i] |= 1 << bit
+        return bits
+
+
+DEFAULT_TABLES = RuleTables()
+
+
+def _any_by_group(flags: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    return np.bincount(groups, weights=flags, minlength=n_groups) > 0
+
+
+def evaluate(columns: Dict[str, Sequence], tables: RuleTables = DEFAULT_TABLES, interactions=None) -> Dict[str, np.ndarray]:
+    """
+    批量审核处方明细
+
+    columns 为等长的列: prescription_id, patient_age, diagnosis, drug_name,
+    dose_mg(单次剂量, 无法换算为mg时为 NaN), frequency_per_day, days_supply(0 表示长期/未填写).
+    interactions 为 InteractionIndex 时同时检查处方内药品对的相互作用.
+
+    返回处方级结果(prescription_id / score / issues / rational, 按处方ID排序)
+    和明细级结果(line_prescription: 明细所属处方下标 / line_issues / drug_class)
+    """
+    prescription_ids, rx = np.unique(np.asarray(columns["prescription_id"]), return_inverse=True)
+    n_rx = len(prescription_ids)
+    n_lines = len(rx)
+
+    names, name_inverse = np.unique(np.asarray(columns["drug_name"]), return_inverse=True)
+    drug = tables.resolve_drugs(names)[name_inverse]
+    drug_class = tables.drug_class[drug]
+    known = drug_class < tables.n_classes
+
+    age = np.asarray(columns["patient_age"], dtype=np.float64)
+    days = np.asarray(columns["days_supply"], dtype=np.float64)
+    daily_mg = np.asarray(columns["dose_mg"], dtype=np.float64) * np.asarray(columns["frequency_per_day"], dtype=np.float64)
+
+    line_issues = np.zeros(n_lines, dtype=np.int64)
+
+    # 重复用药: 同一处方内同一分类出现多次, 或联用多种抗生素
+    class_key = rx * (tables.n_classes + 1) + drug_class
+    keys, key_inverse, key_counts = np.unique(class_key, return_inverse=True, return_counts=True)
+    same_class = known & (key_counts[key_inverse] > 1)
+    key_rx = keys // (tables.n_classes + 1)
+    key_antibiotic = tables.class_antibiotic[keys % (tables.n_classes + 1)]
+    antibiotic_classes = np.bincount(key_rx, weights=key_antibiotic, minlength=n_rx)
+    multi_antibiotic = tables.class_antibiotic[drug_class] & (antibiotic_classes[rx] > 1)
+    line_issues[same_class | multi_antibiotic] |= ISSUE_DUPLICATE
+
+    # 剂量: 儿童按 Young 公式 年龄/(年龄+12) 折算, 老年人按分类系数折算
+    child_age = np.maximum(age, 1)
+    age_factor = np.where(age < PEDIATRIC_AGE, child_age / (child_age + 12), 1.0)
+    age_factor = np.where(age >= GERIATRIC_AGE, age_factor * tables.class_geriatric_factor[drug_class], age_factor)
+    with np.errstate(invalid="ignore"):
+        over_dose = daily_mg > tables.drug_max_daily_mg[drug] * age_factor
+    line_issues[over_dose] |= ISSUE_DOSE
+
+    line_issues[(days > 0) & (days > tables.class_max_days[drug_class])] |= ISSUE_DURATION
+
+    diagnoses, diagnosis_inverse = np.unique(np.asarray(columns["diagnosis"]), return_inverse=True)
+    condition = tables.condition_bits(diagnoses)[diagnosis_inverse]
+    contraindicated = (age < tables.class_min_age[drug_class]) | (
+        (condition & tables.class_contraindication_bits[drug_class]) != 0
+    )
+    line_issues[contraindicated] |= ISSUE_CONTRAINDICATION
+
+    if interactions is not None:
+        pairs = interactions.scan(columns["prescription_id"], columns["drug_name"], INTERACTION_MIN_SEVERITY)
+        line_issues[pairs["line_a"]] |= ISSUE_INTERACTION
+        line_issues[pairs["line_b"]] |= ISSUE_INTERACTION
+
+    issues = np.zeros(n_rx, dtype=np.int64)
+    score = np.full(n_rx, 100.0)
+    for bit, penalty in ISSUE_PENALTIES.items():
+        has = _any_by_group((line_issues & bit) != 0, rx, n_rx)
+        issues[has] |= bit
+        score[has] -= penalty
+    score = np.maximum(score, 0)
+
+    return {
+        "prescription_id": prescription_ids,
+        "score": score,
+        "issues": issues,
+        "rational": score >= RATIONAL_SCORE,
+        "line_prescription": rx,
+        "line_issues": line_issues,
+        "drug_class": drug_class,
+    }
+
+
+def issue_labels(issues: int) -> List[str]:
+    return [label for bit, label in ISSUE_LABELS.items() if issues & bit]
+
+
+def explain(columns: Dict[str, Sequence], result: Dict[str, np.ndarray], i: int,
+            tables: RuleTables = DEFAULT_TABLES) -> Dict[str, List[str]]:
+    """第 i 个处方的问题说明和建议, 用于展示少量处方的明细"""
+    lines = np.flatnonzero(result["line_prescription"] == i)
+    issues = []
+    for bit, label in ISSUE_LABELS.items():
+        flagged = [columns["drug_name"][k] for k in lines if result["line_issues"][k] & bit]
+        if not flagged:
+            continue
+        if bit == ISSUE_DUPLICATE:
+            classes = {tables.class_names[result["drug_class"][k]] for k in lines if result["line_issues"][k] & bit}
+            kind = "均为抗生素" if all(DRUG_CLASS_RULES[c].get("antibiotic") for c in classes) else "属同类药物"
+            issues.append(f"{label}:{'和'.join(flagged)}{kind}")
+        else:
+            issues.append(f"{label}:{'、'.join(flagged)}")
+    suggestions = [SUGGESTIONS[bit] for bit in ISSUE_LABELS if result["issues"][i] & bit]
+    return {"issues": issues, "suggestions": suggestions or [NO_ISSUE_SUGGESTION]}
+
+
+# ============================================
+# 剂量文本解析(处方展示用的 "500mg" / "3次/日" / "7天")
+# ============================================
+
+def parse_dose_mg(dose: str) -> float:
+    """单次剂量换算为mg, 非质量单位(ml/u 等)返回 NaN"""
+    dose = dose.strip().lower()
+    for unit, scale in (("mg", 1.0), ("g", 1000.0)):
+        if dose.endswith(unit):
+            try:
+                return float(dose[: -len(unit)]) * scale
+            except ValueError:
+                return float("nan")
+    return float("nan")
+
+
+def parse_frequency(frequency: str) -> float:
+    """"3次/日" -> 3; 无法解析时按1次"""
+    head = frequency.split("次", 1)[0]
+    try:
+        return float(head)
+    except ValueError:
+        return 1.0
+
+
+def parse_days(duration: str) -> int:
+    """"7天" -> 7; "长期" 等返回0"""
+    try:
+        return int(duration.rstrip("天"))
+    except ValueError:
+        return 0
+
+
+def prescription_columns(prescriptions: List[Dict]) -> Dict[str, list]:
+    """嵌套结构的处方(每个处方含 drugs 列表)展开为明细列"""
+    columns = {key: [] for key in (
+        "prescription_id", "patient_age", "diagnosis", "drug_name", "dose_mg", "frequency_per_day", "days_supply"
+    )}
+    for p in prescriptions:
+        for d in p["drugs"]:
+            columns["prescription_id"].append(p["prescription_id"])
+            columns["patient_age"].append(p["patient_age"])
+            columns["diagnosis"].append(p["diagnosis"])
+            columns["drug_name"].append(d["name"])
+            columns["dose_mg"].append(parse_dose_mg(d["dose"]))
+            columns["frequency_per_day"].append(parse_frequency(d["frequency"]))
+            columns["days_supply"].append(parse_days(d["duration"]))
+    return columns
+
+
+# ============================================
+# 按日批量审核 prescription_data
+# ============================================
+
+# 单次剂量和频次在 ClickHouse 中从用法用量文本提取
+PRESCRIPTION_LINES_SQL = """
+SELECT
+    prescription_id,
+    any(hospital_name) AS hospital_name,
+    any(department) AS department,
+    any(patient_age) AS patient_age,
+    any(diagnosis_name) AS diagnosis,
+    drug_name,
+    max(multiIf(
+        match(dosage, '[0-9.]+\\\\s*mg'), toFloat64OrZero(extract(dosage, '([0-9.]+)\\\\s*mg')),
+        match(dosage, '[0-9.]+\\\\s*g'), toFloat64OrZero(extract(dosage, '([0-9.]+)\\\\s*g')) * 1000,
+        nan
+    )) AS dose_mg,
+    max(greatest(toFloat64OrZero(extract(dosage, '([0-9]+)\\\\s*次')), 1)) AS frequency_per_day,
+    max(days_supply) AS days_supply
+FROM prescription_data
+WHERE prescription_date = {day:Date}
+GROUP BY prescription_id, drug_name
+"""
+
+
+def first_lines(line_prescription: np.ndarray, n_prescriptions: int) -> np.ndarray:
+    """每张处方的第一条明细的行号, 用于取处方级字段(医院、科室)"""
+    first = np.zeros(n_prescriptions, dtype=np.int64)
+    first[line_prescription[::-1]] = np.arange(len(line_prescription))[::-1]
+    return first
+
+
+def audit_day(client, day: date, tables: RuleTables = DEFAULT_TABLES, interactions=None, stats_store=None) -> Dict:
+    """
+    审核一天的全部处方, 结果写入 prescription_audit 表;
+    传入 stats_store(DailyStatsStore) 时同时保存当天的统计部分状态
+
+    client 为 clickhouse_connect 客户端
+    """
+    result = client.query(PRESCRIPTION_LINES_SQL, parameters={"day": day})
+    columns = {name: np.asarray(column) for name, column in zip(result.column_names, result.result_columns)}
+    if len(columns.get("prescription_id", ())) == 0:
+        return {"prescriptions": 0, "rational": 0}
+
+    audit = evaluate(columns, tables, interactions)
+    first = first_lines(audit["line_prescription"], len(audit["prescription_id"]))
+    hospitals = columns["hospital_name"][first]
+    departments = columns["department"][first]
+    rows = [
+        [day, pid, hospital, department, float(score), int(issues), bool(rational)]
+        for pid, hospital, department, score, issues, rational in zip(
+            audit["prescription_id"], hospitals, departments, audit["score"], audit["issues"], audit["rational"]
+        )
+    ]
+    client.insert(
+        "prescription_audit", rows,
+        column_names=["prescription_date", "prescription_id", "hospital_name", "department",
+                      "rationality_score", "issue_flags", "is_rational"],
+    )
+    if stats_store is not None:
+        from prescription_stats import PrescriptionStats
+
+        stats = PrescriptionStats()
+        stats.add(audit["score"], audit["rational"], audit["issues"], departments, hospitals)
+        stats_store.save_day(str(day), stats)
+    return {"prescriptions": len(rows), "rational": int(audit["rational"].sum())}
+
+
+def audit_range(
+    client,
+    start: date,
+    end: date,
+    interactions=None,
+    stats_store=None,
+    log: Callable[[str], None] = print,
+) -> Dict:
+    """逐日审核 [start, end] 区间"""
+    totals = {"prescriptions": 0, "rational": 0}
+    day = start
+    while day <= end:
+        summary = audit_day(client, day, interactions=interactions, stats_store=stats_store)
+        log(f"{day}: {summary['prescriptions']} 张处方, 合理 {summary['rational']}")
+        for key in totals:
+            totals[key] += summary[key]
+        day += timedelta(days=1)
+    return totals
+
+
+if __name__ == "__main__":
+    import sys
+
+    import clickhouse_connect
+
+    from interaction_index import InteractionIndex
+    from prescription_stats import DailyStatsStore
+
+    client = clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+    )
+    # 用法: python prescription_rules.py [开始日期 [结束日期]], 默认审核昨天
+    yesterday = date.today() - timedelta(days=1)
+    start = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else yesterday
+    end = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else start
+    totals = audit_range(
+        client, start, end, interactions=InteractionIndex.from_env(), stats_store=DailyStatsStore.from_env()
+    )
+    print(f"✅ 已审核 {totals['prescriptions']} 张处方, 合理 {totals['rational']}")
@@ -0,0 +1,278 @@
+"""
+处方统计 - 流式聚合审核结果
+按科室/医院维护 处方数、合理数、评分合计, 按问题类型维护计数; 状态只含可相加的计数,
+多个进程(或多天)的部分状态直接相加即可合并. 统计接口读取缓存的汇总, 不扫描处方明细
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from prescription_rules import ISSUE_LABELS
+
+# 分组计数: [处方数, 合理数, 评分合计]
+_TOTAL, _RATIONAL, _SCORE = range(3)
+
+
+def _rate(numerator: float, denominator: float) -> float:
+    return round(100.0 * numerator / denominator, 1) if denominator else 0.0
+
+
+class PrescriptionStats:
+    """
+    可合并的处方统计
+
+    - add(): 写入一批审核结果(向量化分组累加)
+    - merge(): 合并另一个统计或其状态
+    - summary(): 汇总视图, 状态未变化时复用
+    """
+
+    def __init__(self):
+        self._by_department: Dict[str, list] = {}
+        self._by_hospital: Dict[str, list] = {}
+        self._issues: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._summary: Optional[Dict] = None
+        self.version = 0
+
+    @staticmethod
+    def _accumulate(groups: Dict[str, list], key: str, total: float, rational: float, score_sum: float):
+        counts = groups.setdefault(key, [0, 0, 0.0])
+        counts[_TOTAL] += total
+        counts[_RATIONAL] += rational
+        counts[_SCORE] += score_sum
+
+    def add(
+        self,
+        score: np.ndarray,
+        rational: np.ndarray,
+        issues: np.ndarray,
+        departments: Sequence[str],
+        hospitals: Sequence[str],
+    ):
+        """写入一批处方的审核结果(每个位置一张处方)"""
+        score = np.asarray(score, dtype=np.float64)
+        rational = np.asarray(rational, dtype=np.float64)
+        issues = np.asarray(issues, dtype=np.int64)
+        grouped = []
+        for labels in (departments, hospitals):
+            keys, inverse = np.unique(np.asarray(labels), return_inverse=True)
+            grouped.append((
+                keys,
+                np.bincount(inverse, minlength=len(keys)),
+                np.bincount(inverse, weights=rational, minlength=len(keys)),
+                np.bincount(inverse, weights=score, minlength=len(keys)),
+            ))
+        issue_counts = {label: int(((issues & bit) != 0).sum()) for bit, label in ISSUE_LABELS.items()}
+
+        with self._lock:
+            for groups, (keys, totals, rationals, scores) in zip((self._by_department, self._by_hospital), grouped):
+                for key, total, rational_count, score_sum in zip(keys, totals, rationals, scores):
+                    self._accumulate(groups, str(key), int(total), int(rational_count), float(score_sum))
+            for label, count in issue_counts.items():
+                if count:
+                    self._issues[label] = self._issues.get(label, 0) + count
+            self._changed()
+
+    def add_group(self, department: str, total: int, rational: int, avg_score: float, hospital: Optional[str] = None):
+        """写入已汇总的分组数据(如期初统计)"""
+        with self._lock:
+            self._accumulate(self._by_department, department, total, rational, avg_score * total)
+            if hospital is not None:
+                self._accumulate(self._by_hospital, hospital, total, rational, avg_score * total)
+            self._changed()
+
+    def add_issue(self, label: str, count: int):
+        with self._lock:
+            self._issues[label] = self._issues.get(label, 0) + count
+            self._changed()
+
+    def _changed(self):
+        self._summary = None
+        self.version += 1
+
+    # ------------------------------------------
+    # 部分状态的导出与合并
+    # ------------------------------------------
+
+    def to_state(self) -> Dict:
+        with self._lock:
+            return {
+                "by_department": {k: list(v) for k, v in self._by_department.items()},
+                "by_hospital": {k: list(v) for k, v in self._by_hospital.items()},
+                "issues": dict(self._issues),
+            }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "PrescriptionStats":
+        stats = cls()
+        stats.merge(state)
+        return stats
+
+    def merge(self, other):
+        """合并另一个 PrescriptionStats 或 to_state() 导出的状态"""
+        state = other.to_state() if isinstance(other, PrescriptionStats) else other
+        # 先解析整个状态, 格式错误时不做部分合并
+        groups = {
+            name: [(str(key), int(total), int(rational), float(score_sum))
+                   for key, (total, rational, score_sum) in state.get(name, {}).items()]
+            for name in ("by_department", "by_hospital")
+        }
+        issues = [(str(label), int(count)) for label, count in state.get("issues", {}).items()]
+        with self._lock:
+            for name, target in (("by_department", self._by_department), ("by_hospital", self._by_hospital)):
+                for key, total, rational, score_sum in groups[name]:
+                    self._accumulate(target, key, total, rational, score_sum)
+            for label, count in issues:
+                self._issues[label] = self._issues.get(label, 0) + count
+            self._changed()
+
+    # ------------------------------------------
+    # 汇总
+    # ------------------------------------------
+
+    @staticmethod
+    def _group_rows(groups: Dict[str, list], name: str):
+        rows = [
+            {
+                name: key,
+                "total": int(total),
+                "rational": int(rational),
+                "rate": _rate(rational, total),
+                "avg_score": round(score_sum / total, 1) if total else 0.0,
+            }
+            for key, (total, rational, score_sum) in groups.items()
+        ]
+        return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            if self._summary is not None:
+                return self._summary
+            total = sum(v[_TOTAL] for v in self._by_department.values())
+            rational = sum(v[_RATIONAL] for v in self._by_department.values())
+            score_sum = sum(v[_SCORE] for v in self._by_department.values())
+            issues = sorted(self._issues.items(), key=lambda item: item[1], reverse=True)
+            self._summary = {
+                "total_prescriptions": int(total),
+                "rational_prescriptions": int(rational),
+                "rationality_rate": _rate(rational, total),
+                "avg_rationality_score": round(score_sum / total, 1) if total else 0.0,
+                "by_department": self._group_rows(self._by_department, "department"),
+                "by_hospital": self._group_rows(self._by_hospital, "hospital"),
+                "common_issues": [
+                    {"issue": label, "count": count, "rate": _rate(count, total)} for label, count in issues
+                ],
+            }
+            return self._summary
+
+
+class WorkerStatsSet:
+    """
+    按来源(如审核进程ID)保存的部分状态; 同一来源重复提交时替换上次的状态而不是累加,
+    进程可定期推送自己的累计统计, 不会重复计数
+    """
+
+    def __init__(self):
+        self._workers: Dict[str, PrescriptionStats] = {}
+        self._merged: Optional[PrescriptionStats] = None
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def put(self, worker_id: str, state: Dict) -> int:
+        """替换 worker_id 的部分状态(格式错误时不做修改), 返回版本号"""
+        stats = PrescriptionStats.from_state(state)
+        with self._lock:
+            self._workers[worker_id] = stats
+            self._merged = None
+            self.version += 1
+            return self.version
+
+    def workers(self) -> List[str]:
+        with self._lock:
+            return list(self._workers)
+
+    def merged(self) -> PrescriptionStats:
+        """全部来源合并后的统计; 未变化时复用"""
+        with self._lock:
+            if self._merged is None:
+                merged = PrescriptionStats()
+                for stats in self._workers.values():
+                    merged.merge(stats)
+                self._merged = merged
+            return self._merged
+
+
+class DailyStatsStore:
+    """
+    按处方日期保存的部分状态, 每天一个JSON文件({directory}/{日期}.json), 重跑某天的审核会覆盖当天的文件
+
+    审核任务与API服务可能在不同进程: 每个文件先写临时文件再原子替换, 不同进程保存不同日期
+    互不覆盖; 读取时只重新加载发生变化的日期文件
+    """
+
+    def __init__(self, directory: str = "/tmp/data-insights-models/prescription_stats"):
+        self.directory = directory
+        self._days: Dict[str, Dict] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._merged: Optional[PrescriptionStats] = None
+        # 每次有日期文件变化后加一, 调用方据此判断合并结果是否需要重建
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "DailyStatsStore":
+        return cls(directory=os.getenv("PRESCRIPTION_STATS_DIR", "/tmp/data-insights-models/prescription_stats"))
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{day}.json")
+
+    def _reload(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        # 文件按 (inode, 修改时间) 判断是否变化: 原子替换总会生成新的 inode
+        signatures = {}
+        for name in names:
+            if name.endswith(".json"):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                signatures[name[:-5]] = (st.st_ino, st.st_mtime_ns)
+        if signatures == self._signatures:
+            return
+        for day in set(self._days) - set(signatures):
+            del self._days[day]
+        for day, signature in signatures.items():
+            if self._signatures.get(day) != signature:
+                try:
+                    with open(self._path(day), encoding="utf-8") as f:
+                        self._days[day] = json.load(f)
+                except FileNotFoundError:
+                    continue
+        self._signatures = signatures
+        self._merged = None
+        self.generation += 1
+
+    def save_day(self, day: str, stats: PrescriptionStats):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(day)}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats.to_state(), f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(day))
+
+    def merged(self) -> PrescriptionStats:
+        """全部日期合并后的统计; 文件未变化时复用"""
+        with self._lock:
+            self._reload()
+            if self._merged is None:
+                merged = PrescriptionStats()
+                for state in self._days.values():
+                    merged.merge(state)
+                self._merged = merged
+            return self._merged
@@ -0,0 +1,85 @@
+"""
+补货优化 - 向量化计算全部 产品 x 仓库 的安全库存、再订货点和建议订货量
+所有组合在一次NumPy计算中完成, 然后按优先级排序
+
+- 安全库存 SS = z * sqrt(L * σd² + d² * σL²)
+- 再订货点 ROP = d * L + SS
+- 建议订货量: 库存低于再订货点时补到 d * (L + 复核周期) + SS
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# 服务水平 -> 正态分位数
+SERVICE_LEVEL_Z = {0.9: 1.2816, 0.95: 1.6449, 0.975: 1.96, 0.99: 2.3263}
+
+# 可售天数超过该值视为积压
+OVERSTOCK_DAYS = 90
+# 复核周期(天): 补货补到可覆盖 交货期 + 复核周期 的需求
+REVIEW_DAYS = 14
+
+PRIORITIES = ("critical", "high", "medium", "low")
+
+
+def optimize_reorder(
+    current_stock: np.ndarray,
+    daily_demand: np.ndarray,
+    demand_std: np.ndarray,
+    lead_time_days: np.ndarray,
+    lead_time_std: Optional[np.ndarray] = None,
+    service_level: float = 0.95,
+    review_days: float = REVIEW_DAYS,
+    overstock_days: float = OVERSTOCK_DAYS,
+) -> Dict[str, np.ndarray]:
+    """
+    输入为等长数组(每个元素一个 产品 x 仓库 组合), 返回同样长度的结果数组
+
+    daily_demand 为预测日均需求, demand_std 为日需求标准差, lead_time_days 为供应商平均交货期
+    """
+    z = SERVICE_LEVEL_Z.get(service_level)
+    if z is None:
+        raise ValueError(f"不支持的服务水平: {service_level}, 可选 {sorted(SERVICE_LEVEL_Z)}")
+
+    stock = np.asarray(current_stock, dtype=np.float64)
+    d = np.asarray(daily_demand, dtype=np.float64)
+    sigma_d = np.asarray(demand_std, dtype=np.float64)
+    lead = np.asarray(lead_time_days, dtype=np.float64)
+    sigma_l = np.zeros_like(lead) if lead_time_std is None else np.asarray(lead_time_std, dtype=np.float64)
+
+    safety_stock = z * np.sqrt(lead * sigma_d ** 2 + d ** 2 * sigma_l ** 2)
+    reorder_point = d * lead + safety_stock
+    order_up_to = d * (lead + review_days) + safety_stock
+
+    below = stock < reorder_point
+    order_quantity = np.where(below, np.maximum(order_up_to - np.maximum(stock, 0), 0), 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_of_stock = np.where(d > 0, np.maximum(stock, 0) / d, np.inf)
+    # 无需求的零库存/负库存不算积压
+    overstock = (stock > 0) & (days_of_stock > overstock_days)
+    excess_quantity = np.where(overstock, stock - d * overstock_days, 0)
+
+    # 优先级: 0 critical(缺货) / 1 high(交货期内会断货) / 2 medium(低于再订货点或积压) / 3 low
+    priority = np.full(len(stock), 3, dtype=np.int8)
+    priority[below | overstock] = 2
+    priority[below & (days_of_stock < lead)] = 1
+    priority[(stock <= 0) & (d > 0)] = 0
+
+    # 同一优先级内: 缺口按 可售天数/交货期 升序; 积压按可售天数降序
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coverage = np.where(lead > 0, days_of_stock / lead, days_of_stock)
+    urgency = np.where(overstock & ~below, -days_of_stock, coverage)
+    order = np.lexsort((urgency, priority))
+
+    return {
+        "safety_stock": np.ceil(safety_stock),
+        "reorder_point": np.ceil(reorder_point),
+        "order_quantity": np.ceil(order_quantity),
+        "excess_quantity": np.floor(excess_quantity),
+        "days_of_stock": days_of_stock,
+        "below_reorder_point": below,
+        "overstock": overstock,
+        "priority": priority,
+        "order": order,
+    }
@@ -0,0 +1,248 @@
+"""
+结果缓存 - 内存LRU + 按接口TTL + 数据版本失效
+可选使用Redis兼容存储作为二级缓存(设置 REDIS_URL 环境变量)
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class RedisStore:
+    """Redis兼容的二级缓存, 出错时静默降级为仅内存缓存"""
+
+    def __init__(self, url: str, prefix: str = "data-insights:cache"):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        try:
+            raw = self.client.get(f"{self.prefix}:{key}")
+        except Exception:
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            self.client.set(
+                f"{self.prefix}:{key}",
+                json.dumps(value, ensure_ascii=False, default=str),
+                ex=max(1, int(ttl)),
+            )
+        except Exception:
+            pass
+
+    def clear(self) -> int:
+        """删除本缓存前缀下的全部条目, 返回删除数量"""
+        deleted = 0
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=f"{self.prefix}:*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += self.client.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += self.client.delete(*batch)
+        except Exception as e:
+            print(f"⚠️ 清空二级缓存失败: {e}")
+        return deleted
+
+
+class ResultCache:
+    """
+    接口结果缓存
+
+    - key = 数据版本 + 接口名 + 规范化参数 + 用户权限范围
+    - 每个条目有独立TTL, 超出容量时淘汰最久未使用的条目
+    - 数据版本变化(data_update_log 出现新记录)时整体失效
+    """
+
+    def __init__(self, max_entries: int = 1024, store: Optional[RedisStore] = None):
+        self.max_entries = max_entries
+        self.store = store
+        self.data_version = "0"
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        store = None
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            try:
+                store = RedisStore(redis_url)
+            except ImportError:
+                print("⚠️ 未安装redis, 结果缓存仅使用内存")
+        return cls(max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")), store=store)
+
+    def make_key(self, endpoint: str, params: Dict[str, Any], scope: str) -> str:
+        normalized = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha1(f"{normalized}|{scope}".encode("utf-8")).hexdigest()
+        return f"{self.data_version}:{endpoint}:{digest}"
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                # 二级缓存不记录剩余TTL, 回填时使用较短的本地TTL
+                self._put(key, value, 30)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._put(key, value, ttl)
+        if self.store is not None:
+            self.store.set(key, value, ttl)
+
+    def set_data_version(self, version: str) -> bool:
+        """更新数据版本, 版本变化时清空本地缓存; 返回是否发生了失效"""
+        version = str(version)
+        with self._lock:
+            if version == self.data_version:
+                return False
+            self.data_version = version
+            self._entries.clear()
+        return True
+
+    def invalidate_all(self):
+        """清空本地缓存和二级缓存, 避免旧条目从Redis回填"""
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "data_version": self.data_version,
+                "backend": "redis" if self.store is not None else "memory",
+            }
+
+    def cached(self, endpoint: str, ttl: float, scope_param: str = "scope"):
+        """
+        FastAPI接口缓存装饰器
+
+        接口需声明 scope_param 参数(用户权限范围), 其余参数作为缓存key的一部分
+        """
+        def decorator(func: Callable):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                params = {k: v for k, v in kwargs.items() if k != scope_param}
+                key = self.make_key(endpoint, params, str(kwargs.get(scope_param, "")))
+                value = self.get(key)
+                if value is None:
+                    value = await func(*args, **kwargs)
+                    self.set(key, value, ttl)
+                return value
+            return wrapper
+        return decorator
+
+
+class DataVersionWatcher:
+    """
+    定期探测 data_update_log 的最新记录, 出现新记录时使缓存失效
+
+    probe 为同步函数, 返回当前数据版本标识; 在线程池中执行, 不阻塞事件循环
+    """
+
+    def __init__(self, cache: ResultCache, probe: Callable[[], Optional[str]], interval: float = 60.0):
+        self.cache = cache
+        self.probe = probe
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self) -> bool:
+        loop = asyncio.get_running_loop()
+        try:
+            version = await loop.run_in_executor(None, self.probe)
+        except Exception as e:
+            print(f"⚠️ 数据版本探测失败: {e}")
+            return False
+        if version is None:
+            return False
+        return self.cache.set_data_version(version)
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_probe_client = None
+_probe_lock = threading.Lock()
+
+
+def clickhouse_update_log_probe() -> Optional[str]:
+    """从ClickHouse的 data_update_log 读取最新成功更新作为数据版本; 复用同一个客户端, 出错时重建"""
+    global _probe_client
+    with _probe_lock:
+        if _probe_client is None:
+            import clickhouse_connect
+            _probe_client = clickhouse_connect.get_client(
+                host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+                port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+                username=os.getenv("CLICKHOUSE_USER", "default"),
+                password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+                database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+            )
+        try:
+            result = _probe_client.query(
+                "SELECT max(update_time), count() FROM data_update_log WHERE status = 'success'"
+            )
+        except Exception:
+            try:
+                _probe_client.close()
+            except Exception:
+                pass
+            _probe_client = None
+            raise
+    latest, count = result.result_rows[0]
+    return f"{latest}#{count}"
@@ -0,0 +1,421 @@
+"""
+统计预测引擎 - 向量化指数平滑 (Holt / Holt-Winters 加法模型)
+多条序列同时拟合: 按时间步递推, 每一步对 参数组合 x 序列 的矩阵做向量运算,
+每条序列取一步预测误差平方和最小的参数; 预测区间按 ETS(A,A,A) 的方差公式计算.
+仅依赖NumPy, 可在每晚数据加载后用CPU重拟合全部 产品 x 省份 序列
+"""
+
+import os
+import uuid
+from datetime import date
+from itertools import product as grid_product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 参数网格
+ALPHA_GRID = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETA_GRID = (0.01, 0.1, 0.3)
+GAMMA_GRID = (0.05, 0.2, 0.5)
+
+# 每批拟合的序列数, 控制 参数组合 x 序列 x 季节长度 的中间数组大小
+FIT_CHUNK_SIZE = 4096
+
+# 常用覆盖率对应的正态分位数
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}
+
+
+class ETSFit:
+    """
+    拟合结果, 每个属性为按序列排列的数组
+
+    - level / trend: 最后时刻的水平与趋势, 形状 (N,)
+    - season: 季节分量, 形状 (N, m), 按 时间下标 % m 存放; 非季节模型为 None
+    - alpha / beta / gamma: 每条序列选中的平滑参数
+    - sigma: 一步预测误差的标准差
+    - fitted: 样本内一步预测值, 形状 (N, T)
+    """
+
+    def __init__(self, level, trend, season, alpha, beta, gamma, sigma, fitted, n_obs, season_length):
+        self.level = level
+        self.trend = trend
+        self.season = season
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.sigma = sigma
+        self.fitted = fitted
+        self.n_obs = n_obs
+        self.season_length = season_length
+
+    def __len__(self):
+        return len(self.level)
+
+    def forecast(self, horizon: int, coverage: float = 0.95):
+        """返回 (mean, lower, upper), 形状均为 (N, horizon)"""
+        steps = np.arange(1, horizon + 1, dtype=np.float64)
+        mean = self.level[:, np.newaxis] + self.trend[:, np.newaxis] * steps
+
+        m = self.season_length
+        if self.season is not None:
+            idx = (self.n_obs - 1 + steps.astype(np.int64)) % m
+            mean = mean + self.season[:, idx]
+
+        # var_h = sigma^2 * (1 + sum_{j<h} c_j^2)
+        # 递推按平滑形式(beta/gamma 作用于水平变化和去水平残差), 换算为误差修正形式后
+        # c_j = alpha + alpha*beta*j + gamma*(1-alpha)*[j % m == 0]
+        j = steps[:-1]
+        alpha = self.alpha[:, np.newaxis]
+        c = alpha + alpha * self.beta[:, np.newaxis] * j
+        if self.season is not None:
+            c = c + self.gamma[:, np.newaxis] * (1 - alpha) * (j % m == 0)
+        cum = np.concatenate([np.zeros((len(self), 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+        std = self.sigma[:, np.newaxis] * np.sqrt(1 + cum)
+
+        z = Z_SCORES.get(coverage)
+        if z is None:
+            raise ValueError(f"不支持的置信水平: {coverage}, 可选 {sorted(Z_SCORES)}")
+        return mean, mean - z * std, mean + z * std
+
+
+def _initial_states(y: np.ndarray, m: Optional[int]):
+    """初始化水平/趋势/季节分量, 返回 (level, trend, season, 递推起始下标)"""
+    if m:
+        first = y[:, :m].mean(axis=1)
+        if y.shape[1] >= 2 * m:
+            trend = (y[:, m:2 * m].mean(axis=1) - first) / m
+        else:
+            trend = np.zeros(len(y))
+        season = y[:, :m] - first[:, np.newaxis]
+        # 水平对齐到第 m-1 期, 从第 m 期开始递推
+        level = first + trend * (m - 1) / 2
+        return level, trend, season, m
+    return y[:, 0].copy(), y[:, 1] - y[:, 0], None, 1
+
+
+def _fit_chunk(y: np.ndarray, m: Optional[int], grid: np.ndarray):
+    n, t_len = y.shape
+    g = len(grid)
+    alpha = grid[:, 0][:, np.newaxis]
+    beta = grid[:, 1][:, np.newaxis]
+    gamma = grid[:, 2][:, np.newaxis]
+
+    level0, trend0, season0, start = _initial_states(y, m)
+    level = np.broadcast_to(level0, (g, n)).copy()
+    trend = np.broadcast_to(trend0, (g, n)).copy()
+    season = np.broadcast_to(season0, (g, n, m)).copy() if m else None
+
+    sse = np.zeros((g, n))
+    fitted = np.empty((g, n, t_len))
+    fitted[:, :, :start] = y[np.newaxis, :, :start]
+
+    for t in range(start, t_len):
+        obs = y[:, t]
+        s = season[:, :, t % m] if m else 0.0
+        pred = level + trend + s
+        fitted[:, :, t] = pred
+        sse += (obs - pred) ** 2
+
+        new_level = alpha * (obs - s) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        if m:
+            season[:, :, t % m] = gamma * (obs - new_level) + (1 - gamma) * s
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    cols = np.arange(n)
+    n_params = 3 if m else 2
+    dof = max(t_len - start - n_params, 1)
+    return {
+        "level": level[best, cols],
+        "trend": trend[best, cols],
+        "season": season[best, cols] if m else None,
+        "alpha": grid[best, 0],
+        "beta": grid[best, 1],
+        "gamma": grid[best, 2],
+        "sigma": np.sqrt(sse[best, cols] / dof),
+        "fitted": fitted[best, cols],
+    }
+
+
+def fit_ets(
+    y: np.ndarray,
+    season_length: Optional[int] = None,
+    alphas: Sequence[float] = ALPHA_GRID,
+    betas: Sequence[float] = BETA_GRID,
+    gammas: Sequence[float] = GAMMA_GRID,
+    chunk_size: int = FIT_CHUNK_SIZE,
+) -> ETSFit:
+    """
+    同时拟合多条序列
+
+    y 为 (N, T) 矩阵, 每行一条等间隔序列, 缺失值按0处理;
+    season_length 为季节周期(如月度数据取12), 序列长度不足两个周期时退化为Holt模型
+    """
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    if y.ndim == 1:
+        y = y[np.newaxis, :]
+    n, t_len = y.shape
+    if t_len < 3:
+        raise ValueError("序列长度至少为3")
+
+    m = season_length if season_length and t_len >= 2 * season_length else None
+    grid = np.array(list(grid_product(alphas, betas, gammas if m else (0.0,))), dtype=np.float64)
+
+    parts = [_fit_chunk(y[i:i + chunk_size], m, grid) for i in range(0, n, chunk_size)]
+
+    def join(name):
+        return np.concatenate([p[name] for p in parts]) if parts[0][name] is not None else None
+
+    return ETSFit(
+        level=join("level"),
+        trend=join("trend"),
+        season=join("season"),
+        alpha=join("alpha"),
+        beta=join("beta"),
+        gamma=join("gamma"),
+        sigma=join("sigma"),
+        fitted=join("fitted"),
+        n_obs=t_len,
+        season_length=m,
+    )
+
+
+def forecast_metrics(actual: np.ndarray, predicted: np.ndarray) -> Dict[str, np.ndarray]:
+    """按行计算 MAPE(%) / RMSE / MAE / R², 实际值为0的点不计入MAPE"""
+    actual = np.asarray(actual, dtype=np.float64)
+    predicted = np.asarray(predicted, dtype=np.float64)
+    err = actual - predicted
+    abs_err = np.abs(err)
+
+    nonzero = actual != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(nonzero, abs_err / np.abs(actual), 0.0)
+        mape = ape.sum(axis=-1) / nonzero.sum(axis=-1) * 100
+        ss_res = (err ** 2).sum(axis=-1)
+        ss_tot = ((actual - actual.mean(axis=-1, keepdims=True)) ** 2).sum(axis=-1)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+    return {
+        "mape": mape,
+        "rmse": np.sqrt((err ** 2).mean(axis=-1)),
+        "mae": abs_err.mean(axis=-1),
+        "r2_score": r2,
+    }
+
+
+def simulate_ets(
+    n: int,
+    t_len: int,
+    alpha: float,
+    beta: float,
+    gamma: float = 0.0,
+    season_length: Optional[int] = None,
+    sigma: float = 1.0,
+    seed: Optional[int] = None,
+    state: Optional[ETSFit] = None,
+) -> Tuple[np.ndarray, ETSFit]:
+    """
+    按与 _fit_chunk 相同的递推生成 (N, T) 模拟序列, 用于检查预测区间
+
+    state 为 None 时随机初始化, 否则从 state 的末期状态继续生成;
+    返回 (序列, 末期真实状态), 末期状态为 ETSFit, 可直接调用 forecast()
+    """
+    rng = np.random.default_rng(seed)
+    m = season_length
+    if state is None:
+        level = rng.uniform(50, 100, n)
+        trend = rng.normal(0, 0.5, n)
+        season = rng.normal(0, 5, (n, m)) if m else None
+        if m:
+            season -= season.mean(axis=1, keepdims=True)
+        t0 = 0
+    else:
+        level, trend = state.level.copy(), state.trend.copy()
+        season = state.season.copy() if m else None
+        t0 = state.n_obs
+    y = np.empty((n, t_len))
+    for k, t in enumerate(range(t0, t0 + t_len)):
+        s = season[:, t % m] if m else 0.0
+        obs = level + trend + s + rng.normal(0, sigma, n)
+        y[:, k] = obs
+        new_level = alpha * (obs - s) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        if m:
+            season[:, t % m] = gamma * (obs - new_level) + (1 - gamma) * s
+        level = new_level
+
+    def full(value):
+        return np.full(n, value, dtype=np.float64)
+
+    end_state = ETSFit(
+        level, trend, season, full(alpha), full(beta), full(gamma), full(sigma),
+        fitted=None, n_obs=t0 + t_len, season_length=m,
+    )
+    return y, end_state
+
+
+def interval_coverage(
+    n: int = 2000,
+    history: int = 60,
+    horizon: int = 24,
+    season_length: Optional[int] = 12,
+    coverage: float = 0.95,
+    params: Sequence[float] = (0.3, 0.1, 0.2),
+    estimate: bool = True,
+    seed: Optional[int] = 0,
+) -> np.ndarray:
+    """
+    模拟序列上的预测区间实际覆盖率(%), 形状 (horizon,)
+
+    前 history 期生成历史, 检查后 horizon 期实际值落入区间的比例.
+    estimate=False 时用真实参数和真实末期状态预测, 只检验方差公式, 各期应接近 coverage;
+    estimate=True 时用 fit_ets 拟合, 还包含参数与初始状态的估计误差(长期区间通常偏窄)
+    """
+    alpha, beta, gamma = params
+    y, state = simulate_ets(n, history, alpha, beta, gamma, season_length, seed=seed)
+    future, _ = simulate_ets(n, horizon, alpha, beta, gamma, season_length, seed=None if seed is None else seed + 1, state=state)
+    fit = fit_ets(y, season_length=season_length) if estimate else state
+    _, lower, upper = fit.forecast(horizon, coverage)
+    return 100.0 * ((future >= lower) & (future <= upper)).mean(axis=0)
+
+
+# ============================================
+# 写入 market_forecast
+# ============================================
+
+MONTHLY_SERIES_SQL = """
+SELECT
+    product_id,
+    any(product_name) AS product_name,
+    any(category_l1) AS category_l1,
+    any(manufacturer_id) AS manufacturer_id,
+    any(sales_region) AS region,
+    sales_province AS province,
+    groupArray((toStartOfMonth(sale_date), amount)) AS points
+FROM (
+    SELECT product_id, product_name, category_l1, manufacturer_id, sales_region, sales_province,
+           sale_date, sum(sales_amount) AS amount
+    FROM sales_data
+    WHERE sale_date >= toStartOfMonth(today()) - INTERVAL {months:UInt32} MONTH
+      AND sale_date < toStartOfMonth(today())
+    GROUP BY product_id, product_name, category_l1, manufacturer_id, sales_region, sales_province, sale_date
+)
+GROUP BY product_id, sales_province
+"""
+
+
+def add_months(d: date, months: int) -> date:
+    total = d.year * 12 + d.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def build_series_matrix(rows: List[Dict], first_month: date, months: int) -> np.ndarray:
+    """将 (月份, 销售额) 点列表整理为 (N, months) 矩阵"""
+    y = np.zeros((len(rows), months))
+    for i, row in enumerate(rows):
+        for month, amount in row["points"]:
+            offset = (month.year - first_month.year) * 12 + month.month - first_month.month
+            if 0 <= offset < months:
+                y[i, offset] += float(amount)
+    return y
+
+
+def market_forecast_rows(
+    series: List[Dict],
+    y: np.ndarray,
+    fit: ETSFit,
+    first_target_month: date,
+    horizon: int,
+    model_version: str,
+    coverage: float = 0.95,
+) -> List[Dict]:
+    """生成 market_forecast 表的行, 历史准确率取样本内一步预测的 100 - MAPE"""
+    mean, lower, upper = fit.forecast(horizon, coverage)
+    mean = np.maximum(mean, 0)
+    lower = np.maximum(lower, 0)
+
+    start = fit.season_length or 1
+    mape = forecast_metrics(y[:, start:], fit.fitted[:, start:])["mape"]
+    accuracy = np.clip(100 - np.nan_to_num(mape, nan=100.0), 0, 100)
+
+    forecast_id = uuid.uuid4().hex
+    today = date.today()
+    targets = [add_months(first_target_month, h) for h in range(horizon)]
+    rows = []
+    for i, info in enumerate(series):
+        for h, target in enumerate(targets):
+            rows.append({
+                "forecast_id": forecast_id,
+                "forecast_date": today,
+                "model_name": "ETS",
+                "model_version": model_version,
+                "target_date": target,
+                "target_month": target.strftime("%Y-%m"),
+                "target_quarter": f"{target.year}-Q{(target.month - 1) // 3 + 1}",
+                "product_id": info["product_id"],
+                "product_name": info.get("product_name", ""),
+                "category_l1": info.get("category_l1", ""),
+                "manufacturer_id": info.get("manufacturer_id", ""),
+                "region": info.get("region", ""),
+                "province": info.get("province", ""),
+                "forecast_sales_amount": round(float(mean[i, h]), 2),
+                "forecast_sales_quantity": 0,
+                "forecast_lower_bound": round(float(lower[i, h]), 2),
+                "forecast_upper_bound": round(float(upper[i, h]), 2),
+                "prediction_confidence": coverage * 100,
+                "model_accuracy": round(float(accuracy[i]), 2),
+            })
+    return rows
+
+
+def refit_market_forecast(client, months: int = 36, horizon: int = 12, season_length: int = 12) -> Dict:
+    """
+    重拟合全部 产品 x 省份 的月度销售额序列并写入 market_forecast
+
+    client 为 clickhouse_connect 客户端; 每晚数据加载(data_update_log)后调用
+    """
+    this_month = date.today().replace(day=1)
+    first_month = add_months(this_month, -months)
+
+    result = client.query(MONTHLY_SERIES_SQL, parameters={"months": months})
+    series = list(result.named_results())
+    if not series:
+        return {"series": 0, "rows": 0}
+
+    y = build_series_matrix(series, first_month, months)
+    fit = fit_ets(y, season_length=season_length)
+    rows = market_forecast_rows(series, y, fit, this_month, horizon, model_version=this_month.strftime("%Y%m"))
+
+    columns = list(rows[0])
+    client.insert("market_forecast", [[row[c] for c in columns] for row in rows], column_names=columns)
+    return {"series": len(series), "rows": len(rows)}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if sys.argv[1:] == ["check-intervals"]:
+        # 在模拟序列上检查预测区间覆盖率, 不需要ClickHouse
+        for season_length in (None, 12):
+            for estimate in (False, True):
+                rates = interval_coverage(season_length=season_length, estimate=estimate)
+                label = "拟合参数" if estimate else "真实参数"
+                print(f"季节周期={season_length} {label}: " + ", ".join(
+                    f"h={h}: {rates[h - 1]:.1f}%" for h in (1, 6, 12, 24)
+                ))
+        sys.exit(0)
+
+    import clickhouse_connect
+
+    client = clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+    )
+    started = time.perf_counter()
+    summary = refit_market_forecast(client)
+    print(f"✅ 已重拟合 {summary['series']} 条序列, 写入 {summary['rows']} 行, 耗时 {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,288 @@
+"""
+供应商评分 - 按采购订单/到货事件增量维护的供应商绩效
+每个供应商维护累计计数(订单数、准时到货数、各订单验收合格率之和)和按时间指数衰减的交货期分布
+(按天分桶的直方图及一阶、二阶矩), 读取评分和分级无需回扫订单历史.
+时间统一按本地时间(不带时区)处理, 带时区的输入先换算为本地时间
+"""
+
+import math
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 交货期直方图按天分桶(桶 d 覆盖 [d-0.5, d+0.5) 天), 最后一个桶收纳更长的交货期
+MAX_LEAD_TIME_DAYS = 90
+# 交货期分布的衰减半衰期(天): 半衰期之前的到货权重减半
+LEAD_TIME_HALF_LIFE_DAYS = 90.0
+
+# 交货期得分: P90 交货期不超过 BEST 得满分, 达到 WORST 得0分
+LEAD_TIME_BEST_DAYS = 7.0
+LEAD_TIME_WORST_DAYS = 30.0
+# 综合评分权重: 准时率 / 合格率 / 交货期得分
+SCORE_WEIGHTS = (0.5, 0.3, 0.2)
+# 分级阈值, 从高到低
+TIERS = (("A", 92.0), ("B", 85.0), ("C", 0.0))
+
+
+def _local_naive(at: datetime) -> datetime:
+    """带时区的时间换算为本地时间并去掉时区, 与期初数据的 datetime.now() 一致"""
+    return at.astimezone().replace(tzinfo=None) if at.tzinfo is not None else at
+
+
+class SupplierStats:
+    """单个供应商的增量统计"""
+
+    def __init__(self, supplier_id: str, supplier_name: str = ""):
+        self.supplier_id = supplier_id
+        self.supplier_name = supplier_name
+        self.total_orders = 0
+        self.total_amount = 0.0
+        self.received_orders = 0
+        self.on_time_orders = 0
+        # 合格率按订单计: 各到货订单 合格数量/到货数量 之和, 大批量订单不会压过历史
+        self.quality_sum = 0.0
+        # 衰减后的交货期直方图与矩, 均以 _decay_at 时刻为基准
+        self._lead_hist = np.zeros(MAX_LEAD_TIME_DAYS + 1)
+        self._lead_weight = 0.0
+        self._lead_sum = 0.0
+        self._lead_sq = 0.0
+        self._decay_at: Optional[datetime] = None
+        self._snapshot: Optional[Dict] = None
+
+    def add_lead_time(self, days: float, at: datetime, weight: float = 1.0, half_life: float = LEAD_TIME_HALF_LIFE_DAYS):
+        if self._decay_at is None:
+            self._decay_at = at
+        elapsed = (at - self._decay_at).total_seconds() / 86400
+        if elapsed > 0:
+            # 已有分布整体衰减到新的基准时刻
+            factor = 0.5 ** (elapsed / half_life)
+            self._lead_hist *= factor
+            self._lead_weight *= factor
+            self._lead_sum *= factor
+            self._lead_sq *= factor
+            self._decay_at = at
+        else:
+            # 迟到的事件按其发生时刻折算权重
+            weight *= 0.5 ** (-elapsed / half_life)
+        days = max(days, 0.0)
+        self._lead_hist[min(int(round(days)), MAX_LEAD_TIME_DAYS)] += weight
+        self._lead_weight += weight
+        self._lead_sum += weight * days
+        self._lead_sq += weight * days ** 2
+
+    def lead_time_percentile(self, q: float) -> Optional[float]:
+        """衰减分布的分位数, 桶内按线性插值"""
+        if self._lead_weight <= 0:
+            return None
+        cumulative = np.cumsum(self._lead_hist)
+        target = q * cumulative[-1]
+        day = int(np.searchsorted(cumulative, target))
+        below = cumulative[day - 1] if day > 0 else 0.0
+        in_bucket = self._lead_hist[day]
+        fraction = (target - below) / in_bucket if in_bucket > 0 else 0.0
+        return max(day - 0.5 + float(fraction), 0.0)
+
+    def lead_time_mean(self) -> Optional[float]:
+        return self._lead_sum / self._lead_weight if self._lead_weight > 0 else None
+
+    def lead_time_std(self) -> float:
+        if self._lead_weight <= 0:
+            return 0.0
+        mean = self._lead_sum / self._lead_weight
+        return math.sqrt(max(self._lead_sq / self._lead_weight - mean ** 2, 0.0))
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def to_dict(self) -> Dict:
+        """评分卡; 统计未变化时复用上次的结果"""
+        if self._snapshot is not None:
+            return self._snapshot
+        on_time_rate = 100.0 * self.on_time_orders / self.received_orders if self.received_orders else None
+        quality_rate = 100.0 * self.quality_sum / self.received_orders if self.received_orders else None
+        p50, p90, p95 = (self.lead_time_percentile(q) for q in (0.5, 0.9, 0.95))
+
+        score = None
+        if on_time_rate is not None and quality_rate is not None and p90 is not None:
+            lead_score = 100.0 * min(max(
+                (LEAD_TIME_WORST_DAYS - p90) / (LEAD_TIME_WORST_DAYS - LEAD_TIME_BEST_DAYS), 0.0
+            ), 1.0)
+            w_on_time, w_quality, w_lead = SCORE_WEIGHTS
+            score = w_on_time * on_time_rate + w_quality * quality_rate + w_lead * lead_score
+        tier = next((name for name, threshold in TIERS if score is not None and score >= threshold), None)
+
+        mean = self.lead_time_mean()
+        self._snapshot = {
+            "supplier_id": self.supplier_id,
+            "supplier_name": self.supplier_name,
+            "on_time_delivery_rate": round(on_time_rate, 1) if on_time_rate is not None else None,
+            "quality_rate": round(quality_rate, 1) if quality_rate is not None else None,
+            "avg_lead_time_days": round(mean, 1) if mean is not None else None,
+            "lead_time_std_days": round(self.lead_time_std(), 2),
+            "lead_time_p50_days": round(p50, 1) if p50 is not None else None,
+            "lead_time_p90_days": round(p90, 1) if p90 is not None else None,
+            "lead_time_p95_days": round(p95, 1) if p95 is not None else None,
+            "total_orders": self.total_orders,
+            "open_orders": self.total_orders - self.received_orders,
+            "total_amount": round(self.total_amount, 2),
+            "performance_score": round(score, 1) if score is not None else None,
+            "tier": tier,
+        }
+        return self._snapshot
+
+
+class SupplierScorer:
+    """
+    全部供应商的评分
+
+    - place_orders(): 下达采购订单
+    - receive(): 订单到货, 更新准时率、合格率和交货期分布
+    - scorecards(): 读取评分卡
+    """
+
+    def __init__(self, half_life_days: float = LEAD_TIME_HALF_LIFE_DAYS):
+        self.half_life_days = half_life_days
+        self._suppliers: Dict[str, SupplierStats] = {}
+        # 未到货订单: po_id -> (供应商ID, 下单时间, 预计到货时间)
+        self._open_orders: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def _stats(self, supplier_id: str) -> SupplierStats:
+        stats = self._suppliers.get(supplier_id)
+        if stats is None:
+            stats = self._suppliers[supplier_id] = SupplierStats(supplier_id)
+        return stats
+
+    def seed(
+        self,
+        supplier_id: str,
+        supplier_name: str,
+        total_orders: int,
+        on_time_delivery_rate: float,
+        quality_rate: float,
+        avg_lead_time_days: float,
+        total_amount: float = 0.0,
+    ):
+        """以历史汇总初始化(期初订单视为已全部到货, 交货期按平均值计入)"""
+        now = datetime.now()
+        with self._lock:
+            stats = self._stats(supplier_id)
+            stats.supplier_name = supplier_name
+            stats.total_orders += total_orders
+            stats.received_orders += total_orders
+            stats.on_time_orders += round(total_orders * on_time_delivery_rate / 100)
+            stats.quality_sum += total_orders * quality_rate / 100
+            stats.total_amount += total_amount
+            stats.add_lead_time(avg_lead_time_days, now, weight=total_orders, half_life=self.half_life_days)
+            stats.invalidate()
+            self.version += 1
+
+    def place_orders(self, orders: Iterable[Dict]) -> int:
+        """
+        写入一批采购订单, 返回条数
+
+        每条: po_id, supplier_id, ordered_at, expected_at, 可选 amount / supplier_name
+        """
+        orders = [
+            {**order, "ordered_at": _local_naive(order["ordered_at"]), "expected_at": _local_naive(order["expected_at"])}
+            for order in orders
+        ]
+        with self._lock:
+            # 先校验整批, 避免部分应用
+            seen = set()
+            for order in orders:
+                if order["po_id"] in self._open_orders or order["po_id"] in seen:
+                    raise ValueError(f"采购订单已存在: {order['po_id']}")
+                seen.add(order["po_id"])
+            for order in orders:
+                stats = self._stats(order["supplier_id"])
+                if order.get("supplier_name"):
+                    stats.supplier_name = order["supplier_name"]
+                stats.total_orders += 1
+                stats.total_amount += order.get("amount") or 0.0
+                stats.invalidate()
+                self._open_orders[order["po_id"]] = (order["supplier_id"], order["ordered_at"], order["expected_at"])
+            self.version += 1
+        return len(orders)
+
+    def receive(self, receipts: Iterable[Dict]) -> int:
+        """
+        写入一批订单到货, 返回条数
+
+        每条: po_id, received_at, quantity, 可选 accepted_quantity(验收合格数量, 默认全部合格);
+        整批校验并算出每条的更新后才写入, 任一条有误时整批不生效
+        """
+        receipts = list(receipts)
+        with self._lock:
+            updates = []
+            seen = set()
+            for receipt in receipts:
+                po_id = receipt["po_id"]
+                if po_id not in self._open_orders or po_id in seen:
+                    raise ValueError(f"未知或已到货的采购订单: {po_id}")
+                seen.add(po_id)
+                supplier_id, ordered_at, expected_at = self._open_orders[po_id]
+                received_at = _local_naive(receipt["received_at"])
+                quantity = receipt["quantity"]
+                accepted = receipt.get("accepted_quantity")
+                accepted = quantity if accepted is None else accepted
+                if quantity < 0 or not 0 <= accepted <= quantity:
+                    raise ValueError(f"到货数量或合格数量无效: {po_id}")
+                lead_days = (received_at - ordered_at).total_seconds() / 86400
+                if lead_days < 0:
+                    raise ValueError(f"到货时间早于下单时间: {po_id}")
+                updates.append((
+                    po_id,
+                    supplier_id,
+                    received_at,
+                    received_at.date() <= expected_at.date(),
+                    accepted / quantity if quantity > 0 else 1.0,
+                    lead_days,
+                ))
+
+            for po_id, supplier_id, received_at, on_time, quality, lead_days in updates:
+                del self._open_orders[po_id]
+                stats = self._stats(supplier_id)
+                stats.received_orders += 1
+                stats.on_time_orders += 1 if on_time else 0
+                stats.quality_sum += quality
+                stats.add_lead_time(lead_days, received_at, half_life=self.half_life_days)
+                stats.invalidate()
+            self.version += 1
+        return len(receipts)
+
+    def scorecard(self, supplier_id: str) -> Optional[Dict]:
+        with self._lock:
+            stats = self._suppliers.get(supplier_id)
+            return stats.to_dict() if stats else None
+
+    def scorecards(self, tier: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            cards = [stats.to_dict() for stats in self._suppliers.values()]
+        if tier is not None:
+            cards = [card for card in cards if card["tier"] == tier]
+        return cards
+
+    def lead_times(self, supplier_ids: List[Optional[str]]) -> Dict[str, np.ndarray]:
+        """
+        各记录供应商的交货期均值和标准差, 供补货计算使用;
+        未知供应商取全部供应商均值的平均值
+        """
+        with self._lock:
+            known = {
+                sid: (stats.lead_time_mean(), stats.lead_time_std())
+                for sid, stats in self._suppliers.items()
+                if stats.lead_time_mean() is not None
+            }
+        default = (
+            float(np.mean([mean for mean, _ in known.values()])) if known else LEAD_TIME_BEST_DAYS,
+            0.0,
+        )
+        values = [known.get(sid, default) for sid in supplier_ids]
+        return {
+            "mean": np.array([mean for mean, _ in values], dtype=np.float64),
+            "std": np.array([std for _, std in values], dtype=np.float64),
+        }
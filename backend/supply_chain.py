@@ -2,22 +2,26 @@
 智能供应链模块 - 库存优化与需求预测
 """
 
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, date, timedelta
 import numpy as np
-import random
+import os
+
+from alert_engine import AlertEngine, AlertRule, AlertStore
+from alert_stream import AlertBroadcaster, AlertFilter
+from auth import verify_stream_token, verify_token
+from demand_forecast import forecast_batch, forecast_dates
+from inventory_state import OVERSTOCK_DAYS, InventoryState
+from reorder_optimizer import PRIORITIES, REVIEW_DAYS, optimize_reorder
+from supplier_scoring import SupplierScorer
+from transfer_planner import COST_PER_UNIT_KM, TransferPlanCache, distance_matrix, plan_transfers
+from warehouse_kpi import WarehouseKPIRollup, to_local_naive
 
-security = HTTPBearer()
 app = FastAPI(title="智能供应链API")
 
-# Token验证
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    from backend.app import verify_token as verify
-    return verify(credentials)
-
 # ============================================
 # 数据模型
 # ============================================
@@ -36,6 +40,57 @@ class DemandForecastRequest(BaseModel):
     warehouse_id: str
     forecast_days: int = 30
 
+class DemandForecastPair(BaseModel):
+    product_id: str
+    warehouse_id: str
+
+class BatchDemandForecastRequest(BaseModel):
+    pairs: List[DemandForecastPair] = []  # 为空时预测全部 产品 x 仓库
+    forecast_days: int = 30
+    include_daily: bool = False  # 是否返回逐日预测矩阵
+
+class InventoryMovement(BaseModel):
+    warehouse: str
+    product_id: str
+    movement_type: str  # inbound, transfer_in, return, sale, transfer_out, adjustment
+    quantity: int
+    occurred_at: Optional[datetime] = None
+    product_name: Optional[str] = None
+    reorder_point: Optional[int] = None
+    supplier_id: Optional[str] = None  # 入库时记录供应商, 用于补货交货期
+
+class PurchaseOrderEvent(BaseModel):
+    po_id: str
+    supplier_id: str
+    ordered_at: datetime
+    expected_at: datetime
+    amount: float = 0.0  # 万元
+    supplier_name: Optional[str] = None
+
+class ReceiptEvent(BaseModel):
+    po_id: str
+    received_at: datetime
+    quantity: float
+    accepted_quantity: Optional[float] = None  # 验收合格数量, 默认全部合格
+
+class WarehouseOrderEvent(BaseModel):
+    warehouse: str
+    order_id: str
+    ordered_at: datetime
+    quantity_ordered: float
+    shipped_at: Optional[datetime] = None
+    quantity_shipped: float = 0
+    lines: int = 1
+    stockout_lines: int = 0
+    accurate: bool = True  # 发货是否无差错
+
+class ShipmentEvent(BaseModel):
+    shipment_id: str
+    warehouse: str
+    product_id: str
+    product_name: str = ""
+    delay_days: int = 0
+
 class SupplyChainAlert(BaseModel):
     alert_type: str
     severity: str
@@ -48,177 +103,497 @@ class SupplyChainAlert(BaseModel):
 # 1. 库存监控API
 # ============================================
 
+# 库存状态: 启动时以期初快照初始化, 之后由库存变动增量更新
+INVENTORY_SEED = [
+    {
+        "product_id": "prod001",
+        "supplier_id": "sup001",
+        "product_name": "阿莫西林胶囊 500mg",
+        "current_stock": 15200,
+        "avg_daily_sales": 520,
+        "reorder_point": 5000,
+        "warehouse": "华东仓"
+    },
+    {
+        "product_id": "prod002",
+        "supplier_id": "sup002",
+        "product_name": "布洛芬缓释胶囊 300mg",
+        "current_stock": 3200,
+        "avg_daily_sales": 450,
+        "reorder_point": 8000,
+        "warehouse": "华南仓"
+    },
+    {
+        "product_id": "prod003",
+        "supplier_id": "sup003",
+        "product_name": "奥美拉唑肠溶胶囊 20mg",
+        "current_stock": 0,
+        "avg_daily_sales": 380,
+        "reorder_point": 6000,
+        "warehouse": "华北仓"
+    },
+    {
+        "product_id": "prod004",
+        "supplier_id": "sup004",
+        "product_name": "头孢克肟分散片 100mg",
+        "current_stock": 45000,
+        "avg_daily_sales": 320,
+        "reorder_point": 7000,
+        "warehouse": "西南仓"
+    },
+    {
+        "product_id": "prod005",
+        "supplier_id": "sup001",
+        "product_name": "盐酸二甲双胍缓释片",
+        "current_stock": 18500,
+        "avg_daily_sales": 680,
+        "reorder_point": 12000,
+        "warehouse": "华东仓"
+    }
+]
+
+inventory_state = InventoryState()
+for item in INVENTORY_SEED:
+    inventory_state.seed(
+        item["warehouse"],
+        item["product_id"],
+        item["product_name"],
+        item["current_stock"],
+        item["reorder_point"],
+        item["avg_daily_sales"],
+        item["supplier_id"]
+    )
+
 @app.get("/api/supply-chain/inventory/status")
 async def get_inventory_status(
     warehouse_id: Optional[str] = None,
+    status: Optional[str] = None,
     current_user: str = Depends(verify_token)
 ):
     """
     获取库存状态
-    """
-    products = [
-        {
-            "product_id": "prod001",
-            "product_name": "阿莫西林胶囊 500mg",
-            "current_stock": 15200,
-            "avg_daily_sales": 520,
-            "days_of_stock": 29,
-            "reorder_point": 5000,
-            "status": "normal",
-            "warehouse": "华东仓"
-        },
-        {
-            "product_id": "prod002",
-            "product_name": "布洛芬缓释胶囊 300mg",
-            "current_stock": 3200,
-            "avg_daily_sales": 450,
-            "days_of_stock": 7,
-            "reorder_point": 8000,
-            "status": "low",
-            "warehouse": "华南仓"
-        },
-        {
-            "product_id": "prod003",
-            "product_name": "奥美拉唑肠溶胶囊 20mg",
-            "current_stock": 0,
-            "avg_daily_sales": 380,
-            "days_of_stock": 0,
-            "reorder_point": 6000,
-            "status": "out",
-            "warehouse": "华北仓"
-        },
-        {
-            "product_id": "prod004",
-            "product_name": "头孢克肟分散片 100mg",
-            "current_stock": 45000,
-            "avg_daily_sales": 320,
-            "days_of_stock": 140,
-            "reorder_point": 7000,
-            "status": "overstock",
-            "warehouse": "西南仓"
-        },
-        {
-            "product_id": "prod005",
-            "product_name": "盐酸二甲双胍缓释片",
-            "current_stock": 18500,
-            "avg_daily_sales": 680,
-            "days_of_stock": 27,
-            "reorder_point": 12000,
-            "status": "normal",
-            "warehouse": "华东仓"
-        }
-    ]
 
-    if warehouse_id:
-        products = [p for p in products if p["warehouse"] == warehouse_id]
+    读取增量维护的库存状态, 按仓库筛选时只访问该仓库的索引
+    """
+    return {"data": inventory_state.records(warehouse=warehouse_id, status=status)}
 
-    return {"data": products}
+@app.post("/api/supply-chain/inventory/movements")
+async def post_inventory_movements(
+    movements: List[InventoryMovement],
+    current_user: str = Depends(verify_token)
+):
+    """
+    写入库存变动(入库/销售出库/调拨/盘点调整), 增量更新库存状态
+    """
+    try:
+        applied = inventory_state.apply_movements(m.dict() for m in movements)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"applied": applied, "version": inventory_state.version}
+
+# 供应商期初绩效(评分引擎的初始值)
+SUPPLIERS = [
+    {
+        "supplier_id": "sup001",
+        "supplier_name": "华东制药有限公司",
+        "on_time_delivery_rate": 96.5,
+        "quality_rate": 99.2,
+        "avg_lead_time_days": 12,
+        "total_orders": 256,
+        "total_amount": 8520,
+        "performance_score": 94.5,
+        "tier": "A"
+    },
+    {
+        "supplier_id": "sup002",
+        "supplier_name": "南方医药集团",
+        "on_time_delivery_rate": 92.8,
+        "quality_rate": 97.5,
+        "avg_lead_time_days": 15,
+        "total_orders": 189,
+        "total_amount": 6230,
+        "performance_score": 89.5,
+        "tier": "B"
+    },
+    {
+        "supplier_id": "sup003",
+        "supplier_name": "北方生物制药",
+        "on_time_delivery_rate": 88.5,
+        "quality_rate": 95.8,
+        "avg_lead_time_days": 18,
+        "total_orders": 125,
+        "total_amount": 3850,
+        "performance_score": 82.3,
+        "tier": "C"
+    },
+    {
+        "supplier_id": "sup004",
+        "supplier_name": "西南康德药业",
+        "on_time_delivery_rate": 98.2,
+        "quality_rate": 99.5,
+        "avg_lead_time_days": 10,
+        "total_orders": 312,
+        "total_amount": 12580,
+        "performance_score": 97.8,
+        "tier": "A"
+    }
+]
+
+supplier_scores = SupplierScorer()
+for supplier in SUPPLIERS:
+    supplier_scores.seed(
+        supplier["supplier_id"],
+        supplier["supplier_name"],
+        supplier["total_orders"],
+        supplier["on_time_delivery_rate"],
+        supplier["quality_rate"],
+        supplier["avg_lead_time_days"],
+        supplier["total_amount"]
+    )
+
+def forecast_daily_demand(keys: List[tuple], lead_times: np.ndarray) -> np.ndarray:
+    """
+    补货计算使用的日均需求: 每条序列的需求预测在 交货期 + 复核周期 内的平均值,
+    各行覆盖的天数不同, 一次预测到最长的天数后按行截取
+    """
+    if not keys:
+        return np.zeros(0)
+    days = np.clip(np.ceil(lead_times + REVIEW_DAYS), 1, MAX_FORECAST_DAYS).astype(np.int64)
+    result = forecast_batch(inventory_state.daily_history(keys), int(days.max()), rounded=False)
+    cumulative = np.cumsum(result["forecast"], axis=1)
+    return cumulative[np.arange(len(keys)), days - 1] / days
+
+def reorder_plan(service_level: float = 0.95):
+    """当前库存快照及其补货计算结果; snapshot["daily_demand"] 为预测的日均需求"""
+    snapshot = inventory_state.arrays()
+    lead_times = supplier_scores.lead_times(snapshot["supplier_ids"])
+    snapshot["daily_demand"] = forecast_daily_demand(snapshot["keys"], lead_times["mean"])
+    result = optimize_reorder(
+        snapshot["current_stock"],
+        snapshot["daily_demand"],
+        snapshot["daily_sales_std"],
+        lead_times["mean"],
+        lead_time_std=lead_times["std"],
+        service_level=service_level
+    )
+    return snapshot, lead_times["mean"], result
+
+def format_suggestion(name: str, warehouse: str, stock: float, demand: float, lead_time: float, result: Dict, i: int) -> Dict:
+    priority = PRIORITIES[result["priority"][i]]
+    days = result["days_of_stock"][i]
+    days_of_stock = None if np.isinf(days) else int(days)
+    item = {
+        "product_name": name,
+        "current_warehouse": warehouse,
+        "current_stock": int(stock),
+        "avg_daily_demand": round(float(demand), 1),
+        "lead_time_days": round(float(lead_time), 1),
+        "safety_stock": int(result["safety_stock"][i]),
+        "reorder_point": int(result["reorder_point"][i]),
+        "days_until_stockout": days_of_stock,
+        "priority": priority
+    }
+    if stock <= 0 and demand > 0:
+        item.update({
+            "issue": "缺货",
+            "suggested_action": f"紧急补货 {int(result['order_quantity'][i]):,} 盒",
+            "reason": "已完全缺货,需从临近仓库紧急调拨或加急采购"
+        })
+    elif result["below_reorder_point"][i]:
+        item.update({
+            "issue": "库存偏低",
+            "suggested_action": f"立即补货 {int(result['order_quantity'][i]):,} 盒",
+            "reason": f"当前库存仅可支撑{days_of_stock}天,补货周期为{lead_time:.0f}天"
+        })
+    elif result["overstock"][i]:
+        item.update({
+            "issue": "库存积压",
+            "excess_quantity": int(result["excess_quantity"][i]),
+            "suggested_action": f"调拨 {int(result['excess_quantity'][i]):,} 盒至需求旺盛地区",
+            "reason": "库存积压严重,资金占用成本高"
+        })
+    else:
+        reorder_in = int((stock - result["reorder_point"][i]) / demand) if demand > 0 else None
+        item.update({
+            "issue": "库存健康",
+            "suggested_action": f"维持现状,{reorder_in}天后安排补货" if reorder_in is not None else "维持现状",
+            "reason": "库存水平合理"
+        })
+    item["order_quantity"] = int(result["order_quantity"][i])
+    return item
 
 @app.get("/api/supply-chain/inventory/optimization")
 async def get_inventory_optimization_suggestions(
+    warehouse_id: Optional[str] = None,
+    priority: Optional[str] = None,
+    service_level: float = 0.95,
+    limit: int = 100,
     current_user: str = Depends(verify_token)
 ):
     """
     库存优化建议
+
+    对全部 产品 x 仓库 一次计算安全库存、再订货点和建议订货量, 按优先级排序返回
     """
-    suggestions = [
-        {
-            "product_name": "布洛芬缓释胶囊",
-            "current_warehouse": "华南仓",
-            "issue": "库存偏低",
-            "days_until_stockout": 7,
-            "suggested_action": "立即补货 15,000 盒",
-            "reason": "当前库存仅可支撑7天,而补货周期为14天",
-            "priority": "high",
-            "estimated_cost_savings": "避免断货损失约 45万元"
-        },
-        {
-            "product_name": "奥美拉唑肠溶胶囊",
-            "current_warehouse": "华北仓",
-            "issue": "缺货",
-            "days_until_stockout": 0,
-            "suggested_action": "紧急调货 5,000 盒",
-            "reason": "已完全缺货,需从临近仓库紧急调拨",
-            "priority": "critical",
-            "estimated_cost_savings": "避免断货损失约 38万元"
-        },
-        {
-            "product_name": "头孢克肟分散片",
-            "current_warehouse": "西南仓",
-            "issue": "库存积压",
-            "excess_days": 110,
-            "suggested_action": "调拨 35,000 盒至需求旺盛地区",
-            "reason": "库存积压严重,资金占用成本高",
-            "priority": "medium",
-            "estimated_cost_savings": "减少资金占用成本约 12万元"
-        },
-        {
-            "product_name": "阿莫西林胶囊",
-            "current_warehouse": "华东仓",
-            "issue": "库存健康",
-            "days_of_stock": 29,
-            "suggested_action": "维持现状,15天后安排补货",
-            "reason": "库存水平合理",
-            "priority": "low",
-            "estimated_cost_savings": "优化库存成本约 3万元"
-        }
-    ]
+    try:
+        snapshot, lead_times, result = reorder_plan(service_level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    suggestions = []
+    for i in result["order"]:
+        warehouse, _ = snapshot["keys"][i]
+        if warehouse_id and warehouse != warehouse_id:
+            continue
+        if priority and PRIORITIES[result["priority"][i]] != priority:
+            continue
+        suggestions.append(format_suggestion(
+            snapshot["product_names"][i],
+            warehouse,
+            snapshot["current_stock"][i],
+            snapshot["daily_demand"][i],
+            lead_times[i],
+            result,
+            i
+        ))
+        if len(suggestions) >= limit:
+            break
+
+    counts = np.bincount(result["priority"], minlength=len(PRIORITIES))
+    return {
+        "data": suggestions,
+        "total": len(snapshot["keys"]),
+        "by_priority": dict(zip(PRIORITIES, counts.tolist()))
+    }
+
+# 仓库档案与坐标(纬度, 经度), 用于计算调拨运费
+WAREHOUSES = [
+    {
+        "warehouse_name": "华东仓",
+        "location": "上海",
+        "total_products": 1520,
+        "inventory_turnover_rate": 8.5,
+        "fill_rate": 98.5,
+        "avg_order_fulfillment_time": 1.2,
+        "stockout_rate": 1.5,
+        "overstock_rate": 3.2,
+        "accuracy": 99.2
+    },
+    {
+        "warehouse_name": "华南仓",
+        "location": "广州",
+        "total_products": 1230,
+        "inventory_turnover_rate": 7.8,
+        "fill_rate": 97.2,
+        "avg_order_fulfillment_time": 1.5,
+        "stockout_rate": 2.8,
+        "overstock_rate": 4.5,
+        "accuracy": 98.5
+    },
+    {
+        "warehouse_name": "华北仓",
+        "location": "北京",
+        "total_products": 1180,
+        "inventory_turnover_rate": 6.9,
+        "fill_rate": 95.8,
+        "avg_order_fulfillment_time": 1.8,
+        "stockout_rate": 4.2,
+        "overstock_rate": 5.8,
+        "accuracy": 97.3
+    },
+    {
+        "warehouse_name": "西南仓",
+        "location": "成都",
+        "total_products": 890,
+        "inventory_turnover_rate": 5.2,
+        "fill_rate": 96.5,
+        "avg_order_fulfillment_time": 2.1,
+        "stockout_rate": 3.5,
+        "overstock_rate": 8.9,
+        "accuracy": 98.1
+    }
+]
+
+WAREHOUSE_COORDINATES = {
+    "华东仓": (31.23, 121.47),
+    "华南仓": (23.13, 113.26),
+    "华北仓": (39.90, 116.40),
+    "西南仓": (30.57, 104.07),
+}
+
+WAREHOUSE_NAMES = [w["warehouse_name"] for w in WAREHOUSES]
+TRANSFER_COST = distance_matrix([WAREHOUSE_COORDINATES[name] for name in WAREHOUSE_NAMES]) * COST_PER_UNIT_KM
+
+transfer_plans = TransferPlanCache()
+
+def solve_transfer_plan(service_level: float) -> Dict:
+    snapshot, _, result = reorder_plan(service_level)
+    position = {name: i for i, name in enumerate(WAREHOUSE_NAMES)}
+    warehouse_index = np.array([position.get(w, -1) for w, _ in snapshot["keys"]], dtype=np.int64)
+    known = warehouse_index >= 0
+    surplus = np.where(known & result["overstock"], result["excess_quantity"], 0)
+    deficit = np.where(known, result["order_quantity"], 0)
+
+    plan = plan_transfers(
+        warehouse_index,
+        [product_id for _, product_id in snapshot["keys"]],
+        surplus,
+        deficit,
+        TRANSFER_COST
+    )
+
+    def describe(row):
+        warehouse, product_id = snapshot["keys"][row]
+        return warehouse, product_id, snapshot["product_names"][row]
+
+    transfers = []
+    for t in plan["transfers"]:
+        from_warehouse, product_id, name = describe(t["from_row"])
+        to_warehouse = describe(t["to_row"])[0]
+        transfers.append({
+            "product_id": product_id,
+            "product_name": name,
+            "from_warehouse": from_warehouse,
+            "to_warehouse": to_warehouse,
+            "quantity": int(t["quantity"]),
+            "transport_cost": t["cost"],
+            "suggested_action": f"从{from_warehouse}调拨 {int(t['quantity']):,} 盒至{to_warehouse}"
+        })
+    purchases = []
+    for u in plan["unmet"]:
+        warehouse, product_id, name = describe(u["row"])
+        purchases.append({
+            "product_id": product_id,
+            "product_name": name,
+            "warehouse": warehouse,
+            "quantity": int(u["quantity"]),
+            "suggested_action": f"调拨后仍缺 {int(u['quantity']):,} 盒, 向供应商采购"
+        })
+    return {
+        "transfers": transfers,
+        "purchases": purchases,
+        "total_transfer_quantity": sum(t["quantity"] for t in transfers),
+        "total_transport_cost": round(sum(t["transport_cost"] for t in transfers), 2),
+        "generated_at": datetime.now().isoformat()
+    }
 
-    return {"data": suggestions}
+@app.get("/api/supply-chain/inventory/transfers")
+async def get_transfer_plan(
+    service_level: float = 0.95,
+    current_user: str = Depends(verify_token)
+):
+    """
+    仓库间调拨计划
+
+    积压仓库的超额库存调往低库存/缺货仓库, 按运费最小求解; 调拨不足的部分转为采购建议.
+    计划在库存状态变化前保持缓存
+    """
+    key = (inventory_state.version, supplier_scores.version, date.today(), service_level)
+    try:
+        plan = transfer_plans.get_or_solve(key, lambda: solve_transfer_plan(service_level))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": plan, "inventory_version": inventory_state.version}
 
 # ============================================
 # 2. 需求预测API
 # ============================================
 
+MAX_FORECAST_DAYS = 365
+# 与 demand_forecast.INTERVAL_Z 对应的置信度
+FORECAST_CONFIDENCE = 0.85
+
+def run_demand_forecast(keys: List[tuple], forecast_days: int) -> Dict:
+    """
+    按库存状态中的日销量历史批量预测, keys 为 [(仓库, 产品ID)];
+    结果中 known 标记各组合是否有库存记录(没有记录的组合预测为0)
+    """
+    if not 1 <= forecast_days <= MAX_FORECAST_DAYS:
+        raise HTTPException(status_code=400, detail=f"forecast_days 须在 1-{MAX_FORECAST_DAYS} 之间")
+    result = forecast_batch(inventory_state.daily_history(keys), forecast_days)
+    result["known"] = inventory_state.contains(keys)
+    return result
+
 @app.post("/api/supply-chain/forecast/demand")
 async def forecast_demand(
     request: DemandForecastRequest,
     current_user: str = Depends(verify_token)
 ):
     """
-    需求预测 - 基于历史数据和季节性因素
+    需求预测 - 基于近30天日销量学习星期季节性和趋势
     """
-    # 生成未来30天的预测数据
-    forecast_data = []
-    base_date = datetime.now()
-
-    # 模拟不同的需求模式
-    trend = 100 + random.randint(-10, 20)  # 基础需求
-    seasonality = [0.9, 0.95, 1.0, 1.05, 1.1, 1.08, 1.02, 0.98, 1.0, 1.03, 1.07, 1.12, 1.15, 1.1, 1.05, 1.02, 0.98, 0.95, 0.92, 0.9, 0.93, 0.97, 1.0, 1.05, 1.08, 1.1, 1.12, 1.08, 1.05, 1.02]
-
-    for i in range(request.forecast_days):
-        forecast_date = base_date + timedelta(days=i)
-
-        # 添加随机波动
-        noise = random.uniform(0.9, 1.1)
-        demand = round(trend * seasonality[i % len(seasonality)] * noise)
-
-        # 计算置信区间
-        lower_bound = round(demand * 0.85)
-        upper_bound = round(demand * 1.15)
-
-        forecast_data.append({
-            "date": forecast_date.strftime("%Y-%m-%d"),
-            "forecast_demand": demand,
-            "lower_bound": lower_bound,
-            "upper_bound": upper_bound,
-            "confidence": 0.85
-        })
-
-    # 计算汇总统计
-    total_demand = sum(d["forecast_demand"] for d in forecast_data)
-    avg_daily_demand = total_demand / len(forecast_data)
+    result = run_demand_forecast([(request.warehouse_id, request.product_id)], request.forecast_days)
+    if not result["known"][0]:
+        raise HTTPException(
+            status_code=404,
+            detail=f"库存记录不存在: {request.warehouse_id} / {request.product_id}"
+        )
+    dates = forecast_dates(request.forecast_days)
+    forecast_data = [
+        {
+            "date": day,
+            "forecast_demand": int(demand),
+            "lower_bound": int(lower),
+            "upper_bound": int(upper),
+            "confidence": FORECAST_CONFIDENCE
+        }
+        for day, demand, lower, upper in zip(
+            dates, result["forecast"][0], result["lower"][0], result["upper"][0]
+        )
+    ]
 
     return {
         "product_id": request.product_id,
         "warehouse_id": request.warehouse_id,
         "forecast_period_days": request.forecast_days,
-        "total_forecast_demand": total_demand,
-        "avg_daily_demand": round(avg_daily_demand, 1),
-        "peak_demand_day": max(forecast_data, key=lambda x: x["forecast_demand"]),
+        "total_forecast_demand": int(result["total"][0]),
+        "avg_daily_demand": round(float(result["avg_daily"][0]), 1),
+        "peak_demand_day": forecast_data[int(result["peak_index"][0])],
+        "weekly_profile": np.round(result["weekly_profile"][0], 3).tolist(),
         "forecast_data": forecast_data
     }
 
+@app.post("/api/supply-chain/forecast/demand/batch")
+async def forecast_demand_batch(
+    request: BatchDemandForecastRequest,
+    current_user: str = Depends(verify_token)
+):
+    """
+    批量需求预测 - 多个 产品 x 仓库 一次计算
+
+    结果按列返回(与 pairs 顺序一致); include_daily 时附带逐日预测矩阵 forecast[i][d].
+    known[i] 为 false 的组合没有库存记录, 其预测值为0
+    """
+    if request.pairs:
+        keys = [(pair.warehouse_id, pair.product_id) for pair in request.pairs]
+    else:
+        keys = inventory_state.arrays()["keys"]
+    result = run_demand_forecast(keys, request.forecast_days)
+    dates = forecast_dates(request.forecast_days)
+
+    data = {
+        "warehouse_id": [w for w, _ in keys],
+        "product_id": [p for _, p in keys],
+        "total_forecast_demand": result["total"].astype(np.int64).tolist(),
+        "avg_daily_demand": np.round(result["avg_daily"], 1).tolist(),
+        "peak_demand_date": [dates[i] for i in result["peak_index"]],
+        "peak_demand": result["forecast"][np.arange(len(keys)), result["peak_index"]].astype(np.int64).tolist(),
+        "known": result["known"].tolist(),
+    }
+    if request.include_daily:
+        data["forecast"] = result["forecast"].astype(np.int64).tolist()
+        data["lower_bound"] = result["lower"].astype(np.int64).tolist()
+        data["upper_bound"] = result["upper"].astype(np.int64).tolist()
+
+    return {
+        "forecast_period_days": request.forecast_days,
+        "dates": dates,
+        "confidence": FORECAST_CONFIDENCE,
+        "count": len(keys),
+        "unknown_count": int((~result["known"]).sum()),
+        "data": data
+    }
+
 @app.get("/api/supply-chain/forecast/accuracy")
 async def get_forecast_accuracy(
     current_user: str = Depends(verify_token)
@@ -256,126 +631,235 @@ async def get_forecast_accuracy(
 # 3. 供应链告警API
 # ============================================
 
+# 告警规则: 每条规则只在其关注的字段变化时评估
+DEMAND_SPIKE_RATIO = 1.4
+SHIPMENT_DELAY_DAYS = 2
+
+def stockout_rule(state: Dict) -> Optional[Dict]:
+    if state["current_stock"] <= 0 and state["avg_daily_sales"] > 0:
+        return {
+            "message": "产品已完全缺货",
+            "suggested_action": f"立即从临近仓库调货 {int(state['reorder_point']):,} 盒"
+        }
+    return None
+
+def low_stock_rule(state: Dict) -> Optional[Dict]:
+    if 0 < state["current_stock"] < state["reorder_point"]:
+        days = state["days_of_stock"]
+        return {
+            "message": f"库存仅剩{days}天,低于安全库存" if days is not None else "库存低于安全库存",
+            "suggested_action": f"安排紧急补货 {int(state['reorder_point'] - state['current_stock']):,} 盒"
+        }
+    return None
+
+def demand_spike_rule(state: Dict) -> Optional[Dict]:
+    avg, recent = state["avg_daily_sales"], state["recent_daily_sales"]
+    if avg > 0 and recent > avg * DEMAND_SPIKE_RATIO:
+        return {
+            "message": f"近3天需求激增{round((recent / avg - 1) * 100)}%",
+            "suggested_action": "增加安全库存至20天"
+        }
+    return None
+
+def overstock_rule(state: Dict) -> Optional[Dict]:
+    days = state["days_of_stock"]
+    if days is not None and days > OVERSTOCK_DAYS:
+        return {
+            "message": f"库存积压{days}天,资金占用高",
+            "suggested_action": "调拨至需求旺盛地区或暂停补货"
+        }
+    return None
+
+def shipment_delay_rule(state: Dict) -> Optional[Dict]:
+    if state["delay_days"] >= SHIPMENT_DELAY_DAYS:
+        return {
+            "message": f"在途货物延误{state['delay_days']}天",
+            "suggested_action": "联系物流商,准备备用供应商"
+        }
+    return None
+
+supply_alerts = AlertEngine([
+    AlertRule("stockout", "critical", ["current_stock", "avg_daily_sales"], stockout_rule),
+    AlertRule("low_stock", "high", ["current_stock", "reorder_point"], low_stock_rule),
+    AlertRule("demand_spike", "medium", ["recent_daily_sales", "avg_daily_sales"], demand_spike_rule),
+    AlertRule("overstock", "low", ["days_of_stock"], overstock_rule),
+    AlertRule("shipment_delay", "high", ["delay_days"], shipment_delay_rule),
+], AlertStore(max_alerts=int(os.getenv("SUPPLY_ALERTS_MAX", "10000"))))
+
+INVENTORY_ALERT_FIELDS = ("current_stock", "reorder_point", "avg_daily_sales", "days_of_stock", "recent_daily_sales")
+
+def on_inventory_change(records: List[Dict]):
+    """库存状态变化时, 将变化的记录作为事件送入告警引擎"""
+    for record in records:
+        supply_alerts.process(
+            ("inventory", record["warehouse"], record["product_id"]),
+            {name: record[name] for name in INVENTORY_ALERT_FIELDS},
+            {"product_name": record["product_name"], "warehouse": record["warehouse"]}
+        )
+
+# 告警推送: 在产生期初告警之前注册, 期初告警也进入回放缓冲区
+supply_alert_stream = AlertBroadcaster(supply_alerts.store)
+
+inventory_state.subscribe(on_inventory_change, replay=True)
+
+def process_shipment_event(event: ShipmentEvent) -> List[Dict]:
+    return supply_alerts.process(
+        ("shipment", event.shipment_id),
+        {"delay_days": event.delay_days},
+        {"product_name": event.product_name, "warehouse": event.warehouse, "shipment_id": event.shipment_id}
+    )
+
+process_shipment_event(ShipmentEvent(
+    shipment_id="ship001",
+    warehouse="华北仓",
+    product_id="prod005",
+    product_name="盐酸二甲双胍缓释片",
+    delay_days=3
+))
+
 @app.get("/api/supply-chain/alerts")
 async def get_supply_chain_alerts(
     severity: Optional[str] = None,
+    limit: Optional[int] = None,
     current_user: str = Depends(verify_token)
 ):
     """
     供应链实时告警
+
+    告警由库存变动和在途货物事件增量触发, 按级别查询只读取该级别的索引
     """
-    alerts = [
-        {
-            "alert_type": "stockout",
-            "severity": "critical",
-            "product_name": "奥美拉唑肠溶胶囊",
-            "warehouse": "华北仓",
-            "message": "产品已完全缺货",
-            "suggested_action": "立即从临近仓库调货 5,000 盒",
-            "created_at": "2025-01-07 09:30:00"
-        },
-        {
-            "alert_type": "low_stock",
-            "severity": "high",
-            "product_name": "布洛芬缓释胶囊",
-            "warehouse": "华南仓",
-            "message": "库存仅剩7天,低于安全库存",
-            "suggested_action": "安排紧急补货 15,000 盒",
-            "created_at": "2025-01-07 08:15:00"
-        },
-        {
-            "alert_type": "demand_spike",
-            "severity": "medium",
-            "product_name": "阿莫西林胶囊",
-            "warehouse": "华东仓",
-            "message": "近3天需求激增45%}",
-            "suggested_action": "增加安全库存至20天",
-            "created_at": "2025-01-06 14:20:00"
-        },
-        {
-            "alert_type": "overstock",
-            "severity": "low",
-            "product_name": "头孢克肟分散片",
-            "warehouse": "西南仓",
-            "message": "库存积压140天,资金占用高",
-            "suggested_action": "调拨至需求旺盛地区或暂停补货",
-            "created_at": "2025-01-05 16:45:00"
-        },
-        {
-            "alert_type": "shipment_delay",
-            "severity": "high",
-            "product_name": "盐酸二甲双胍缓释片",
-            "warehouse": "华北仓",
-            "message": "在途货物延误3天",
-            "suggested_action": "联系物流商,准备备用供应商",
-            "created_at": "2025-01-07 07:00:00"
-        }
-    ]
+    alerts = supply_alerts.store.query(severity=severity, limit=limit)
+    return {"data": alerts, "total": len(alerts)}
 
-    if severity:
-        alerts = [a for a in alerts if a["severity"] == severity]
+@app.get("/api/supply-chain/alerts/stream")
+async def stream_supply_chain_alerts(
+    severity: Optional[str] = None,
+    warehouse: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+    current_user: str = Depends(verify_stream_token)
+):
+    """
+    告警推送 (Server-Sent Events)
 
-    return {"data": alerts, "total": len(alerts)}
+    - severity: 级别过滤, 可逗号分隔多个
+    - warehouse: 仓库过滤
+    - 断线重连时浏览器自动携带 Last-Event-ID, 服务端补发之后的事件;
+      事件类型 alert 为新告警, resolved 为告警解除, reset 表示需重新拉取列表
+    """
+    alert_filter = AlertFilter.from_params(severity, warehouse=warehouse)
+    resume_from = last_event_id_header if last_event_id_header is not None else last_event_id
+    return StreamingResponse(
+        supply_alert_stream.stream(alert_filter, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/supply-chain/shipments/events")
+async def post_shipment_event(
+    event: ShipmentEvent,
+    current_user: str = Depends(verify_token)
+):
+    """
+    在途货物状态事件(延误天数变化), 触发或解除延误告警
+    """
+    fired = process_shipment_event(event)
+    return {"fired": fired}
+
+@app.get("/api/supply-chain/alerts/stats")
+async def get_supply_chain_alert_stats(current_user: str = Depends(verify_token)):
+    """告警引擎统计: 规则数、活动告警数、评估次数、各级别告警数、推送连接数"""
+    return {**supply_alerts.stats(), "stream": supply_alert_stream.stats()}
 
 # ============================================
 # 4. 仓库绩效API
 # ============================================
 
+warehouse_kpis = WarehouseKPIRollup(hour_retention_days=float(os.getenv("WAREHOUSE_KPI_HOUR_RETENTION_DAYS", "31")))
+
+def inventory_by_warehouse() -> Dict[str, Dict[str, float]]:
+    """各仓库当前库存合计和积压SKU占比"""
+    result = {}
+    for row in inventory_state.records():
+        item = result.setdefault(row["warehouse"], {"stock": 0.0, "records": 0, "overstock": 0})
+        item["stock"] += max(row["current_stock"], 0)
+        item["records"] += 1
+        item["overstock"] += row["status"] == "overstock"
+    return result
+
 @app.get("/api/supply-chain/warehouse/performance")
 async def get_warehouse_performance(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: int = 30,
     current_user: str = Depends(verify_token)
 ):
     """
     仓库运营绩效
+
+    区间默认为最近 days 天; 由预聚合的小时/日/月桶合并计算.
+    区间内没有订单事件的仓库返回期初基准值(source=baseline)
     """
-    warehouses = [
-        {
-            "warehouse_name": "华东仓",
-            "location": "上海",
-            "total_products": 1520,
-            "inventory_turnover_rate": 8.5,
-            "fill_rate": 98.5,
-            "avg_order fulfillment_time": 1.2,
-            "stockout_rate": 1.5,
-            "overstock_rate": 3.2,
-            "accuracy": 99.2
-        },
-        {
-            "warehouse_name": "华南仓",
-            "location": "广州",
-            "total_products": 1230,
-            "inventory_turnover_rate": 7.8,
-            "fill_rate": 97.2,
-            "avg_order_fulfillment_time": 1.5,
-            "stockout_rate": 2.8,
-            "overstock_rate": 4.5,
-            "accuracy": 98.5
-        },
-        {
-            "warehouse_name": "华北仓",
-            "location": "北京",
-            "total_products": 1180,
-            "inventory_turnover_rate": 6.9,
-            "fill_rate": 95.8,
-            "avg_order_fulfillment_time": 1.8,
-            "stockout_rate": 4.2,
-            "overstock_rate": 5.8,
-            "accuracy": 97.3
-        },
-        {
-            "warehouse_name": "西南仓",
-            "location": "成都",
-            "total_products": 890,
-            "inventory_turnover_rate": 5.2,
-            "fill_rate": 96.5,
-            "avg_order_fulfillment_time": 2.1,
-            "stockout_rate": 3.5,
-            "overstock_rate": 8.9,
-            "accuracy": 98.1
-        }
-    ]
+    # 预聚合桶按本地时间划分, 带时区的参数先换算
+    end = to_local_naive(end) if end else datetime.now()
+    start = to_local_naive(start) if start else end - timedelta(days=days)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start 须早于 end")
+    range_days = (end - start).total_seconds() / 86400
+
+    kpis = warehouse_kpis.kpis(start, end)
+    inventory = inventory_by_warehouse()
+    warehouses = []
+    for profile in WAREHOUSES:
+        name = profile["warehouse_name"]
+        computed = kpis.get(name)
+        if not computed or computed["orders"] == 0:
+            warehouses.append({**profile, "source": "baseline"})
+            continue
+        stock = inventory.get(name, {}).get("stock", 0.0)
+        records = inventory.get(name, {}).get("records", 0)
+        annual_shipped = computed["quantity_shipped"] * 365 / range_days
+        warehouses.append({
+            **profile,
+            **computed,
+            "inventory_turnover_rate": round(annual_shipped / stock, 1) if stock > 0 else None,
+            "overstock_rate": round(100 * inventory[name]["overstock"] / records, 1) if records else None,
+            "source": "events"
+        })
+
+    return {"start": start.isoformat(), "end": end.isoformat(), "data": warehouses}
 
-    return {"data": warehouses}
+@app.get("/api/supply-chain/warehouse/performance/trend")
+async def get_warehouse_performance_trend(
+    warehouse_id: str,
+    granularity: str = "day",
+    days: int = 30,
+    current_user: str = Depends(verify_token)
+):
+    """
+    单个仓库按小时/日/月的KPI趋势
+    """
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    try:
+        series = warehouse_kpis.series(warehouse_id, start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"warehouse_id": warehouse_id, "granularity": granularity, "data": series}
+
+@app.post("/api/supply-chain/warehouse/orders")
+async def post_warehouse_orders(
+    orders: List[WarehouseOrderEvent],
+    current_user: str = Depends(verify_token)
+):
+    """
+    写入仓库订单履约事件, 累加到KPI预聚合桶
+    """
+    try:
+        recorded = warehouse_kpis.record(o.dict() for o in orders)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"recorded": recorded, "total_events": warehouse_kpis.events}
 
 # ============================================
 # 5. 供应商管理API
@@ -383,59 +867,43 @@ async def get_warehouse_performance(
 
 @app.get("/api/supply-chain/suppliers/performance")
 async def get_supplier_performance(
+    tier: Optional[str] = None,
     current_user: str = Depends(verify_token)
 ):
     """
     供应商绩效评估
+
+    读取增量维护的评分卡: 准时率、合格率、衰减交货期分布(均值/标准差/P50/P90/P95)、综合评分和分级
     """
-    suppliers = [
-        {
-            "supplier_id": "sup001",
-            "supplier_name": "华东制药有限公司",
-            "on_time_delivery_rate": 96.5,
-            "quality_rate": 99.2,
-            "avg_lead_time_days": 12,
-            "total_orders": 256,
-            "total_amount": 8520,
-            "performance_score": 94.5,
-            "tier": "A"
-        },
-        {
-            "supplier_id": "sup002",
-            "supplier_name": "南方医药集团",
-            "on_time_delivery_rate": 92.8,
-            "quality_rate": 97.5,
-            "avg_lead_time_days": 15,
-            "total_orders": 189,
-            "total_amount": 6230,
-            "performance_score": 89.5,
-            "tier": "B"
-        },
-        {
-            "supplier_id": "sup003",
-            "supplier_name": "北方生物制药",
-            "on_time_delivery_rate": 88.5,
-            "quality_rate": 95.8,
-            "avg_lead_time_days": 18,
-            "total_orders": 125,
-            "total_amount": 3850,
-            "performance_score": 82.3,
-            "tier": "C"
-        },
-        {
-            "supplier_id": "sup004",
-            "supplier_name": "西南康德药业",
-            "on_time_delivery_rate": 98.2,
-            "quality_rate": 99.5,
-            "avg_lead_time_days": 10,
-            "total_orders": 312,
-            "total_amount": 12580,
-            "performance_score": 97.8,
-            "tier": "A"
-        }
-    ]
+    return {"data": supplier_scores.scorecards(tier=tier)}
 
-    return {"data": suppliers}
+@app.post("/api/supply-chain/purchase-orders")
+async def post_purchase_orders(
+    orders: List[PurchaseOrderEvent],
+    current_user: str = Depends(verify_token)
+):
+    """
+    写入采购订单
+    """
+    try:
+        accepted = supplier_scores.place_orders(o.dict() for o in orders)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": accepted, "version": supplier_scores.version}
+
+@app.post("/api/supply-chain/purchase-orders/receipts")
+async def post_purchase_order_receipts(
+    receipts: List[ReceiptEvent],
+    current_user: str = Depends(verify_token)
+):
+    """
+    写入采购到货, 增量更新供应商评分
+    """
+    try:
+        accepted = supplier_scores.receive(r.dict() for r in receipts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": accepted, "version": supplier_scores.version}
 
 if __name__ == "__main__":
     import uvicorn
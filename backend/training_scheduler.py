@@ -0,0 +1,312 @@
+"""
+训练调度 - 进程池执行模型训练
+训练不在API事件循环中运行; 队列有界, 按模型类型限制并发, 高销售额产品优先
+"""
+
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from feature_store import FeatureStore
+from forecast_models import ProfileForecastModel
+from model_registry import ModelRegistry
+
+
+class TrainingQueueFullError(Exception):
+    """排队的训练任务已达上限"""
+
+
+def run_training(
+    registry_root: str, feature_store_path: str, product_id: str, model_type: str, training_days: int
+) -> Dict:
+    """在训练进程中执行: 从特征库读取产品的日销售额训练, 保存新版本模型并返回元数据"""
+    registry = ModelRegistry(root=registry_root)
+    store = FeatureStore(path=feature_store_path)
+    store.refresh(mmap_mode="r")
+    history = store.daily_history(product_id)
+    model = ProfileForecastModel.fit(model_type, history=history, training_days=training_days)
+    return registry.save(
+        product_id,
+        model_type,
+        model,
+        {
+            "training_window": model.training_window,
+            "training_data_points": model.training_window["data_points"],
+            "metrics": {},
+        },
+    )
+
+
+class TrainingJob:
+    """单个训练任务的状态"""
+
+    def __init__(self, product_id: str, model_type: str, training_days: int, priority: float):
+        self.job_id = uuid.uuid4().hex
+        self.product_id = product_id
+        self.model_type = model_type
+        self.training_days = training_days
+        self.priority = priority
+        self.status = "queued"  # queued, running, completed, failed, cancelled
+        # 在优先队列中的排序键 (-priority, 入队序号)
+        self.sort_key: Optional[Tuple[float, int]] = None
+        self.version: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self, queue_position: Optional[int] = None) -> Dict:
+        def fmt(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "product_id": self.product_id,
+            "model_type": self.model_type,
+            "training_data_points": self.training_days,
+            "priority": self.priority,
+            "queue_position": queue_position,
+            "progress": 100 if self.status == "completed" else 0,
+            "version": self.version,
+            "error": self.error,
+            "created_at": fmt(self.created_at),
+            "started_at": fmt(self.started_at),
+            "finished_at": fmt(self.finished_at),
+        }
+
+
+class TrainingScheduler:
+    """
+    训练任务调度
+
+    - **max_workers**: 训练进程数, 默认保留一个CPU核给API服务
+    - **max_queue**: 排队任务上限
+    - **type_limits**: 各模型类型的最大并发数, 未列出的类型只受 max_workers 限制
+    - 排队任务按 priority 从高到低执行(例如产品销售额), 相同优先级先到先执行
+    - 同一 产品+模型类型 已在排队或训练中时, 重复提交返回已有任务
+    - **feature_store_path**: 训练进程从该特征库读取产品的历史日销售额
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        feature_store_path: str = "/tmp/data-insights-features",
+        max_workers: Optional[int] = None,
+        max_queue: int = 10000,
+        type_limits: Optional[Dict[str, int]] = None,
+        max_finished: int = 10000,
+    ):
+        self.registry = registry
+        self.feature_store_path = feature_store_path
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_queue = max_queue
+        self.type_limits = type_limits or {}
+        self.max_finished = max_finished
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: List = []  # (-priority, seq, job)
+        self._seq = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._jobs: Dict[str, TrainingJob] = {}
+        # 排队或训练中的任务: (product_id, model_type) -> job
+        self._active: Dict[Tuple[str, str], TrainingJob] = {}
+        # 已结束任务按结束顺序保留, 超出 max_finished 时从最早的开始丢弃
+        self._finished: Deque[str] = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, registry: ModelRegistry) -> "TrainingScheduler":
+        # TRAINING_TYPE_LIMITS 格式: lstm=1,transformer=1,xgboost=4
+        limits = {}
+        for item in os.getenv("TRAINING_TYPE_LIMITS", "lstm=1,transformer=1").split(","):
+            if "=" in item:
+                name, value = item.split("=", 1)
+                limits[name.strip()] = int(value)
+        workers = os.getenv("TRAINING_WORKERS")
+        return cls(
+            registry,
+            feature_store_path=os.getenv("FEATURE_STORE_DIR", "/tmp/data-insights-features"),
+            max_workers=int(workers) if workers else None,
+            max_queue=int(os.getenv("TRAINING_MAX_QUEUE", "10000")),
+            type_limits=limits,
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # 首次提交时才启动进程池; 使用spawn避免fork带有线程的服务进程
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """工作进程异常退出后进程池不可再用, 丢弃后下次提交时重建"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, product_id: str, model_type: str, training_days: int = 365, priority: float = 0.0) -> TrainingJob:
+        job = self.submit_many([(product_id, model_type, training_days, priority)])[0]
+        if job is None:
+            raise TrainingQueueFullError(f"训练任务排队已满({self.max_queue})")
+        return job
+
+    def submit_many(self, requests: Iterable[Tuple[str, str, int, float]]) -> List[Optional[TrainingJob]]:
+        """
+        一次加锁提交一批任务, 每项为 (product_id, model_type, training_days, priority)
+
+        返回与输入对应的任务; 已在排队或训练中的返回已有任务, 队列已满的为 None
+        """
+        jobs: List[Optional[TrainingJob]] = []
+        with self._lock:
+            for product_id, model_type, training_days, priority in requests:
+                existing = self._active.get((product_id, model_type))
+                if existing is not None:
+                    jobs.append(existing)
+                    continue
+                if len(self._queue) >= self.max_queue:
+                    jobs.append(None)
+                    continue
+                job = TrainingJob(product_id, model_type, training_days, priority)
+                job.sort_key = (-priority, next(self._seq))
+                self._jobs[job.job_id] = job
+                self._active[(product_id, model_type)] = job
+                heapq.heappush(self._queue, (*job.sort_key, job))
+                jobs.append(job)
+        self._dispatch()
+        return jobs
+
+    def _can_start(self, model_type: str) -> bool:
+        limit = self.type_limits.get(model_type)
+        return limit is None or self._running.get(model_type, 0) < limit
+
+    def _dispatch(self):
+        """在进程池有空位时启动排队任务, 跳过已达并发上限的模型类型"""
+        to_start = []
+        with self._lock:
+            running_total = sum(self._running.values())
+            skipped = []
+            while self._queue and running_total < self.max_workers:
+                entry = heapq.heappop(self._queue)
+                job = entry[2]
+                if job.status == "cancelled":
+                    continue
+                if not self._can_start(job.model_type):
+                    skipped.append(entry)
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                self._running[job.model_type] = self._running.get(job.model_type, 0) + 1
+                running_total += 1
+                to_start.append(job)
+            for entry in skipped:
+                heapq.heappush(self._queue, entry)
+
+        for job in to_start:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(
+                    run_training,
+                    self.registry.root,
+                    self.feature_store_path,
+                    job.product_id,
+                    job.model_type,
+                    job.training_days,
+                )
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_executor(executor)
+                job.error = str(e)
+                with self._lock:
+                    self._running[job.model_type] -= 1
+                    self._finish(job, "failed")
+                continue
+            future.add_done_callback(lambda f, job=job, executor=executor: self._on_done(job, executor, f))
+
+    def _on_done(self, job: TrainingJob, executor: ProcessPoolExecutor, future):
+        try:
+            metadata = future.result()
+            job.version = metadata["version"]
+            status = "completed"
+        except BrokenProcessPool as e:
+            self._discard_executor(executor)
+            job.error = str(e) or "训练进程异常退出"
+            status = "failed"
+        except Exception as e:
+            job.error = str(e)
+            status = "failed"
+        with self._lock:
+            self._running[job.model_type] -= 1
+            self._finish(job, status)
+
+        if job.status == "completed":
+            # 预热新版本模型, 首次推理不必读盘
+            try:
+                self.registry.load(job.product_id, job.model_type, job.version)
+            except Exception:
+                pass
+        self._dispatch()
+
+    def _finish(self, job: TrainingJob, status: str):
+        """在锁内调用: 记录任务结束, 并丢弃超出保留数量的最早结束任务"""
+        job.status = status
+        job.finished_at = time.time()
+        if self._active.get((job.product_id, job.model_type)) is job:
+            del self._active[(job.product_id, job.model_type)]
+        self._finished.append(job.job_id)
+        while len(self._finished) > self.max_finished:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job: TrainingJob) -> Optional[int]:
+        """排在该任务之前的任务数 + 1; 只做一次线性计数, 不排序整个队列"""
+        if job.status != "queued":
+            return None
+        with self._lock:
+            if job.status != "queued":
+                return None
+            priority, seq = job.sort_key
+            return 1 + sum(1 for p, q, _ in self._queue if p < priority or (p == priority and q < seq))
+
+    def cancel(self, job_id: str) -> Optional[TrainingJob]:
+        """取消排队中的任务; 已开始的训练不中断"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == "queued":
+                self._finish(job, "cancelled")
+                self._queue = [entry for entry in self._queue if entry[2] is not job]
+                heapq.heapify(self._queue)
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "queued": len(self._queue),
+                "running": dict(self._running),
+                "type_limits": dict(self.type_limits),
+                "jobs": by_status,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,161 @@
+"""
+调拨规划 - 仓库间库存调拨的最小费用流求解
+每个产品单独构成运输问题: 积压仓库为供给点, 低库存/缺货仓库为需求点,
+单位运费按仓库间距离计算; 用逐次最短路(Bellman-Ford)求最小费用流.
+计划按库存状态版本缓存, 库存变动后才重新求解
+"""
+
+import math
+import threading
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 每盒每公里运费(元)
+COST_PER_UNIT_KM = 0.002
+
+
+def distance_matrix(coordinates: Sequence[Tuple[float, float]]) -> np.ndarray:
+    """各仓库 (纬度, 经度) 之间的球面距离(公里)"""
+    lat, lon = np.radians(np.array(coordinates, dtype=np.float64)).T
+    dlat = lat[:, np.newaxis] - lat[np.newaxis, :]
+    dlon = lon[:, np.newaxis] - lon[np.newaxis, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, np.newaxis] * np.cos(lat)[np.newaxis, :] * np.sin(dlon / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def min_cost_transport(supply: np.ndarray, demand: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """
+    运输问题的最小费用流解
+
+    supply / demand 为各供给点、需求点的数量, cost[i][j] 为单位运费;
+    总供给与总需求不等时, 运量为二者较小值. 返回 flows[i][j]
+    """
+    n_src, n_dst = len(supply), len(demand)
+    # 节点: 0 源点, 1..n_src 供给点, 之后为需求点, 最后为汇点
+    source, sink = 0, n_src + n_dst + 1
+    n_nodes = sink + 1
+    graph: List[List[int]] = [[] for _ in range(n_nodes)]
+    to, cap, arc_cost = [], [], []
+
+    def add_arc(u: int, v: int, capacity: float, c: float):
+        for a, b, arc_cap, unit_cost in ((u, v, capacity, c), (v, u, 0.0, -c)):
+            graph[a].append(len(to))
+            to.append(b)
+            cap.append(arc_cap)
+            arc_cost.append(unit_cost)
+
+    for i in range(n_src):
+        add_arc(source, 1 + i, float(supply[i]), 0.0)
+    route_arcs = np.empty((n_src, n_dst), dtype=np.int64)
+    for i in range(n_src):
+        for j in range(n_dst):
+            route_arcs[i, j] = len(to)
+            add_arc(1 + i, 1 + n_src + j, math.inf, float(cost[i, j]))
+    for j in range(n_dst):
+        add_arc(1 + n_src + j, sink, float(demand[j]), 0.0)
+
+    while True:
+        # Bellman-Ford 最短增广路(残量图中反向弧费用为负)
+        dist = [math.inf] * n_nodes
+        prev_arc = [-1] * n_nodes
+        dist[source] = 0.0
+        for _ in range(n_nodes - 1):
+            updated = False
+            for u in range(n_nodes):
+                if dist[u] == math.inf:
+                    continue
+                for arc in graph[u]:
+                    if cap[arc] > 1e-9 and dist[u] + arc_cost[arc] < dist[to[arc]] - 1e-12:
+                        dist[to[arc]] = dist[u] + arc_cost[arc]
+                        prev_arc[to[arc]] = arc
+                        updated = True
+            if not updated:
+                break
+        if dist[sink] == math.inf:
+            break
+
+        push = math.inf
+        node = sink
+        while node != source:
+            arc = prev_arc[node]
+            push = min(push, cap[arc])
+            node = to[arc ^ 1]
+        node = sink
+        while node != source:
+            arc = prev_arc[node]
+            cap[arc] -= push
+            cap[arc ^ 1] += push
+            node = to[arc ^ 1]
+
+    # 路线弧的反向弧容量即为运量
+    return np.array([[cap[arc + 1] for arc in row] for row in route_arcs], dtype=np.float64)
+
+
+def plan_transfers(
+    warehouse_index: np.ndarray,
+    product_ids: Sequence[str],
+    surplus: np.ndarray,
+    deficit: np.ndarray,
+    cost: np.ndarray,
+) -> Dict[str, List]:
+    """
+    逐产品求解调拨方案
+
+    输入按记录排列: warehouse_index[k] 为记录所在仓库在 cost 矩阵中的下标,
+    surplus / deficit 为该记录可调出 / 需补充的数量.
+    返回 transfers(调拨明细) 和 unmet(调拨后仍需采购的缺口)
+    """
+    by_product: Dict[str, List[int]] = {}
+    for k in np.flatnonzero((surplus > 0) | (deficit > 0)):
+        by_product.setdefault(product_ids[k], []).append(k)
+
+    transfers = []
+    unmet = []
+    for product_id, rows in by_product.items():
+        rows = np.array(rows)
+        src = rows[surplus[rows] > 0]
+        dst = rows[deficit[rows] > 0]
+        if len(dst) == 0:
+            continue
+        received = np.zeros(len(dst))
+        if len(src):
+            flows = min_cost_transport(
+                surplus[src], deficit[dst], cost[np.ix_(warehouse_index[src], warehouse_index[dst])]
+            )
+            for i, j in zip(*np.nonzero(flows > 0)):
+                quantity = float(np.floor(flows[i, j]))
+                if quantity <= 0:
+                    continue
+                received[j] += quantity
+                transfers.append({
+                    "product_id": product_id,
+                    "from_row": int(src[i]),
+                    "to_row": int(dst[j]),
+                    "quantity": quantity,
+                    "cost": round(quantity * float(cost[warehouse_index[src[i]], warehouse_index[dst[j]]]), 2),
+                })
+        for j, row in enumerate(dst):
+            remaining = float(deficit[row] - received[j])
+            if remaining > 0:
+                unmet.append({"product_id": product_id, "row": int(row), "quantity": float(np.ceil(remaining))})
+    return {"transfers": transfers, "unmet": unmet}
+
+
+class TransferPlanCache:
+    """按库存状态版本缓存调拨计划, 版本变化(有新的库存变动)时才重新求解"""
+
+    def __init__(self):
+        self._key: Optional[Hashable] = None
+        self._plan: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self.solves = 0
+
+    def get_or_solve(self, key: Hashable, solve) -> Dict:
+        with self._lock:
+            if self._key == key and self._plan is not None:
+                return self._plan
+            self._plan = solve()
+            self._key = key
+            self.solves += 1
+            return self._plan
@@ -0,0 +1,207 @@
+"""
+仓库KPI - 按时间分桶预聚合的订单履约指标
+每个订单事件到达时累加到所在仓库的小时/日/月三级桶(各桶只保存可相加的计数和合计);
+查询任意时间段时按 整月 -> 整日 -> 小时 拆分区间, 合并少量桶即可, 不回扫原始事件.
+桶按本地时间(不带时区)划分, 带时区的事件时间和查询区间先换算为本地时间
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 桶内累加的字段
+FIELDS = (
+    "orders",               # 订单数
+    "shipped_orders",       # 已发货订单数
+    "accurate_orders",      # 发货无差错的订单数
+    "quantity_ordered",     # 订购数量
+    "quantity_shipped",     # 发货数量
+    "lines",                # 订单行数
+    "stockout_lines",       # 因缺货未能满足的订单行数
+    "fulfillment_hours",    # 已发货订单的履约时长合计(小时)
+)
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+GRANULARITIES = ("hour", "day", "month")
+
+# 小时桶保留天数, 更早的区间按整日聚合
+HOUR_RETENTION_DAYS = 31
+
+
+def to_local_naive(at: datetime) -> datetime:
+    """带时区的时间换算为本地时间并去掉时区"""
+    return at.astimezone().replace(tzinfo=None) if at.tzinfo is not None else at
+
+
+def truncate(at: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(at: datetime) -> datetime:
+    return at.replace(year=at.year + 1, month=1) if at.month == 12 else at.replace(month=at.month + 1)
+
+
+def split_range(start: datetime, end: datetime) -> List[Tuple[str, datetime]]:
+    """
+    把 [start, end) 拆成尽量少的 (粒度, 桶起点), 两端按小时对齐(start 向下、end 向上取整)
+    """
+    cur = truncate(start, "hour")
+    end_hour = truncate(end, "hour")
+    if end_hour < end:
+        end_hour += timedelta(hours=1)
+    buckets = []
+    while cur < end_hour:
+        if cur == truncate(cur, "month") and _next_month(cur) <= end_hour:
+            buckets.append(("month", cur))
+            cur = _next_month(cur)
+        elif cur == truncate(cur, "day") and cur + timedelta(days=1) <= end_hour:
+            buckets.append(("day", cur))
+            cur += timedelta(days=1)
+        else:
+            buckets.append(("hour", cur))
+            cur += timedelta(hours=1)
+    return buckets
+
+
+def compute_kpis(totals: np.ndarray, days: float) -> Dict[str, Optional[float]]:
+    """由合并后的合计计算KPI; 分母为0的指标为 None"""
+    t = {name: float(totals[i]) for name, i in _INDEX.items()}
+
+    def ratio(numerator: str, denominator: str, scale: float = 100.0) -> Optional[float]:
+        return round(scale * t[numerator] / t[denominator], 2) if t[denominator] > 0 else None
+
+    fulfillment = ratio("fulfillment_hours", "shipped_orders", scale=1 / 24)
+    return {
+        "orders": int(t["orders"]),
+        "quantity_shipped": int(t["quantity_shipped"]),
+        "daily_shipped_quantity": round(t["quantity_shipped"] / days, 1) if days > 0 else None,
+        "fill_rate": ratio("quantity_shipped", "quantity_ordered"),
+        "stockout_rate": ratio("stockout_lines", "lines"),
+        "avg_order_fulfillment_time": round(fulfillment, 2) if fulfillment is not None else None,
+        "accuracy": ratio("accurate_orders", "shipped_orders"),
+    }
+
+
+class WarehouseKPIRollup:
+    """
+    仓库KPI预聚合
+
+    - record(): 写入订单事件, 更新三级桶
+    - totals(warehouse, start, end): 合并区间内的桶
+    - kpis(start, end): 各仓库区间KPI
+    - **hour_retention_days**: 小时桶只保留最近这些天; 更早的区间端点按整日对齐
+    """
+
+    def __init__(self, hour_retention_days: float = HOUR_RETENTION_DAYS):
+        self.hour_retention_days = hour_retention_days
+        # 仓库 -> 粒度 -> 桶起点 -> 合计数组
+        self._buckets: Dict[str, Dict[str, Dict[datetime, np.ndarray]]] = {}
+        # 早于该时刻的小时桶已清理
+        self._hour_cutoff = truncate(datetime.now() - timedelta(days=hour_retention_days), "hour")
+        self._lock = threading.Lock()
+        self.events = 0
+
+    def _prune_hours(self):
+        """在锁内调用: 清理超出保留期的小时桶, 每小时最多执行一次"""
+        cutoff = truncate(datetime.now() - timedelta(days=self.hour_retention_days), "hour")
+        if cutoff <= self._hour_cutoff:
+            return
+        self._hour_cutoff = cutoff
+        for by_granularity in self._buckets.values():
+            hours = by_granularity["hour"]
+            for key in [key for key in hours if key < cutoff]:
+                del hours[key]
+
+    def record(self, events: Iterable[Dict]) -> int:
+        """
+        写入一批订单事件, 返回条数
+
+        每条: warehouse, ordered_at, quantity_ordered, 可选 shipped_at / quantity_shipped /
+        lines(默认1) / stockout_lines / accurate(默认 True); 事件按下单时间归桶
+        """
+        rows = []
+        for event in events:
+            ordered_at = to_local_naive(event["ordered_at"])
+            values = np.zeros(len(FIELDS))
+            values[_INDEX["orders"]] = 1
+            values[_INDEX["quantity_ordered"]] = event["quantity_ordered"]
+            values[_INDEX["quantity_shipped"]] = event.get("quantity_shipped") or 0
+            values[_INDEX["lines"]] = event.get("lines") or 1
+            values[_INDEX["stockout_lines"]] = event.get("stockout_lines") or 0
+            shipped_at = event.get("shipped_at")
+            if shipped_at is not None:
+                hours = (to_local_naive(shipped_at) - ordered_at).total_seconds() / 3600
+                if hours < 0:
+                    raise ValueError("发货时间早于下单时间")
+                values[_INDEX["shipped_orders"]] = 1
+                values[_INDEX["fulfillment_hours"]] = hours
+                values[_INDEX["accurate_orders"]] = 1 if event.get("accurate", True) else 0
+            rows.append((event["warehouse"], ordered_at, values))
+
+        with self._lock:
+            self._prune_hours()
+            for warehouse, ordered_at, values in rows:
+                by_granularity = self._buckets.setdefault(warehouse, {g: {} for g in GRANULARITIES})
+                for granularity in GRANULARITIES:
+                    key = truncate(ordered_at, granularity)
+                    if granularity == "hour" and key < self._hour_cutoff:
+                        # 迟到的旧事件只计入日/月桶
+                        continue
+                    bucket = by_granularity[granularity].get(key)
+                    if bucket is None:
+                        by_granularity[granularity][key] = values.copy()
+                    else:
+                        bucket += values
+            self.events += len(rows)
+        return len(rows)
+
+    def warehouses(self) -> List[str]:
+        with self._lock:
+            return list(self._buckets)
+
+    def _align(self, start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+        """换算为本地时间; 落在小时桶保留期之前的端点按整日对齐(start 向下, end 向上)"""
+        start, end = to_local_naive(start), to_local_naive(end)
+        if start < self._hour_cutoff:
+            start = truncate(start, "day")
+        if end < self._hour_cutoff and end != truncate(end, "day"):
+            end = truncate(end, "day") + timedelta(days=1)
+        return start, end
+
+    def totals(self, warehouse: str, start: datetime, end: datetime) -> np.ndarray:
+        totals = np.zeros(len(FIELDS))
+        with self._lock:
+            plan = split_range(*self._align(start, end))
+            by_granularity = self._buckets.get(warehouse)
+            if by_granularity is None:
+                return totals
+            for granularity, key in plan:
+                bucket = by_granularity[granularity].get(key)
+                if bucket is not None:
+                    totals += bucket
+        return totals
+
+    def series(self, warehouse: str, start: datetime, end: datetime, granularity: str = "day") -> List[Dict]:
+        """按粒度逐桶的KPI序列(无事件的桶跳过; 小时粒度只覆盖保留期内)"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的粒度: {granularity}, 可选 {list(GRANULARITIES)}")
+        start, end = to_local_naive(start), to_local_naive(end)
+        span = {"hour": 1 / 24, "day": 1.0, "month": 30.0}[granularity]
+        with self._lock:
+            buckets = self._buckets.get(warehouse, {}).get(granularity, {})
+            rows = sorted(
+                ((key, bucket.copy()) for key, bucket in buckets.items() if start <= key < end),
+                key=lambda row: row[0],
+            )
+        return [{"period": key.isoformat(), **compute_kpis(bucket, span)} for key, bucket in rows]
+
+    def kpis(self, start: datetime, end: datetime) -> Dict[str, Dict]:
+        start, end = to_local_naive(start), to_local_naive(end)
+        days = (end - start).total_seconds() / 86400
+        return {warehouse: compute_kpis(self.totals(warehouse, start, end), days) for warehouse in self.warehouses()}
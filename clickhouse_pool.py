@@ -0,0 +1,292 @@
+# 市场洞察模块 - ClickHouse连接池
+#
+# 进程级共享连接池, 替代每次查询都新建 clickhouse_connect 客户端:
+# - 连接数上限可配置, 超出时排队等待
+# - 借出前按间隔做健康检查 (ping), 失效连接自动丢弃重建
+# - 空闲超时的连接由后台清理
+# - 提供 async 接口, 在线程池中执行查询, 不阻塞事件循环
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional
+
+
+class PoolTimeoutError(Exception):
+    """等待可用连接超时"""
+
+
+class _PooledClient:
+    """连接池中的单个连接及其状态"""
+
+    __slots__ = ("client", "created_at", "last_used_at", "last_checked_at")
+
+    def __init__(self, client):
+        now = time.monotonic()
+        self.client = client
+        self.created_at = now
+        self.last_used_at = now
+        self.last_checked_at = now
+
+
+class ClickHousePool:
+    """
+    ClickHouse连接池
+
+    - **max_size**: 最大连接数
+    - **min_size**: 空闲清理时保留的最少连接数
+    - **idle_timeout**: 空闲超过该秒数的连接会被关闭
+    - **health_check_interval**: 距上次检查超过该秒数, 借出前先 ping
+    - **acquire_timeout**: 等待可用连接的最长秒数
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8123,
+        username: str = "default",
+        password: str = "",
+        database: str = "pharma_insights",
+        max_size: int = 16,
+        min_size: int = 1,
+        idle_timeout: float = 300.0,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 10.0,
+        client_settings: Optional[Dict[str, Any]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size 必须大于0")
+        self.connect_args = {
+            "host": host,
+            "port": port,
+            "username": username,
+            "password": password,
+            "database": database,
+        }
+        self.client_settings = client_settings or {}
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: Deque[_PooledClient] = deque()
+        self._size = 0  # 已创建(含借出)的连接数
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_size, thread_name_prefix="clickhouse"
+        )
+        self._reaper = threading.Thread(
+            target=self._reap_loop, name="clickhouse-pool-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    @classmethod
+    def from_env(cls) -> "ClickHousePool":
+        """从环境变量读取连接配置"""
+        return cls(
+            host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+            port=int(os.getenv("CLICKHOUSE_PORT", "8123")),
+            username=os.getenv("CLICKHOUSE_USER", "default"),
+            password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+            database=os.getenv("CLICKHOUSE_DATABASE", "pharma_insights"),
+            max_size=int(os.getenv("CLICKHOUSE_POOL_SIZE", "16")),
+            min_size=int(os.getenv("CLICKHOUSE_POOL_MIN_SIZE", "1")),
+            idle_timeout=float(os.getenv("CLICKHOUSE_POOL_IDLE_TIMEOUT", "300")),
+            health_check_interval=float(os.getenv("CLICKHOUSE_POOL_HEALTH_CHECK", "30")),
+            acquire_timeout=float(os.getenv("CLICKHOUSE_POOL_ACQUIRE_TIMEOUT", "10")),
+        )
+
+    # ------------------------------------------
+    # 连接管理
+    # ------------------------------------------
+
+    def _create_client(self):
+        import clickhouse_connect
+        return clickhouse_connect.get_client(**self.connect_args, **self.client_settings)
+
+    @staticmethod
+    def _close_client(pooled: _PooledClient):
+        try:
+            pooled.client.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, pooled: _PooledClient) -> bool:
+        now = time.monotonic()
+        if now - pooled.last_checked_at < self.health_check_interval:
+            return True
+        try:
+            healthy = bool(pooled.client.ping())
+        except Exception:
+            healthy = False
+        pooled.last_checked_at = now
+        return healthy
+
+    def _discard(self, pooled: _PooledClient):
+        self._close_client(pooled)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _checkout(self) -> _PooledClient:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                pooled = None
+                create = False
+                if self._idle:
+                    # LIFO: 优先复用最近使用过的连接, 让多余连接自然空闲超时
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"等待ClickHouse连接超时({self.acquire_timeout}s), 连接池已满"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    return _PooledClient(self._create_client())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def _checkin(self, pooled: _PooledClient):
+        pooled.last_used_at = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                close = True
+            else:
+                self._idle.append(pooled)
+                close = False
+            self._cond.notify()
+        if close:
+            self._close_client(pooled)
+
+    @staticmethod
+    def _is_connection_error(exc: BaseException) -> bool:
+        """网络/连接层错误; SQL语法、参数等查询错误不影响连接本身"""
+        if isinstance(exc, OSError):
+            return True
+        from clickhouse_connect.driver.exceptions import OperationalError, StreamClosedError, StreamFailureError
+        return isinstance(exc, (OperationalError, StreamClosedError, StreamFailureError))
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接, 用完自动归还; 仅在连接层出错时丢弃该连接, 查询错误时照常归还"""
+        pooled = self._checkout()
+        try:
+            yield pooled.client
+        except BaseException as e:
+            if isinstance(e, Exception) and not self._is_connection_error(e):
+                self._checkin(pooled)
+            else:
+                self._discard(pooled)
+            raise
+        else:
+            self._checkin(pooled)
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.idle_timeout, self.health_check_interval) / 2)
+        while True:
+            time.sleep(interval)
+            if self._closed:
+                return
+            self.evict_idle()
+
+    def evict_idle(self) -> int:
+        """关闭空闲超时的连接, 返回关闭数量"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            # 队首是最久未使用的连接
+            while (
+                self._idle
+                and self._size > self.min_size
+                and now - self._idle[0].last_used_at > self.idle_timeout
+            ):
+                expired.append(self._idle.popleft())
+                self._size -= 1
+        for pooled in expired:
+            self._close_client(pooled)
+        return len(expired)
+
+    def close(self):
+        """关闭连接池及所有空闲连接"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_client(pooled)
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        """连接池状态"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+    # ------------------------------------------
+    # 查询接口
+    # ------------------------------------------
+
+    def query(self, sql: str, parameters: Optional[Dict[str, Any]] = None):
+        """同步执行查询, 返回字典列表"""
+        with self.connection() as client:
+            result = client.query(sql, parameters=parameters)
+            return list(result.named_results())
+
+    async def query_async(self, sql: str, parameters: Optional[Dict[str, Any]] = None):
+        """异步执行查询, 在连接池专用线程中运行, 不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query, sql, parameters)
+
+
+_pool: Optional[ClickHousePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClickHousePool:
+    """获取进程级共享连接池 (首次调用时按环境变量创建)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ClickHousePool.from_env()
+    return _pool
+
+
+def close_pool():
+    """关闭共享连接池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -363,6 +363,36 @@ ORDER BY update_time
 SETTINGS index_granularity = 8192;
 
 
+-- ============================================
+-- 9. 模型回测结果表 (model_backtest)
+-- ============================================
+CREATE TABLE IF NOT EXISTS model_backtest (
+    run_id String COMMENT '回测批次ID',
+    run_date Date COMMENT '回测日期',
+    model_name String COMMENT '模型名称',
+    product_id String COMMENT '产品ID',
+
+    -- 回测设置
+    horizon UInt16 COMMENT '预测期数',
+    origins UInt16 COMMENT '滚动起点数',
+
+    -- 误差指标 (无法计算时为NULL, 如实际值全为0时的MAPE、常数序列的R²)
+    mape Nullable(Float64) COMMENT '平均绝对百分比误差(%)',
+    rmse Nullable(Float64) COMMENT '均方根误差',
+    mae Nullable(Float64) COMMENT '平均绝对误差',
+    r2_score Nullable(Float64) COMMENT '决定系数',
+
+    -- 耗时(按序列分摊)
+    training_time_ms Float64 COMMENT '训练耗时(毫秒)',
+    inference_time_ms Float64 COMMENT '推理耗时(毫秒)',
+
+    create_time DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(create_time)
+ORDER BY (product_id, model_name)
+SETTINGS index_granularity = 8192;
+
+
 -- ============================================
 -- 创建视图(方便查询)
 -- ============================================
@@ -405,3 +435,25 @@ AS SELECT
     countState(seller_id) as seller_count
 FROM sales_data
 GROUP BY stat_year, stat_month, sales_province, sales_city, category_l1;
+
+
+-- ============================================
+-- 10. 处方审核结果表 (prescription_audit)
+-- ============================================
+CREATE TABLE IF NOT EXISTS prescription_audit (
+    prescription_date Date COMMENT '处方日期',
+    prescription_id String COMMENT '处方ID',
+    hospital_name String COMMENT '医院名称',
+    department String COMMENT '科室',
+
+    -- 审核结果
+    rationality_score Float64 COMMENT '合理性评分(0-100)',
+    issue_flags UInt8 COMMENT '问题类型(按位: 1重复用药 2剂量不当 4疗程不当 8禁忌症 16配伍禁忌)',
+    is_rational UInt8 COMMENT '是否合理',
+
+    create_time DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(create_time)
+PARTITION BY toYYYYMM(prescription_date)
+ORDER BY (prescription_date, hospital_name, department, prescription_id)
+SETTINGS index_granularity = 8192;
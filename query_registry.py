@@ -0,0 +1,163 @@
+# 市场洞察模块 - 参数化查询注册表
+#
+# 每个接口的SQL注册为一个命名模板, 取值通过 ClickHouse 服务端参数绑定
+# ({name:Type}) 传入, 不再拼接进SQL文本:
+# - 同一模板的不同取值共享同一条规范化SQL, 服务端可复用解析/执行计划
+# - 可选条件用 /*:参数名*/ 标记, 仅在参数非空时展开
+# - 规范化SQL按 模板+启用的可选条件 缓存; cache_key 按 规范化SQL+参数 生成,
+#   可用于相同查询去重和结果缓存
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+# ClickHouse 服务端参数占位符: {name:Type}
+_PLACEHOLDER_RE = re.compile(r"\{(\w+):[^{}]+\}")
+# 可选条件标记: /*:name*/
+_CLAUSE_RE = re.compile(r"/\*:(\w+)\*/")
+_LINE_COMMENT_RE = re.compile(r"--[^\n]*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL文本: 去掉行注释, 合并空白"""
+    sql = _LINE_COMMENT_RE.sub("", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def _param_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return [_param_value(v) for v in value]
+    return value
+
+
+@dataclass(frozen=True)
+class RenderedQuery:
+    """渲染后的查询: 规范化SQL + 绑定参数"""
+    name: str
+    sql: str
+    parameters: Dict[str, Any]
+
+    @property
+    def cache_key(self) -> str:
+        """规范化SQL与参数的摘要, 相同查询得到相同的key"""
+        payload = json.dumps(
+            {k: _param_value(v) for k, v in self.parameters.items()},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha1()
+        digest.update(self.sql.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(payload.encode("utf-8"))
+        return f"{self.name}:{digest.hexdigest()}"
+
+
+class QueryTemplate:
+    """
+    命名SQL模板
+
+    - **sql**: 使用 {name:Type} 占位符, 可选条件处写 /*:name*/
+    - **clauses**: 可选条件片段, key 为参数名; 参数为 None 时该片段不展开
+    """
+
+    def __init__(self, name: str, sql: str, clauses: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.sql = sql
+        self.clauses = clauses or {}
+
+        markers = set(_CLAUSE_RE.findall(sql))
+        if markers != set(self.clauses):
+            raise ValueError(
+                f"模板 {name} 的可选条件标记 {sorted(markers)} 与定义 {sorted(self.clauses)} 不一致"
+            )
+        self.required: Set[str] = set(_PLACEHOLDER_RE.findall(sql))
+        self.optional: Set[str] = set()
+        for clause_sql in self.clauses.values():
+            self.optional.update(_PLACEHOLDER_RE.findall(clause_sql))
+        self.optional -= self.required
+
+    def expand(self, active: FrozenSet[str]) -> str:
+        """展开启用的可选条件并规范化"""
+        sql = _CLAUSE_RE.sub(
+            lambda m: self.clauses[m.group(1)] if m.group(1) in active else "",
+            self.sql,
+        )
+        return normalize_sql(sql)
+
+
+class QueryRegistry:
+    """
+    查询模板注册表 + 规范化SQL缓存
+
+    规范化SQL只与模板和启用的可选条件有关, 与参数取值无关,
+    因此缓存条目数量很小, 命中后渲染只需组装参数字典.
+    """
+
+    def __init__(self, max_cached: int = 256):
+        self._templates: Dict[str, QueryTemplate] = {}
+        self._cache: "OrderedDict[Tuple[str, FrozenSet[str]], str]" = OrderedDict()
+        self._max_cached = max_cached
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, sql: str, clauses: Optional[Dict[str, str]] = None) -> QueryTemplate:
+        """注册模板, 同名模板不允许重复注册"""
+        if name in self._templates:
+            raise ValueError(f"查询模板已存在: {name}")
+        template = QueryTemplate(name, sql, clauses)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> QueryTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"未注册的查询模板: {name}") from None
+
+    def render(self, name: str, **params: Any) -> RenderedQuery:
+        """按模板名和参数渲染查询, 值为 None 的参数视为未提供"""
+        template = self.get(name)
+        params = {k: v for k, v in params.items() if v is not None}
+
+        unknown = set(params) - template.required - template.optional - set(template.clauses)
+        if unknown:
+            raise ValueError(f"模板 {name} 不接受参数: {sorted(unknown)}")
+        missing = template.required - set(params)
+        if missing:
+            raise ValueError(f"模板 {name} 缺少参数: {sorted(missing)}")
+
+        active = frozenset(k for k in template.clauses if k in params)
+        key = (name, active)
+        with self._lock:
+            sql = self._cache.get(key)
+            if sql is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if sql is None:
+            sql = template.expand(active)
+            with self._lock:
+                self.misses += 1
+                self._cache[key] = sql
+                if len(self._cache) > self._max_cached:
+                    self._cache.popitem(last=False)
+
+        return RenderedQuery(name=name, sql=sql, parameters=params)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存命中统计"""
+        with self._lock:
+            return {
+                "templates": len(self._templates),
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+            }